@@ -0,0 +1,116 @@
+"""Compare cache serializers by encoded size and encode/decode time.
+
+Values shaped like the ones @cached stores are encoded with pickle, the previous default, and with the
+versioned orjson/msgpack serializers, with and without compression. The user list, read by every export,
+is also encoded as row tuples. Serializers whose optional package is not installed are skipped.
+
+    uv run python benchmark_cache.py
+    uv run python benchmark_cache.py --users 10000
+"""
+
+from __future__ import annotations
+import argparse
+import datetime
+import statistics
+from functools import partial
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from bot.cache.serialization import ModelRowSerializer, PickleSerializer, VersionedSerializer
+from bot.database.models import UserModel
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from bot.cache.serialization import AbstractSerializer
+
+REPEATS = 7
+
+
+def build_users(count: int) -> list[UserModel]:
+    created_at = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        UserModel(
+            id=100_000_000 + index,
+            first_name=f"User {index}",
+            last_name=None if index % 3 else f"Last {index}",
+            username=f"user_{index}" if index % 2 else None,
+            language_code=("en", "ru", "uk", "de")[index % 4],
+            referrer=None,
+            created_at=created_at + datetime.timedelta(minutes=index),
+            is_admin=index == 0,
+            is_suspicious=False,
+            is_block=index % 50 == 0,
+            is_premium=index % 7 == 0,
+        )
+        for index in range(count)
+    ]
+
+
+def build_serializers(rows: bool) -> dict[str, Callable[[], AbstractSerializer]]:
+    if rows:
+        return {
+            "pickle": PickleSerializer,
+            "rows": lambda: ModelRowSerializer(UserModel),
+            "rows+zlib": lambda: ModelRowSerializer(UserModel, compression="zlib"),
+            "rows+zstd": lambda: ModelRowSerializer(UserModel, compression="zstd"),
+            "rows+lz4": lambda: ModelRowSerializer(UserModel, compression="lz4"),
+            "rows msgpack": lambda: ModelRowSerializer(UserModel, codec="msgpack"),
+        }
+    return {
+        "pickle": PickleSerializer,
+        "orjson": VersionedSerializer,
+        "orjson+zlib": lambda: VersionedSerializer(compression="zlib"),
+        "orjson+zstd": lambda: VersionedSerializer(compression="zstd"),
+        "orjson+lz4": lambda: VersionedSerializer(compression="lz4"),
+        "msgpack": lambda: VersionedSerializer(codec="msgpack"),
+    }
+
+
+def measure(func: Callable[[], Any], number: int) -> float:
+    """Median microseconds per call."""
+    timings = []
+    for _ in range(REPEATS):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((perf_counter() - start) / number * 1e6)
+    return statistics.median(timings)
+
+
+def benchmark(name: str, value: Any, rows: bool, number: int) -> None:
+    print(f"\n{name}")
+    print(f"{'serializer':<14} {'bytes':>9} {'vs pickle':>10} {'encode µs':>11} {'decode µs':>11}")
+
+    baseline = None
+    for serializer_name, factory in build_serializers(rows).items():
+        try:
+            serializer = factory()
+        except RuntimeError as e:
+            print(f"⚠️  {serializer_name} skipped: {e}")
+            continue
+
+        payload = serializer.serialize(value)
+        baseline = baseline or len(payload)
+        encode = measure(partial(serializer.serialize, value), number)
+        decode = measure(partial(serializer.deserialize, payload), number)
+        print(
+            f"{serializer_name:<14} {len(payload):>9} {len(payload) / baseline - 1:>+10.1%} "
+            f"{encode:>11.2f} {decode:>11.2f}",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="number of users in the user list")
+    args = parser.parse_args()
+
+    users = build_users(args.users)
+    benchmark("is_admin (bool)", value=True, rows=False, number=10_000)
+    benchmark("get_first_name (str)", value="User 1", rows=False, number=10_000)
+    benchmark("get_user_count (int)", value=len(users), rows=False, number=10_000)
+    benchmark(f"get_all_users ({args.users} users)", value=users, rows=True, number=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Compare knowledge base renderings by prompt size, answer quality and latency.
+
+Token counts and prompt assembly time are measured offline for every question of qa1.json/qa2.json.
+With ``--llm`` every question is also answered through the configured LLM providers and the answer is
+graded against the reference answer by the OpenAI model, on the same 5 x 10 points scale as the qa files.
+
+    uv run python benchmark_kb.py
+    uv run python benchmark_kb.py --llm --limit 10
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import statistics
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+
+from bot.core.config import DIR, settings
+from bot.knowledge.registry import knowledge_base_registry
+from bot.knowledge.renderings import RENDERINGS, render_document
+from bot.services.prompt import build_prompt, get_token_budget
+from bot.utils.tokens import estimate_tokens
+
+QA_FILES = ("qa1.json", "qa2.json")
+MODEL_NAME = "gpt-5-nano"  # whose token budget the prompts are assembled in
+SCORE_CRITERIA = ("accuracy", "completeness", "clarity", "helpfulness", "tone")
+JUDGE_PROMPT = (
+    "You grade answers of an eSIM store support bot. Compare the candidate answer with the reference answer, "
+    "which is known to be correct, and score the candidate from 1 to 10 on each criterion: {criteria}. "
+    'Reply with a JSON object only, e.g. {{"accuracy": 8, "completeness": 7, ...}}.'
+)
+
+
+@dataclass(frozen=True, slots=True)
+class QACase:
+    question: str
+    language: str
+    reference: str
+
+
+@dataclass(slots=True)
+class RenderingReport:
+    rendering: str
+    full_tokens: int
+    prompt_tokens: list[int] = field(default_factory=list)
+    context_tokens: list[int] = field(default_factory=list)
+    build_ms: list[float] = field(default_factory=list)
+    answer_seconds: list[float] = field(default_factory=list)
+    scores: list[int] = field(default_factory=list)  # out of 50
+
+
+def load_cases(limit: int | None) -> list[QACase]:
+    cases: dict[tuple[str, str], QACase] = {}
+    for name in QA_FILES:
+        try:
+            data = json.loads((Path(DIR) / name).read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  {name} skipped: {e}")
+            continue
+
+        for pair in data["questions"]:
+            for item in pair:
+                key = (item["language"], item["question"])
+                cases.setdefault(key, QACase(item["question"], item["language"], item["globustele_bot_answer"]))
+
+    return list(cases.values())[:limit]
+
+
+def use_rendering(rendering: str) -> None:
+    settings.KB_RENDERING = rendering  # type: ignore[assignment]
+    # the retriever is rebuilt with the new rendering on the next prompt
+    knowledge_base_registry.current.derived.pop("retriever", None)
+
+
+async def judge(case: QACase, answer: str) -> int:
+    from bot.services.openai import get_openai_client  # noqa: PLC0415
+
+    client = get_openai_client()
+    response = await client.client.chat.completions.create(
+        model=client.model_name,
+        response_format={"type": "json_object"},
+        messages=[
+            {"role": "system", "content": JUDGE_PROMPT.format(criteria=", ".join(SCORE_CRITERIA))},
+            {
+                "role": "user",
+                "content": (
+                    f"Question: {case.question}\n\nReference answer:\n{case.reference}\n\nCandidate answer:\n{answer}"
+                ),
+            },
+        ],
+    )
+    scores = json.loads(response.choices[0].message.content or "{}")
+    return sum(min(10, max(0, int(scores.get(criterion, 0)))) for criterion in SCORE_CRITERIA)
+
+
+async def benchmark(rendering: str, cases: list[QACase], use_llm: bool) -> RenderingReport:
+    use_rendering(rendering)
+    knowledge_base = knowledge_base_registry.current
+    full_text = knowledge_base.text if rendering == "json" else render_document(knowledge_base.data, rendering)
+    report = RenderingReport(rendering=rendering, full_tokens=estimate_tokens(full_text))
+
+    for case in cases:
+        start = perf_counter()
+        prompt = build_prompt(MODEL_NAME, system="", question=case.question, query=case.question)
+        report.build_ms.append((perf_counter() - start) * 1000)
+        report.prompt_tokens.append(prompt.tokens)
+        report.context_tokens.append(estimate_tokens(prompt.knowledge_base))
+
+        if not use_llm:
+            continue
+
+        from bot.services.router import get_llm_router  # noqa: PLC0415
+
+        start = perf_counter()
+        answer = await get_llm_router().answer(question=case.question, language_code=case.language)
+        report.answer_seconds.append(perf_counter() - start)
+        report.scores.append(await judge(case, answer))
+
+    print(f"✅ {rendering}: {len(cases)} questions, budget {get_token_budget(MODEL_NAME)} tokens")
+    return report
+
+
+def print_reports(reports: list[RenderingReport]) -> None:
+    baseline = reports[0]
+    baseline_score = statistics.mean(baseline.scores) if baseline.scores else None
+
+    print(
+        f"\n{'rendering':<10} {'kb tokens':>10} {'vs ' + baseline.rendering:>9} {'context':>8} {'prompt':>8} "
+        f"{'build ms':>9} {'answer s':>9} {'score/50':>9} {'delta':>7}",
+    )
+    for report in reports:
+        saving = report.full_tokens / baseline.full_tokens - 1
+        score = statistics.mean(report.scores) if report.scores else None
+        answer_seconds = statistics.median(report.answer_seconds) if report.answer_seconds else None
+        print(
+            f"{report.rendering:<10} {report.full_tokens:>10} {saving:>+9.1%} "
+            f"{statistics.mean(report.context_tokens):>8.0f} {statistics.mean(report.prompt_tokens):>8.0f} "
+            f"{statistics.median(report.build_ms):>9.2f} "
+            f"{'-' if answer_seconds is None else f'{answer_seconds:.2f}':>9} "
+            f"{'-' if score is None else f'{score:.1f}':>9} "
+            f"{'-' if score is None or baseline_score is None else f'{score - baseline_score:+.1f}':>7}",
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renderings", default=",".join(RENDERINGS), help="comma separated, first is the baseline")
+    parser.add_argument("--llm", action="store_true", help="answer and grade every question with the LLM")
+    parser.add_argument("--limit", type=int, default=None, help="number of questions")
+    args = parser.parse_args()
+
+    cases = load_cases(args.limit)
+    if not cases:
+        print("❌ No questions found")
+        return
+
+    reports = [await benchmark(rendering, cases, args.llm) for rendering in args.renderings.split(",")]
+    print_reports(reports)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,11 +6,14 @@ import uvloop
 from loguru import logger
 from sentry_sdk.integrations.loguru import LoggingLevels, LoguruIntegration
 
+from bot.cache.redis import local_caches
 from bot.core.config import settings
-from bot.core.loader import app, bot, dp
+from bot.core.loader import app, bot, dp, redis_client
 from bot.handlers import get_handlers_router
 from bot.handlers.metrics import MetricsView
 from bot.keyboards.default_commands import remove_default_commands, set_default_commands
+from bot.knowledge.registry import knowledge_base_registry
+from bot.knowledge.retrieval import get_knowledge_retriever
 from bot.middlewares import register_middlewares
 from bot.middlewares.prometheus import prometheus_middleware_factory
 
@@ -22,6 +25,10 @@ async def on_startup() -> None:
 
     dp.include_router(get_handlers_router())
 
+    get_knowledge_retriever()
+    knowledge_base_registry.start(redis_client)
+    local_caches.start(redis_client)
+
     if settings.USE_WEBHOOK:
         app.middlewares.append(prometheus_middleware_factory())
         app.router.add_route("GET", "/metrics", MetricsView)
@@ -50,6 +57,9 @@ async def on_startup() -> None:
 async def on_shutdown() -> None:
     logger.info("bot stopping...")
 
+    await knowledge_base_registry.stop()
+    await local_caches.stop()
+
     await remove_default_commands(bot)
 
     await dp.storage.close()
@@ -0,0 +1,218 @@
+from __future__ import annotations
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass
+from time import monotonic
+from typing import TYPE_CHECKING, cast
+
+import orjson
+from loguru import logger
+
+from bot.cache.redis import set_redis_value
+from bot.core.config import settings
+from bot.core.loader import redis_client
+from bot.knowledge.retrieval import question_terms
+from bot.knowledge.sections import get_knowledge_base_version
+from bot.services.metrics import answer_cache_requests, similar_answer_requests
+from bot.utils.simhash import SimHashIndex, simhash
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable
+
+ANSWERS_NAMESPACE = "answers"
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+WHITESPACE_RE = re.compile(r"\s+", re.UNICODE)
+
+SIMILAR_REFRESH_INTERVAL = 30  # seconds between re-reading the shared index from Redis
+
+
+def normalize_question(question: str) -> str:
+    """Casefold the question and collapse punctuation and whitespace.
+
+    Example:
+    >>> normalize_question("  What is   eSIM?! ")
+    "what is esim"
+
+    """
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = PUNCTUATION_RE.sub(" ", text)
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+def build_answer_key(question: str, language_code: str, kb_version: str | None = None) -> str:
+    """Cache key of an answer, the knowledge base version makes old answers unreachable after an update."""
+    kb_version = kb_version or get_knowledge_base_version()
+    digest = hashlib.sha1(normalize_question(question).encode(), usedforsecurity=False).hexdigest()
+    return f"{ANSWERS_NAMESPACE}:{kb_version}:{language_code}:{digest}"
+
+
+async def get_answer_by_key(key: str) -> str | None:
+    value = await redis_client.get(key)
+    return None if value is None else value.decode() if isinstance(value, bytes) else str(value)
+
+
+async def get_cached_answer(question: str, language_code: str) -> str | None:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+
+    value = await get_answer_by_key(build_answer_key(question, language_code))
+    if value is None:
+        answer_cache_requests.labels(result="miss").inc()
+        return None
+
+    answer_cache_requests.labels(result="hit").inc()
+    return value
+
+
+async def set_cached_answer(question: str, language_code: str, answer: str, kb_version: str | None = None) -> None:
+    """Store an answer under the knowledge base version it was requested with.
+
+    An answer generated while the knowledge base was swapped is not stored under the new version.
+    """
+    if not settings.ANSWER_CACHE_ENABLED or not answer:
+        return
+
+    kb_version = kb_version or get_knowledge_base_version()
+    key = build_answer_key(question, language_code, kb_version)
+    await set_redis_value(key=key, value=answer, ttl=settings.ANSWER_CACHE_TTL)
+
+    if settings.SIMILAR_ANSWERS_ENABLED:
+        await similar_questions.add(question, language_code, key, kb_version)
+
+
+def question_signature(terms: frozenset[str]) -> int | None:
+    return simhash(sorted(terms)) if terms else None
+
+
+def term_overlap(a: frozenset[str], b: frozenset[str]) -> float:
+    """Jaccard similarity of two term sets."""
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def encode_entry(answer_key: str, terms: frozenset[str]) -> str:
+    return orjson.dumps({"key": answer_key, "terms": sorted(terms)}).decode()
+
+
+def decode_entry(value: str | bytes) -> tuple[str, frozenset[str]] | None:
+    try:
+        data = orjson.loads(value)
+        return data["key"], frozenset(data["terms"])
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        # stored without its terms, it can not be verified
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class SimilarQuestion:
+    answer_key: str
+    signature: int  # of the answered question
+    similarity: float  # of the SimHash signatures
+    overlap: float  # of the question terms
+
+
+class SimilarQuestions:
+    """Near-duplicate index of answered questions per language.
+
+    Signatures are stored in a Redis hash so that every replica shares them,
+    while matching runs against an in-process copy refreshed every few seconds.
+    SimHash only finds the candidates: a few short questions that differ in one word,
+    "Japan" or "China", get nearly the same signature, so a candidate is served only
+    if its terms match the question's too.
+    """
+
+    def __init__(self, refresh_interval: float = SIMILAR_REFRESH_INTERVAL) -> None:
+        self.refresh_interval = refresh_interval
+        # language code -> (redis key, index, refreshed at)
+        self.indexes: dict[str, tuple[str, SimHashIndex, float]] = {}
+
+    @staticmethod
+    def build_key(language_code: str, kb_version: str | None = None) -> str:
+        return f"{ANSWERS_NAMESPACE}:similar:{kb_version or get_knowledge_base_version()}:{language_code}"
+
+    async def get_index(self, language_code: str) -> SimHashIndex:
+        key = self.build_key(language_code)
+        cached_key, cached_index, refreshed_at = self.indexes.get(language_code, ("", SimHashIndex(), 0.0))
+        # a new knowledge base version changes the key and forces a reload
+        if cached_key == key and monotonic() - refreshed_at < self.refresh_interval:
+            return cached_index
+
+        index = SimHashIndex()
+        entries = await cast("Awaitable[dict[bytes, bytes]]", redis_client.hgetall(key))
+        for signature, entry in entries.items():
+            index.add(int(signature), entry.decode())
+
+        self.indexes[language_code] = (key, index, monotonic())
+        return index
+
+    async def add(self, question: str, language_code: str, answer_key: str, kb_version: str | None = None) -> None:
+        terms = question_terms(normalize_question(question))
+        signature = question_signature(terms)
+        if signature is None:
+            return
+
+        key = self.build_key(language_code, kb_version)
+        entry = encode_entry(answer_key, terms)
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.hset(key, str(signature), entry)
+            pipeline.expire(key, settings.ANSWER_CACHE_TTL)
+            await pipeline.execute()
+
+        if key == self.build_key(language_code):
+            (await self.get_index(language_code)).add(signature, entry)
+
+    async def discard(self, language_code: str, signature: int) -> None:
+        (await self.get_index(language_code)).remove(signature)
+        await cast("Awaitable[int]", redis_client.hdel(self.build_key(language_code), str(signature)))
+
+    async def find(self, question: str, language_code: str) -> SimilarQuestion | None:
+        """The closest answered question with the same terms, ``None`` when there is none."""
+        terms = question_terms(normalize_question(question))
+        signature = question_signature(terms)
+        if signature is None:
+            return None
+
+        index = await self.get_index(language_code)
+        for candidate, entry, score in index.candidates(signature, settings.SIMILAR_ANSWERS_THRESHOLD):
+            decoded = decode_entry(entry)
+            if decoded is None:
+                continue
+
+            answer_key, candidate_terms = decoded
+            overlap = term_overlap(terms, candidate_terms)
+            if overlap >= settings.SIMILAR_ANSWERS_MIN_OVERLAP:
+                return SimilarQuestion(answer_key=answer_key, signature=candidate, similarity=score, overlap=overlap)
+            similar_answer_requests.labels(result="rejected").inc()
+
+        return None
+
+
+similar_questions = SimilarQuestions()
+
+
+async def get_similar_answer(question: str, language_code: str) -> str | None:
+    """Serve the cached answer of a previously answered paraphrase of the question."""
+    if not settings.ANSWER_CACHE_ENABLED or not settings.SIMILAR_ANSWERS_ENABLED:
+        return None
+
+    found = await similar_questions.find(question, language_code)
+    if found is None:
+        similar_answer_requests.labels(result="miss").inc()
+        return None
+
+    value = await get_answer_by_key(found.answer_key)
+    if value is None:
+        # the answer has expired, forget its signature
+        await similar_questions.discard(language_code, found.signature)
+        similar_answer_requests.labels(result="miss").inc()
+        return None
+
+    similar_answer_requests.labels(result="hit").inc()
+    logger.debug(
+        "Similar answer found | lang={} | similarity={:.2f} | overlap={:.2f}",
+        language_code,
+        found.similarity,
+        found.overlap,
+    )
+    return value
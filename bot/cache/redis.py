@@ -1,18 +1,38 @@
 from __future__ import annotations
+import asyncio
+import contextlib
+import math
+import random
+import struct
+import weakref
+from dataclasses import dataclass, field
+from datetime import timedelta
 from functools import wraps
+from time import perf_counter, time
 from typing import TYPE_CHECKING, Any, TypeVar
 
-from bot.cache.serialization import AbstractSerializer, PickleSerializer
+from cachetools import TLRUCache
+from loguru import logger
+from redis.exceptions import LockError, RedisError
+
+from bot.cache.serialization import AbstractSerializer, SerializationError, VersionedSerializer
+from bot.core.config import settings
 from bot.core.loader import redis_client
+from bot.services.metrics import cache_recomputations, cache_requests
 
 if TYPE_CHECKING:
     from collections.abc import Awaitable, Callable
-    from datetime import timedelta
 
     from redis.asyncio import Redis
 
 
 DEFAULT_TTL = 10
+INVALIDATION_CHANNEL = "cache:invalidate"  # keys removed by clear_cache, local layers drop them too
+RECONNECT_DELAY = 5  # seconds
+LOCK_TIMEOUT = 10  # seconds, longest expected recomputation of a cached value
+ENTRY_HEADER = struct.Struct(">dd")  # recomputation seconds and logical expiry (unix time) of the value
+
+_MISSING = object()
 
 _Func = TypeVar("_Func")
 Args = str | int  # basically only user_id is used as identifier
@@ -30,23 +50,264 @@ async def set_redis_value(
     key: bytes | str,
     value: bytes | str,
     ttl: int | timedelta | None = DEFAULT_TTL,
-    is_transaction: bool = False,
 ) -> None:
-    """Set a value in Redis with an optional time-to-live (TTL)."""
-    async with redis_client.pipeline(transaction=is_transaction) as pipeline:
-        await pipeline.set(key, value)
-        if ttl:
-            await pipeline.expire(key, ttl)
+    """Set a value in Redis with an optional time-to-live (TTL), a single SET EX command."""
+    await redis_client.set(key, value, ex=ttl or None)
+
+
+class LocalCaches:
+    """In-process layer in front of Redis, one bounded LRU cache per cached function.
+
+    Values are kept deserialized, so a hit costs no network round trip. An entry expires with
+    the Redis value it was read from, and after ``ttl`` seconds at the latest. ``clear_cache``
+    publishes the removed key and every replica drops it from its local layer. While the
+    subscription is down invalidations are lost, so everything cached locally is dropped on reconnect.
+    """
+
+    def __init__(self, ttl: float = settings.CACHE_LOCAL_TTL, maxsize: int = settings.CACHE_LOCAL_MAXSIZE) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key prefix of the function -> its values with the unix time they expire
+        self.caches: dict[str, TLRUCache[str, tuple[Any, float]]] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def _expires_at(self, _key: str, entry: tuple[Any, float], now: float) -> float:
+        return min(entry[1], now + self.ttl)
+
+    def create(self, prefix: str) -> TLRUCache[str, tuple[Any, float]]:
+        cache: TLRUCache[str, tuple[Any, float]] = TLRUCache(maxsize=self.maxsize, ttu=self._expires_at, timer=time)
+        self.caches[prefix] = cache
+        return cache
+
+    def invalidate(self, key: str) -> None:
+        for prefix, cache in self.caches.items():
+            if key.startswith(prefix):
+                cache.pop(key, None)
+
+    def clear(self) -> None:
+        for cache in self.caches.values():
+            cache.clear()
+
+    async def publish(self, redis: Redis, key: str) -> None:
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, key)
+        except RedisError:
+            logger.exception("Failed to publish cache invalidation | key={}", key)
+
+    async def _subscribe(self, redis: Redis) -> None:
+        """Apply invalidations of the other replicas until the subscription is lost."""
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # invalidations published while we were not subscribed are lost
+                self.clear()
+
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate(message["data"].decode())
+        except RedisError:
+            logger.exception("Cache invalidation subscription lost, reconnecting | delay={}", RECONNECT_DELAY)
+
+    async def listen(self, redis: Redis) -> None:
+        while True:
+            await self._subscribe(redis)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def start(self, redis: Redis) -> None:
+        if not settings.CACHE_LOCAL_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self.listen(redis), name="cache_invalidations")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+local_caches = LocalCaches()
+
+
+def build_function_key(func: Callable[..., Any], namespace: str, key: str) -> str:
+    return f"{namespace}:{func.__module__}:{func.__name__}:{key}"
+
+
+def pack_entry(payload: bytes, delta: float, expires_at: float) -> bytes:
+    return ENTRY_HEADER.pack(delta, expires_at) + payload
+
+
+def unpack_entry(raw: bytes) -> tuple[bytes, float, float]:
+    """Payload, recomputation seconds and logical expiry of a value stored by ``pack_entry``."""
+    delta, expires_at = ENTRY_HEADER.unpack_from(raw)
+    return raw[ENTRY_HEADER.size :], delta, expires_at
+
+
+def should_refresh_early(delta: float, expires_at: float, beta: float, now: float) -> bool:
+    """XFetch: recompute before the expiry with a probability growing as it nears and with the recomputation cost.
+
+    See "Optimal Probabilistic Cache Stampede Prevention", Vattani et al.
+    """
+    return now - delta * beta * math.log(1 - random.random()) >= expires_at  # noqa: S311
 
-        await pipeline.execute()
 
+@dataclass(slots=True)
+class CachedFunction:
+    """The cache layers of one function decorated with ``cached``: local, Redis and the function itself."""
 
-def cached(
+    func: Callable[..., Awaitable[Any]]
+    cache: Redis
+    serializer: AbstractSerializer
+    ttl: float  # seconds
+    local_cache: TLRUCache[str, tuple[Any, float]] | None = None
+    lock: bool = False
+    early_refresh: float = 0.0
+    stale_ttl: int = 0
+    locks: weakref.WeakValueDictionary[str, asyncio.Lock] = field(default_factory=weakref.WeakValueDictionary)
+
+    @property
+    def with_header(self) -> bool:
+        """The recomputation time and logical expiry are stored in front of the value."""
+        return self.early_refresh > 0 or self.stale_ttl > 0
+
+    def decode(self, raw: bytes | None) -> tuple[Any, float, float] | None:
+        """Value, recomputation seconds and logical expiry, ``None`` for a missing or unreadable value."""
+        if raw is None:
+            return None
+        try:
+            if not self.with_header:
+                return self.serializer.deserialize(raw), 0.0, math.inf
+            payload, delta, expires_at = unpack_entry(raw)
+            return self.serializer.deserialize(payload), delta, expires_at
+        except (SerializationError, struct.error):
+            # written in an older format or schema version, recomputed like a miss
+            cache_requests.labels(layer="redis", result="incompatible").inc()
+            return None
+
+    async def read(self, key: str) -> tuple[bytes | None, float]:
+        """Stored value and the unix time Redis expires it, read in one round trip."""
+        if self.local_cache is None or self.with_header:
+            # the header has the logical expiry, which comes before the one of Redis
+            return await self.cache.get(key), math.inf
+
+        async with self.cache.pipeline(transaction=False) as pipeline:
+            pipeline.get(key)
+            pipeline.pttl(key)
+            raw, pttl = await pipeline.execute()
+        return raw, time() + pttl / 1000 if pttl >= 0 else math.inf
+
+    def remember(self, key: str, value: Any, expires_at: float) -> None:
+        """Keep a value locally no longer than Redis does, nor than the decorator's ttl."""
+        if self.local_cache is not None:
+            self.local_cache[key] = (value, min(expires_at, time() + self.ttl))
+
+    async def compute(self, key: str, args: tuple[Args, ...], kwargs: dict[str, Kwargs]) -> Any:
+        start = perf_counter()
+        result = await self.func(*args, **kwargs)
+        delta = perf_counter() - start
+
+        # Store the result in Redis
+        payload = self.serializer.serialize(result)
+        if self.with_header:
+            payload = pack_entry(payload, delta, time() + self.ttl)
+        await self.cache.set(key, payload, ex=math.ceil(self.ttl) + self.stale_ttl or None)
+
+        self.remember(key, result, time() + self.ttl)
+        return result
+
+    async def recompute(self, key: str, args: tuple[Args, ...], kwargs: dict[str, Kwargs], reason: str) -> Any:
+        """Recompute a value that is still served, ``_MISSING`` when another caller already does it."""
+        key_lock = self.locks.setdefault(key, asyncio.Lock())
+        if key_lock.locked():
+            return _MISSING
+
+        async with key_lock:
+            redis_lock = self.cache.lock(f"lock:{key}", timeout=LOCK_TIMEOUT)
+            try:
+                acquired = await redis_lock.acquire(blocking=False)
+            except RedisError:
+                logger.exception("Cache lock failed, recomputing anyway | key={}", key)
+                acquired = None
+            if acquired is False:
+                return _MISSING
+
+            try:
+                cache_recomputations.labels(reason=reason).inc()
+                return await self.compute(key, args, kwargs)
+            finally:
+                if acquired:
+                    with contextlib.suppress(LockError, RedisError):
+                        await redis_lock.release()
+
+    async def compute_locked(self, key: str, args: tuple[Args, ...], kwargs: dict[str, Kwargs]) -> Any:
+        """Compute a missing value once: callers of this process wait on a lock, other replicas on a Redis lock."""
+        async with self.locks.setdefault(key, asyncio.Lock()):
+            redis_lock = self.cache.lock(f"lock:{key}", timeout=LOCK_TIMEOUT)
+            try:
+                acquired = await redis_lock.acquire(blocking_timeout=LOCK_TIMEOUT)
+            except RedisError:
+                logger.exception("Cache lock failed, computing anyway | key={}", key)
+                acquired = False
+
+            try:
+                # whoever held the lock before us may have stored the value
+                entry = self.decode(await self.cache.get(key))
+                if entry is not None:
+                    cache_requests.labels(layer="redis", result="hit_after_wait").inc()
+                    return entry[0]
+
+                cache_recomputations.labels(reason="miss").inc()
+                return await self.compute(key, args, kwargs)
+            finally:
+                if acquired:
+                    with contextlib.suppress(LockError, RedisError):
+                        await redis_lock.release()
+
+    async def get(self, key: str, args: tuple[Args, ...], kwargs: dict[str, Kwargs]) -> Any:
+        if self.local_cache is not None:
+            local_entry = self.local_cache.get(key)
+            if local_entry is not None:
+                cache_requests.labels(layer="local", result="hit").inc()
+                return local_entry[0]
+            cache_requests.labels(layer="local", result="miss").inc()
+
+        # Check if the key is in the cache
+        raw, redis_expires_at = await self.read(key)
+        entry = self.decode(raw)
+        if entry is None:
+            cache_requests.labels(layer="redis", result="miss").inc()
+            if self.lock:
+                return await self.compute_locked(key, args, kwargs)
+            cache_recomputations.labels(reason="miss").inc()
+            return await self.compute(key, args, kwargs)
+
+        result, delta, expires_at = entry
+        now = time()
+        if now >= expires_at:
+            reason = "stale"
+        elif self.early_refresh > 0 and should_refresh_early(delta, expires_at, self.early_refresh, now):
+            reason = "early"
+        else:
+            cache_requests.labels(layer="redis", result="hit").inc()
+            self.remember(key, result, min(expires_at, redis_expires_at))
+            return result
+
+        # one caller recomputes, the others keep getting the current value meanwhile
+        cache_requests.labels(layer="redis", result=reason).inc()
+        refreshed = await self.recompute(key, args, kwargs, reason)
+        return result if refreshed is _MISSING else refreshed
+
+
+def cached(  # noqa: PLR0913
     ttl: int | timedelta = DEFAULT_TTL,
     namespace: str = "main",
     cache: Redis = redis_client,
     key_builder: Callable[..., str] = build_key,
     serializer: AbstractSerializer | None = None,
+    local: bool = False,
+    lock: bool = False,
+    early_refresh: float = 0.0,
+    stale_ttl: int = 0,
 ) -> Callable[[Callable[..., Awaitable[_Func]]], Callable[..., Awaitable[_Func]]]:
     """Caches the function's return value into a key generated with module_name, function_name, and args.
 
@@ -56,36 +317,36 @@ def cached(
         cache (Redis): Redis instance for storing cached data.
         key_builder (Callable[..., str]): Function to build cache keys.
         serializer (AbstractSerializer | None): Serializer for cache data.
+        local (bool): Keep values in the in-process layer too, only for values that are not mutated by callers.
+        lock (bool): On a miss only one caller per key, across replicas, calls the function, the others wait for it.
+        early_refresh (float): XFetch beta, above zero a caller recomputes the value shortly before it expires.
+        stale_ttl (int): Seconds an expired value is still served while one caller recomputes it.
 
     Returns:
         Callable: A decorator that wraps the original function with caching logic.
 
     """
-    if serializer is None:
-        serializer = PickleSerializer()
 
     def decorator(func: Callable[..., Awaitable[_Func]]) -> Callable[..., Awaitable[_Func]]:
+        cached_function = CachedFunction(
+            func=func,
+            cache=cache,
+            serializer=serializer or VersionedSerializer(),
+            ttl=ttl.total_seconds() if isinstance(ttl, timedelta) else ttl,
+            local_cache=(
+                local_caches.create(build_function_key(func, namespace, ""))
+                if local and settings.CACHE_LOCAL_ENABLED
+                else None
+            ),
+            lock=lock,
+            early_refresh=early_refresh,
+            stale_ttl=stale_ttl,
+        )
+
         @wraps(func)
         async def wrapper(*args: Args, **kwargs: Kwargs) -> Any:
-            key = key_builder(*args, **kwargs)
-            key = f"{namespace}:{func.__module__}:{func.__name__}:{key}"
-
-            # Check if the key is in the cache
-            cached_value = await cache.get(key)
-            if cached_value is not None:
-                return serializer.deserialize(cached_value)
-
-            # If not in cache, call the original function
-            result = await func(*args, **kwargs)
-
-            # Store the result in Redis
-            await set_redis_value(
-                key=key,
-                value=serializer.serialize(result),
-                ttl=ttl,
-            )
-
-            return result
+            key = build_function_key(func, namespace, key_builder(*args, **kwargs))
+            return await cached_function.get(key, args, kwargs)
 
         return wrapper
 
@@ -111,7 +372,11 @@ async def clear_cache(
     """
     namespace = kwargs.get("namespace", "main")
 
-    key = build_key(*args, **kwargs)
-    key = f"{namespace}:{func.__module__}:{func.__name__}:{key}"
+    key = build_function_key(func, namespace, build_key(*args, **kwargs))
 
     await redis_client.delete(key)
+
+    # the local layer of this replica right away, the other replicas through pub/sub
+    local_caches.invalidate(key)
+    if settings.CACHE_LOCAL_ENABLED:
+        await local_caches.publish(redis_client, key)
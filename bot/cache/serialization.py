@@ -1,10 +1,31 @@
 # ruff: noqa: S301
+from __future__ import annotations
+import dataclasses
+import datetime
+import importlib
 import pickle
+import struct
+import zlib
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import orjson
 
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+    from sqlalchemy.orm import DeclarativeBase
+
+HEADER = struct.Struct(">HB")  # schema version, compression
+COMPRESS_ABOVE = 1024  # bytes, smaller payloads are not worth the compression time
+
+NO_COMPRESSION = 0
+COMPRESSIONS = {"zlib": 1, "zstd": 2, "lz4": 3}
+
+
+class SerializationError(ValueError):
+    """The stored value has another format or schema version, callers treat it as a cache miss."""
+
 
 class AbstractSerializer(ABC):
     @abstractmethod
@@ -36,3 +57,154 @@ class JSONSerializer(AbstractSerializer):
     def deserialize(self, obj: str) -> Any:
         """Deserialize values using JSON."""
         return orjson.loads(obj)
+
+
+def _optional_module(name: str, feature: str) -> Any:
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        msg = f"{feature} requires the {name.split('.')[0]} package"
+        raise RuntimeError(msg) from e
+
+
+def _get_codec(name: str) -> tuple[Callable[[Any], bytes], Callable[[bytes], Any]]:
+    if name == "orjson":
+        return orjson.dumps, orjson.loads
+    if name == "msgpack":
+        msgpack = _optional_module("msgpack", "msgpack encoding")
+        return msgpack.packb, msgpack.unpackb
+    msg = f"Unknown codec: {name}"
+    raise ValueError(msg)
+
+
+def _get_compression(name: str) -> tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    if name == "zlib":
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    if name == "zstd":
+        zstandard = _optional_module("zstandard", "zstd compression")
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    if name == "lz4":
+        lz4_frame = _optional_module("lz4.frame", "lz4 compression")
+        return lz4_frame.compress, lz4_frame.decompress
+    msg = f"Unknown compression: {name}"
+    raise ValueError(msg)
+
+
+class VersionedSerializer(AbstractSerializer):
+    """Serialize JSON-like values with orjson or msgpack behind a schema version header.
+
+    Values written with another ``version`` raise ``SerializationError`` instead of being
+    decoded into the wrong shape, so bumping the version invalidates the cached values.
+    Payloads larger than ``compress_above`` bytes are compressed, the header records how.
+    """
+
+    def __init__(
+        self,
+        version: int = 1,
+        codec: str = "orjson",
+        compression: str | None = None,
+        compress_above: int = COMPRESS_ABOVE,
+    ) -> None:
+        self.version = version
+        self.encode, self.decode = _get_codec(codec)
+        self.compress_above = compress_above
+        self.compression = NO_COMPRESSION
+        self.compress: Callable[[bytes], bytes] | None = None
+        # small payloads are stored uncompressed whatever the compression
+        self.decompressors: dict[int, Callable[[bytes], bytes]] = {NO_COMPRESSION: lambda data: data}
+        if compression:
+            self.compression = COMPRESSIONS[compression]
+            self.compress, self.decompressors[self.compression] = _get_compression(compression)
+
+    def serialize(self, obj: Any) -> bytes:
+        payload = self.encode(obj)
+        if self.compress is not None and len(payload) > self.compress_above:
+            return HEADER.pack(self.version, self.compression) + self.compress(payload)
+        return HEADER.pack(self.version, NO_COMPRESSION) + payload
+
+    def deserialize(self, obj: bytes) -> Any:
+        try:
+            version, compression = HEADER.unpack_from(obj)
+        except struct.error as e:
+            raise SerializationError from e
+
+        decompress = self.decompressors.get(compression)
+        if version != self.version or decompress is None:
+            msg = f"Stored value has schema version {version} and compression {compression}"
+            raise SerializationError(msg)
+
+        try:
+            return self.decode(decompress(obj[HEADER.size :]))
+        except Exception as e:
+            raise SerializationError from e
+
+
+class ModelRowSerializer(AbstractSerializer):
+    """Serialize lists of ORM models as row tuples of their column values.
+
+    Only the columns are stored, without the ORM state pickle carries along, and the models come
+    back as transient instances. The schema version is derived from the column names, a migration
+    that changes them makes older cached rows a miss instead of an error.
+    """
+
+    def __init__(
+        self,
+        model: type[DeclarativeBase],
+        codec: str = "orjson",
+        compression: str | None = None,
+        compress_above: int = COMPRESS_ABOVE,
+    ) -> None:
+        self.model = model
+        columns = list(model.__table__.columns)
+        self.columns = [column.key for column in columns]
+        # datetimes are stored as ISO strings, which every codec supports
+        self.datetimes = [index for index, column in enumerate(columns) if column.type.python_type is datetime.datetime]
+        self.serializer = VersionedSerializer(
+            version=zlib.crc32(",".join(self.columns).encode()) & 0xFFFF,
+            codec=codec,
+            compression=compression,
+            compress_above=compress_above,
+        )
+
+    def serialize(self, obj: Sequence[DeclarativeBase]) -> bytes:
+        rows = []
+        for item in obj:
+            row = [getattr(item, column) for column in self.columns]
+            for index in self.datetimes:
+                if row[index] is not None:
+                    row[index] = row[index].isoformat()
+            rows.append(row)
+        return self.serializer.serialize(rows)
+
+    def deserialize(self, obj: bytes) -> list[Any]:
+        items = []
+        for row in self.serializer.deserialize(obj):
+            for index in self.datetimes:
+                if row[index] is not None:
+                    row[index] = datetime.datetime.fromisoformat(row[index])
+            items.append(self.model(**dict(zip(self.columns, row, strict=True))))
+        return items
+
+
+class DataclassSerializer(AbstractSerializer):
+    """Serialize an instance of a flat dataclass, or ``None``, as a row of its field values.
+
+    Like ``ModelRowSerializer`` the schema version is derived from the field names.
+    """
+
+    def __init__(self, cls: type[Any], codec: str = "orjson") -> None:
+        self.cls = cls
+        self.fields = [field.name for field in dataclasses.fields(cls)]
+        self.serializer = VersionedSerializer(version=zlib.crc32(",".join(self.fields).encode()) & 0xFFFF, codec=codec)
+
+    def serialize(self, obj: Any) -> bytes:
+        return self.serializer.serialize(None if obj is None else [getattr(obj, name) for name in self.fields])
+
+    def deserialize(self, obj: bytes) -> Any:
+        row = self.serializer.deserialize(obj)
+        if row is None:
+            return None
+        try:
+            return self.cls(*row)
+        except TypeError as e:
+            raise SerializationError from e
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import asyncio
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from redis.exceptions import LockError, RedisError
+
+from bot.core.config import settings
+from bot.core.loader import redis_client
+from bot.services.metrics import single_flight_calls
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from redis.asyncio import Redis
+    from redis.asyncio.lock import Lock
+
+SINGLE_FLIGHT_NAMESPACE = "singleflight"
+# published when the leader is cancelled, the question is still open and a follower runs it instead
+TAKEOVER = "\x00takeover"
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one upstream call.
+
+    Inside a process followers await the leader's future. Across replicas the
+    leader holds a short Redis lock and broadcasts its result through pub/sub,
+    followers on other replicas wait for that message instead of calling upstream.
+    """
+
+    def __init__(self, cache: Redis = redis_client, timeout: float = settings.SINGLE_FLIGHT_TIMEOUT) -> None:
+        self.cache = cache
+        self.timeout = timeout
+        self.inflight: dict[str, asyncio.Future[str]] = {}
+
+    async def do(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[str]],
+        lookup: Callable[[], Awaitable[str | None]] | None = None,
+    ) -> str:
+        """Run ``func`` once per key, ``lookup`` reads a result the leader may have already stored."""
+        future = self.inflight.get(key)
+        if future is not None:
+            single_flight_calls.labels(role="local_follower").inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the leader was cancelled, not us: take over
+                return await self.do(key, func, lookup)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await self._run_distributed(key, func, lookup)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # followers handle the exception, the leader re-raises it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self.inflight.pop(key, None)
+
+    async def _run_distributed(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[str]],
+        lookup: Callable[[], Awaitable[str | None]] | None,
+    ) -> str:
+        lock = self.cache.lock(f"{SINGLE_FLIGHT_NAMESPACE}:lock:{key}", timeout=self.timeout)
+        channel = f"{SINGLE_FLIGHT_NAMESPACE}:result:{key}"
+
+        try:
+            acquired = await lock.acquire(blocking=False)
+        except RedisError:
+            logger.exception("Single-flight lock failed, calling upstream directly | key={}", key)
+            return await func()
+
+        if not acquired:
+            result = await self._wait_remote(channel, lock, lookup)
+            if result == TAKEOVER:
+                logger.info("Single-flight leader went away, taking over | key={}", key)
+                return await self._run_distributed(key, func, lookup)
+            if result is not None:
+                single_flight_calls.labels(role="remote_follower").inc()
+                return result
+
+            logger.warning("Single-flight leader did not respond in time, calling upstream | key={}", key)
+            single_flight_calls.labels(role="leader").inc()
+            return await func()
+
+        single_flight_calls.labels(role="leader").inc()
+        # a cancelled leader hands the question over, a failed one lets the followers fail fast
+        message = TAKEOVER
+        try:
+            result = await func()
+        except Exception:
+            message = ""
+            raise
+        else:
+            message = result
+            return result
+        finally:
+            # released first, so that a follower taking over can acquire the lock
+            try:
+                await lock.release()
+            except LockError:
+                logger.warning("Single-flight lock expired before release | key={}", key)
+            except RedisError:
+                logger.exception("Single-flight lock release failed | key={}", key)
+            await self._publish(channel, message)
+
+    async def _publish(self, channel: str, message: str) -> None:
+        try:
+            await self.cache.publish(channel, message)
+        except RedisError:
+            logger.exception("Single-flight publish failed | channel={}", channel)
+
+    async def _wait_remote(
+        self,
+        channel: str,
+        lock: Lock,
+        lookup: Callable[[], Awaitable[str | None]] | None,
+    ) -> str | None:
+        pubsub = self.cache.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+
+            # the leader may have finished before we subscribed
+            if lookup is not None:
+                result = await lookup()
+                if result is not None:
+                    return result
+            # without a stored result it failed or was cancelled, nothing will be published anymore
+            if not await lock.locked():
+                return TAKEOVER
+
+            deadline = monotonic() + self.timeout
+            while (remaining := deadline - monotonic()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message is None or message["type"] != "message":
+                    continue
+                data = message["data"]
+                return data.decode() if isinstance(data, bytes) else str(data)
+        except RedisError:
+            logger.exception("Single-flight subscription failed | channel={}", channel)
+        finally:
+            await pubsub.reset()
+
+        return None
+
+
+single_flight = SingleFlight()
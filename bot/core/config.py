@@ -1,7 +1,8 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 if TYPE_CHECKING:
@@ -14,6 +15,16 @@ I18N_DOMAIN = "messages"
 DEFAULT_LOCALE = "en"
 
 
+class LLMTier(BaseModel):
+    """Models and limits used for questions whose difficulty score reaches ``min_score``."""
+
+    name: str
+    min_score: float
+    models: dict[str, str]  # provider name -> model, providers without an entry use their default model
+    max_output_tokens: int
+    reasoning_effort: str | None = None  # OpenAI reasoning models only: minimal, low, medium or high
+
+
 class EnvBaseSettings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
@@ -37,10 +48,86 @@ class BotSettings(WebhookSettings):
     BOT_TOKEN: str
     SUPPORT_URL: str | None = None
     RATE_LIMIT: int | float = 0.5  # for throttling control
+    DEBOUNCE_ENABLED: bool = True  # merge text messages sent in quick succession into one question
+    DEBOUNCE_WINDOW: float = 1.5  # seconds of quiet after the last message before answering
+    DEBOUNCE_MAX_WAIT: float = 6.0  # seconds, the window is never extended beyond this since the first message
     GEMINI_API_KEY: str | None = None
     OPENAI_API_KEY: str | None = None
     MANAGERS_GROUP_ID: int | None = None
     USE_I18N: bool = False
+    LLM_PROVIDERS: list[str] = ["openai", "gemini"]  # in order of preference
+    LLM_HEDGING_ENABLED: bool = True
+    LLM_HEDGE_DELAY: float = 8.0  # seconds, used until the primary provider has enough latency samples
+    LLM_ROUTER_TIMEOUT: float = 90.0  # seconds an answer may take in total, across every provider and retry
+    LLM_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5  # seconds, doubled on every attempt and jittered
+    LLM_RETRY_MAX_DELAY: float = 8.0  # longer Retry-After values fail over instead of waiting
+    LLM_BREAKER_WINDOW: int = 60  # seconds of request outcomes the error rate is computed over
+    LLM_BREAKER_MIN_REQUESTS: int = 5
+    LLM_BREAKER_FAILURE_RATIO: float = 0.5
+    LLM_BREAKER_OPEN_SECONDS: int = 30
+    LLM_MAX_CONCURRENCY: int = 20  # concurrent LLM requests per process
+    LLM_MAX_QUEUE: int = 100  # requests waiting for a slot, the rest get a "busy" reply
+    LLM_QUEUE_TIMEOUT: float = 10.0  # seconds a request may wait for a slot
+    LLM_PROMPT_TOKEN_BUDGET: int = 8000  # estimated prompt tokens: instructions, knowledge base, history and question
+    LLM_PROMPT_TOKEN_BUDGETS: dict[str, int] = {}  # per-model overrides, e.g. {"gpt-5-nano": 12000}
+    LLM_CACHE_FRIENDLY_PROMPT: bool = True  # same instructions for every language, language and question last
+    LLM_PREFER_FULL_KB: bool = False  # send the whole knowledge base when it fits, for a cacheable prefix
+    LLM_TIERING_ENABLED: bool = True  # route easy questions to cheap models, hard ones to stronger models
+    LLM_TIERS: list[LLMTier] = [
+        LLMTier(
+            name="simple",
+            min_score=0,
+            models={"openai": "gpt-5-nano", "gemini": "gemini-2.5-flash-lite"},
+            max_output_tokens=1024,
+            reasoning_effort="minimal",
+        ),
+        LLMTier(
+            name="standard",
+            min_score=2,
+            models={"openai": "gpt-5-nano", "gemini": "gemini-2.5-flash-lite"},
+            max_output_tokens=2048,
+            reasoning_effort="low",
+        ),
+        LLMTier(
+            name="complex",
+            min_score=4,
+            models={"openai": "gpt-5-mini", "gemini": "gemini-2.5-flash"},
+            max_output_tokens=4096,
+            reasoning_effort="medium",
+        ),
+    ]
+    KB_RELOAD_ENABLED: bool = True  # pick up knowledge base changes without a restart and share them between replicas
+    KB_RELOAD_INTERVAL: float = 5.0  # seconds between checks of the knowledge base file
+    # knowledge base format in the prompt: json as in the file, minified json, "path: fact" lines,
+    # or compact lines with deduplicated device lists and model ranges (see benchmark_kb.py)
+    KB_RENDERING: Literal["json", "minified", "lines", "compact"] = "json"
+    KB_RETRIEVAL_ENABLED: bool = True
+    KB_RETRIEVAL_TOP_K: int = 4
+    KB_RETRIEVAL_MIN_SCORE: float = 2.0  # below it the full knowledge base is sent
+    INTENTS_ENABLED: bool = True  # answer common single-fact questions from templates, without the LLM
+    INTENTS_MIN_CONFIDENCE: float = 0.8
+    DEVICE_LOOKUP_ENABLED: bool = True  # answer "is my phone supported" from the knowledge base device list
+    ANSWER_BANK_ENABLED: bool = True  # serve graded answers of qa1.json/qa2.json to the same questions
+    ANSWER_BANK_MIN_SCORE: int = 45  # out of 50, lower graded answers are not served
+    ANSWER_BANK_MIN_SIMILARITY: float = 0.85  # cosine of the question terms, 1.0 means the same terms
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_TTL: int = 60 * 60 * 24
+    SIMILAR_ANSWERS_ENABLED: bool = True
+    STREAM_ANSWERS: bool = True  # edit the reply while the model is still generating it
+    MEMORY_ENABLED: bool = True  # send the recent conversation with follow-up questions
+    MEMORY_TURNS: int = 6  # latest messages kept verbatim, questions and answers
+    MEMORY_MAX_TOKENS: int = 1200  # ceiling of the stored turns and summary together
+    MEMORY_TTL: int = 60 * 60 * 6  # seconds since the last question, then the conversation starts over
+    # what happens to an answer still being generated when the same chat asks a new question
+    SUPERSEDED_ANSWERS: Literal["cancel", "discard", "keep"] = "cancel"
+    SIMILAR_ANSWERS_THRESHOLD: float = 0.9  # SimHash similarity of the candidates, 1.0 means identical signatures
+    SIMILAR_ANSWERS_MIN_OVERLAP: float = 0.9  # Jaccard of the question terms a candidate must also reach
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_TIMEOUT: int = 60  # seconds, longest expected LLM call
+    CACHE_LOCAL_ENABLED: bool = True  # in-process layer in front of Redis for @cached(local=True)
+    CACHE_LOCAL_TTL: int = 60  # seconds, clear_cache invalidates it on every replica before that
+    CACHE_LOCAL_MAXSIZE: int = 10_000  # entries per cached function, least recently used are evicted
 
 
 class DBSettings(EnvBaseSettings):
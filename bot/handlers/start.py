@@ -7,13 +7,17 @@ from aiogram.utils.chat_action import ChatActionSender
 
 from bot.keyboards.inline.languages import language_keyboard
 from bot.services.analytics import analytics
-from bot.services.users import set_language_code, get_language_code
+from bot.services.users import UserProfile, set_language_code
 from bot.services.gemini import get_gemini_client
-from bot.services.openai import get_openai_client
+from bot.services.answers import answer_question, stream_answer
+from bot.services.bulkhead import BulkheadFullError
+from bot.services.conversation import clear_conversation, load_conversation, save_conversation
+from bot.services.generations import Generation, chat_generations
 from bot.core.config import settings
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from bot.cache.redis import set_redis_value
 from bot.core.loader import redis_client
+from bot.utils.streaming import ANSWER_PARSE_MODE, MESSAGE_MAX_LEN, MessageStreamWriter
 from loguru import logger
 
 class Onboarding(StatesGroup):
@@ -32,8 +36,9 @@ router = Router(name="start")
 async def start_handler(message: types.Message, state: FSMContext) -> None:
     """Start onboarding and ask user to choose language."""
     await state.set_state(Onboarding.choose_language)
-    # Reset per-session counters
+    # Reset per-session counters and the conversation memory
     await state.update_data(post_start_count=0)
+    await clear_conversation(message.chat.id)
     await message.answer(
         _("WELCOME TO THE GLOBAL & USER-FIRST TELECOMMUNITY!\n\nPlease choose your language:"),
         reply_markup=language_keyboard(),
@@ -73,21 +78,114 @@ async def language_chosen(callback: types.CallbackQuery, state: FSMContext, sess
 
 
 @router.message(Onboarding.ask_question)
-async def question_handler(message: types.Message, state: FSMContext, session) -> None:
+async def question_handler(  # noqa: C901, PLR0915
+    message: types.Message,
+    state: FSMContext,
+    user_profile: UserProfile | None,
+) -> None:
     """Handle user's question via Gemini 2.5 Flash-Lite with FAQ context and selected language."""
     if not message.from_user or not message.text:
         return
+    question = message.text
 
-    user_id = message.from_user.id
     # Determine language preference
-    lang_code = await get_language_code(session=session, user_id=user_id) or (message.from_user.language_code or "en")
+    lang_code = (user_profile and user_profile.language_code) or (message.from_user.language_code or "en")
+
+    # Prepare optional support prompt on the 3rd message
+    data = await state.get_data()
+    msg_count: int = int(data.get("post_start_count", 0)) + 1
+    add_support_prompt = msg_count == 3
+    support_prompts = {
+        "en": ("You can contact technical support directly if your issue remains.", "Contact support", "Please write your question:"),
+        "ru": ("Вы можете связаться напрямую с техподдержкой, если проблема не решена.", "Связаться с техподдержкой", "Напишите ваш вопрос:"),
+        "es": ("Puede contactar con soporte técnico directamente si su problema persiste.", "Contactar con soporte", "Por favor, escriba su pregunta:"),
+        "pt": ("Você pode contatar o suporte técnico diretamente se o problema persistir.", "Contactar o suporte", "Por favor, escreva sua pergunta:"),
+        "fr": ("Vous pouvez contacter le support technique directement si votre problème persiste.", "Contacter le support", "Veuillez écrire votre question :"),
+        "de": ("Sie können den technischen Support direkt kontaktieren, wenn Ihr Problem weiterhin besteht.", "Support kontaktieren", "Bitte schreiben Sie Ihre Frage:"),
+        "zh": ("如果您的问题仍未解决，您可以直接联系技术支持。", "联系技术支持", "请写下您的问题："),
+        "ja": ("問題が解決しない場合は、技術サポートに直接連絡できます。", "サポートに連絡する", "質問を書いてください:"),
+        "ko": ("문제가 해결되지 않은 경우 기술 지원에 직접 문의할 수 있습니다.", "지원팀에 문의", "질문을 작성해 주세요:"),
+        "ar": ("إذا لم تُحل مشكلتك، يمكنك التواصل مباشرة مع الدعم الفني.", "التواصل مع الدعم", "يرجى كتابة سؤالك:"),
+    }
+    prompt_text, button_text, ask_text = support_prompts.get(lang_code, support_prompts.get("en"))
+    support_markup = None
+    if add_support_prompt:
+        kb = InlineKeyboardBuilder()
+        kb.button(text=button_text, callback_data="contact_support")
+        support_markup = kb.as_markup()
+
+    # Earlier questions and answers of this chat, so that follow-ups are understood
+    conversation = await load_conversation(message.chat.id)
+    history = conversation.history()
+
+    async def generate(generation: Generation) -> tuple[bool, str]:
+        """Answer the question, returns whether anything was answered and the text still to send."""
+        if settings.STREAM_ANSWERS:
+            writer = MessageStreamWriter(message)
+            parts: list[str] = []
+            async for delta in stream_answer(
+                question=question,
+                language_code=lang_code,
+                history=history,
+                turn=conversation.questions,
+            ):
+                parts.append(delta)
+                # a discarded answer is still generated to the end for the cache, but no longer shown
+                if not generation.superseded:
+                    await writer.write(delta)
+            answered = not writer.is_empty
+            if answered and not generation.superseded:
+                await writer.finish(
+                    suffix=f"\n\n{prompt_text}" if add_support_prompt else "",
+                    reply_markup=support_markup,
+                )
+                conversation.remember(question, "".join(parts).strip())
+                await save_conversation(message.chat.id, conversation)
+            return answered, ""
+
+        answer_text = await answer_question(
+            question=question,
+            language_code=lang_code,
+            history=history,
+            turn=conversation.questions,
+        )
+        logger.debug(f"GPT answer text: {repr(answer_text)}")
+        if answer_text and not generation.superseded:
+            conversation.remember(question, answer_text)
+            await save_conversation(message.chat.id, conversation)
+        return bool(answer_text), answer_text
 
     # Indicate typing while processing
+    busy = False
     async with ChatActionSender.typing(bot=message.bot, chat_id=message.chat.id):
-        client = get_openai_client()
-        answer_text = await client.answer(question=message.text, language_code=lang_code)
-    logger.debug(f"GPT answer text: {repr(answer_text)}")
-    if not answer_text:
+        try:
+            result = await chat_generations.run(message.chat.id, generate)
+        except BulkheadFullError:
+            # too many questions in flight, shed the load instead of queueing forever
+            busy = True
+            result = (False, "")
+    if result is None:
+        # the user already asked something else, only the newest question is answered
+        return
+    answered, answer_text = result
+
+    if busy:
+        busy_texts = {
+            "en": "I'm receiving a lot of questions right now. Please try again in a minute.",
+            "es": "Estoy recibiendo muchas preguntas en este momento. Por favor, inténtalo de nuevo en un minuto.",
+            "pt": "Estou recebendo muitas perguntas no momento. Por favor, tente novamente em um minuto.",
+            "fr": "Je reçois beaucoup de questions en ce moment. Veuillez réessayer dans une minute.",
+            "de": "Ich erhalte gerade sehr viele Fragen. Bitte versuchen Sie es in einer Minute erneut.",
+            "zh": "目前问题较多，请一分钟后再试。",
+            "ja": "現在、多くの質問が寄せられています。1分後にもう一度お試しください。",
+            "ko": "지금 질문이 많이 들어오고 있습니다. 1분 후에 다시 시도해 주세요.",
+            "ru": "Сейчас поступает очень много вопросов. Пожалуйста, попробуйте еще раз через минуту.",
+            "ar": "أتلقى الكثير من الأسئلة الآن. يرجى المحاولة مرة أخرى بعد دقيقة.",
+        }
+        await message.answer(busy_texts.get(lang_code, busy_texts["en"]))
+        return
+
+    if not answered:
         fallbacks = {
             "en": "Sorry, I couldn't generate an answer right now. Please try again or rephrase your question.",
             "es": "Lo siento, no puedo generar una respuesta en este momento. Por favor, inténtalo de nuevo o reformula tu pregunta.",
@@ -104,28 +202,10 @@ async def question_handler(message: types.Message, state: FSMContext, session) -
         return
 
     # Increase counter of messages after /start
-    data = await state.get_data()
-    msg_count: int = int(data.get("post_start_count", 0)) + 1
     await state.update_data(post_start_count=msg_count)
 
-    # Prepare optional support prompt on the 3rd message
-    add_support_prompt = msg_count == 3
-    support_prompts = {
-        "en": ("You can contact technical support directly if your issue remains.", "Contact support", "Please write your question:"),
-        "ru": ("Вы можете связаться напрямую с техподдержкой, если проблема не решена.", "Связаться с техподдержкой", "Напишите ваш вопрос:"),
-        "es": ("Puede contactar con soporte técnico directamente si su problema persiste.", "Contactar con soporte", "Por favor, escriba su pregunta:"),
-        "pt": ("Você pode contatar o suporte técnico diretamente se o problema persistir.", "Contactar o suporte", "Por favor, escreva sua pergunta:"),
-        "fr": ("Vous pouvez contacter le support technique directement si votre problème persiste.", "Contacter le support", "Veuillez écrire votre question :"),
-        "de": ("Sie können den technischen Support direkt kontaktieren, wenn Ihr Problem weiterhin besteht.", "Support kontaktieren", "Bitte schreiben Sie Ihre Frage:"),
-        "zh": ("如果您的问题仍未解决，您可以直接联系技术支持。", "联系技术支持", "请写下您的问题："),
-        "ja": ("問題が解決しない場合は、技術サポートに直接連絡できます。", "サポートに連絡する", "質問を書いてください:"),
-        "ko": ("문제가 해결되지 않은 경우 기술 지원에 직접 문의할 수 있습니다.", "지원팀에 문의", "질문을 작성해 주세요:"),
-        "ar": ("إذا لم تُحل مشكلتك، يمكنك التواصل مباشرة مع الدعم الفني.", "التواصل مع الدعم", "يرجى كتابة سؤالك:"),
-    }
-    prompt_text, button_text, ask_text = support_prompts.get(lang_code, support_prompts.get("en"))
-
     # Telegram message limit safety, append support prompt to the last chunk when needed
-    max_len = 4000
+    max_len = MESSAGE_MAX_LEN
     total_len = len(answer_text)
     for i in range(0, total_len, max_len):
         is_last = (i + max_len) >= total_len
@@ -134,19 +214,19 @@ async def question_handler(message: types.Message, state: FSMContext, session) -
         reply_markup = None
         if add_support_prompt and is_last:
             chunk = f"{chunk}\n\n{prompt_text}"
-            kb = InlineKeyboardBuilder()
-            kb.button(text=button_text, callback_data="contact_support")
-            reply_markup = kb.as_markup()
+            reply_markup = support_markup
 
-        # Отправляем текст без специального режима парсинга разметки
-        await message.answer(chunk, reply_markup=reply_markup)
+        # Отправляем текст без специального режима парсинга разметки, как и потоковые ответы
+        await message.answer(chunk, parse_mode=ANSWER_PARSE_MODE, reply_markup=reply_markup)
 
     # Stay in ask_question state for follow-up questions
     await state.set_state(Onboarding.ask_question)
 
 
 @router.callback_query(F.data == "contact_support")
-async def contact_support_clicked(callback: types.CallbackQuery, state: FSMContext, session) -> None:
+async def contact_support_clicked(
+    callback: types.CallbackQuery, state: FSMContext, user_profile: UserProfile | None
+) -> None:
     """User clicked contact support: remove button and ask to write a question."""
     if not callback.from_user:
         return
@@ -158,7 +238,7 @@ async def contact_support_clicked(callback: types.CallbackQuery, state: FSMConte
         pass
 
     # Determine language preference from DB or user
-    lang_code = await get_language_code(session=session, user_id=callback.from_user.id) or (callback.from_user.language_code or "en")
+    lang_code = (user_profile and user_profile.language_code) or (callback.from_user.language_code or "en")
     support_prompts = {
         "en": "Please write your question:",
         "ru": "Напишите ваш вопрос:",
@@ -0,0 +1,201 @@
+from __future__ import annotations
+import math
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import orjson
+from loguru import logger
+
+from bot.core.config import DIR, settings
+from bot.knowledge.intents import PROBLEM_RE, normalize
+from bot.knowledge.registry import knowledge_base_registry
+from bot.knowledge.retrieval import tokenize
+from bot.services.metrics import answer_bank_requests, answer_bank_similarity
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from bot.knowledge.registry import KnowledgeBase
+
+QA_PATHS = (Path(DIR) / "qa1.json", Path(DIR) / "qa2.json")
+
+MARKUP_RE = re.compile(r"\*\*|__|`")  # bold and inline code
+BULLET_RE = re.compile(r"^(\s*)[*\-+]\s+", re.MULTILINE)
+NUMBERED_RE = re.compile(r"^(\s*\d+\.)\s+", re.MULTILINE)
+NEAR_MISS_SHARE = 0.8  # of the threshold, closer misses are logged as candidates for the bank
+
+
+@dataclass(frozen=True, slots=True)
+class BankedAnswer:
+    question: str
+    language: str
+    answer: str
+    score: int  # out of 50, from the qa files
+    source: str
+
+
+@dataclass(frozen=True, slots=True)
+class AnswerBankMatch:
+    entry: BankedAnswer
+    similarity: float
+
+
+def to_plain_text(text: str) -> str:
+    """The bot answers in plain text, graded answers may use markdown."""
+    text = MARKUP_RE.sub("", text)
+    text = BULLET_RE.sub(r"\1- ", text)
+    return NUMBERED_RE.sub(r"\1 ", text).strip()
+
+
+def graded_version(label: object) -> str:
+    """Version number of a knowledge base, "1.0 (MD)" in the qa files is the markdown of version 1.0."""
+    return str(label or "").split(" ", 1)[0]
+
+
+def load_graded_answers(paths: Iterable[Path], min_score: int, knowledge_base_version: str) -> list[BankedAnswer]:
+    """Answers of the qa files scored at least ``min_score``, the best graded one per question and language.
+
+    Files graded against another ``knowledge_base_version`` are skipped, their prices and facts may be outdated.
+    """
+    best: dict[tuple[str, str], BankedAnswer] = {}
+    for path in paths:
+        try:
+            data = orjson.loads(path.read_bytes())
+            items = [item for pair in data["questions"] for item in pair]
+        except (OSError, orjson.JSONDecodeError, KeyError, TypeError) as e:
+            # the files are edited by hand, a broken one must not stop the bot
+            logger.warning("Graded answers skipped | path={} | error={}", path, e)
+            continue
+
+        graded = graded_version(data.get("knowledge_base_version"))
+        if graded != knowledge_base_version:
+            logger.warning(
+                "Graded answers skipped, graded against another knowledge base | path={} | graded={} | current={}",
+                path,
+                graded or None,
+                knowledge_base_version or None,
+            )
+            continue
+
+        for item in items:
+            answer = (item.get("globustele_bot_answer") or "").strip()
+            score = int(item.get("total_score") or 0)
+            if not answer or score < min_score:
+                continue
+
+            entry = BankedAnswer(
+                question=item["question"],
+                language=item["language"],
+                answer=to_plain_text(answer),
+                score=score,
+                source=path.name,
+            )
+            key = (entry.language, normalize(entry.question))
+            if key not in best or best[key].score < entry.score:
+                best[key] = entry
+
+    return list(best.values())
+
+
+class AnswerBank:
+    """Vetted answers per language, matched by the overlap of question terms.
+
+    Only a strong match is served: the terms of both questions must mostly coincide
+    and both must be, or both not be, about a problem.
+    """
+
+    def __init__(
+        self,
+        entries: list[BankedAnswer],
+        min_similarity: float = settings.ANSWER_BANK_MIN_SIMILARITY,
+    ) -> None:
+        self.min_similarity = min_similarity
+        # language -> entries with their question terms
+        self.entries: dict[str, list[tuple[BankedAnswer, frozenset[str], bool]]] = {}
+        for entry in entries:
+            terms = frozenset(tokenize(normalize(entry.question)))
+            if terms:
+                is_problem = bool(PROBLEM_RE.search(normalize(entry.question)))
+                self.entries.setdefault(entry.language, []).append((entry, terms, is_problem))
+
+    def __len__(self) -> int:
+        return sum(map(len, self.entries.values()))
+
+    def nearest(self, question: str, language_code: str) -> AnswerBankMatch | None:
+        text = normalize(question)
+        terms = frozenset(tokenize(text))
+        if not terms:
+            return None
+
+        is_problem = bool(PROBLEM_RE.search(text))
+        best: AnswerBankMatch | None = None
+        for entry, entry_terms, entry_is_problem in self.entries.get(language_code, ()):
+            if entry_is_problem != is_problem:
+                continue
+            similarity = len(terms & entry_terms) / math.sqrt(len(terms) * len(entry_terms))
+            if best is None or similarity > best.similarity:
+                best = AnswerBankMatch(entry=entry, similarity=similarity)
+        return best
+
+    def match(self, question: str, language_code: str) -> AnswerBankMatch | None:
+        best = self.nearest(question, language_code)
+        return best if best is not None and best.similarity >= self.min_similarity else None
+
+
+def build_answer_bank(knowledge_base: KnowledgeBase) -> AnswerBank:
+    metadata = knowledge_base.data.get("metadata")
+    version = graded_version(metadata.get("version") if isinstance(metadata, dict) else None)
+    entries = load_graded_answers(QA_PATHS, settings.ANSWER_BANK_MIN_SCORE, version)
+    bank = AnswerBank(entries)
+    logger.info(
+        "Answer bank loaded | version={} | answers={} | languages={} | min_score={}",
+        knowledge_base.version,
+        len(bank),
+        sorted(bank.entries),
+        settings.ANSWER_BANK_MIN_SCORE,
+    )
+    return bank
+
+
+def get_answer_bank() -> AnswerBank:
+    """Get the answer bank of the current knowledge base version, the qa files are read again with every version."""
+    return knowledge_base_registry.derive("answer_bank", build_answer_bank)
+
+
+def get_banked_answer(question: str, language_code: str) -> AnswerBankMatch | None:
+    """Vetted answer of a strongly matching curated question, ``None`` lets the question through."""
+    if not settings.ANSWER_BANK_ENABLED:
+        return None
+
+    bank = get_answer_bank()
+    best = bank.nearest(question, language_code)
+    if best is not None:
+        answer_bank_similarity.observe(best.similarity)
+
+    if best is None or best.similarity < bank.min_similarity * NEAR_MISS_SHARE:
+        answer_bank_requests.labels(result="miss").inc()
+        return None
+
+    if best.similarity < bank.min_similarity:
+        # questions asked in production that nearly match are the candidates to grade and add
+        answer_bank_requests.labels(result="near_miss").inc()
+        logger.info(
+            "Answer bank near miss | lang={} | similarity={:.2f} | question={!r} | closest={!r}",
+            language_code,
+            best.similarity,
+            question,
+            best.entry.question,
+        )
+        return None
+
+    answer_bank_requests.labels(result="hit").inc()
+    logger.info(
+        "Answered from the answer bank | lang={} | similarity={:.2f} | score={} | question={!r}",
+        language_code,
+        best.similarity,
+        best.entry.score,
+        best.entry.question,
+    )
+    return best
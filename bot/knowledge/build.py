@@ -0,0 +1,134 @@
+from __future__ import annotations
+import hashlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import orjson
+from loguru import logger
+
+from bot.core.config import settings
+from bot.knowledge.compiled import KB_ARTIFACT_PATH, dump_artifact, load_compiled_knowledge_base
+from bot.knowledge.registry import KB_PATH
+from bot.knowledge.renderings import render_document
+from bot.knowledge.retrieval import inverse_document_frequencies, tokenize
+from bot.knowledge.sections import SECTION_MAX_CHARS, estimate_section_tokens, split_sections
+from bot.utils.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from bot.knowledge.compiled import CompiledKnowledgeBase
+
+
+@dataclass(frozen=True, slots=True)
+class BuildStats:
+    version: str
+    chunks: int
+    reused: int  # unchanged chunks taken over from the previous artifact
+    size: int
+
+
+def _chunk_hash(path: tuple[str, ...], content: bytes) -> str:
+    return hashlib.sha256("/".join(path).encode() + b"\0" + content).hexdigest()[:16]
+
+
+def build_artifact(
+    source_text: str,
+    previous: CompiledKnowledgeBase | None = None,
+    max_chars: int = SECTION_MAX_CHARS,
+    rendering: str = settings.KB_RENDERING,
+) -> tuple[bytes, BuildStats]:
+    """Compile the knowledge base JSON into an artifact the bot can memory-map.
+
+    Chunks whose path and content did not change since ``previous`` keep their token
+    counts and index terms, only new and edited chunks are processed again.
+    """
+    knowledge_base: dict[str, Any] = orjson.loads(source_text)
+    reusable = (
+        {chunk.id: chunk for chunk in previous.chunks}
+        if previous and previous.max_chars == max_chars and previous.rendering == rendering
+        else {}
+    )
+
+    data = bytearray()
+
+    def append(blob: bytes) -> tuple[int, int]:
+        offset = len(data)
+        data.extend(blob)
+        return offset, len(blob)
+
+    # the original file is the json rendering of the full knowledge base
+    full_text = source_text if rendering == "json" else render_document(knowledge_base, rendering)
+    full = append(full_text.encode())
+    minified = append(orjson.dumps(knowledge_base))
+
+    chunks: list[dict[str, Any]] = []
+    term_freqs: list[dict[str, int]] = []
+    reused = 0
+    for section in split_sections(knowledge_base, max_chars=max_chars, count_tokens=False):
+        content = orjson.dumps(section.content)
+        digest = _chunk_hash(section.path, content)
+
+        old = reusable.get(section.id)
+        if previous is not None and old is not None and old.hash == digest:
+            tokens, terms = old.tokens, previous.chunk_terms(old)
+            reused += 1
+        else:
+            tokens, terms = estimate_section_tokens(section, rendering), dict(Counter(tokenize(section.text)))
+
+        term_freqs.append(terms)
+        chunks.append(
+            {
+                "id": section.id,
+                "path": section.path,
+                "hash": digest,
+                "tokens": tokens,
+                "content": append(content),
+                "text": append(section.text.encode()),
+                "terms": append(orjson.dumps(terms)),
+            },
+        )
+
+    source_hash = hashlib.sha256(source_text.encode()).hexdigest()
+    version = source_hash[:12]
+    header = {
+        # same as ``get_knowledge_base_version``, so the bot can tell whether the artifact is current
+        "version": version,
+        "source_hash": source_hash,
+        "max_chars": max_chars,
+        "rendering": rendering,
+        "full": full,
+        "full_tokens": estimate_tokens(full_text),
+        "minified": minified,
+        "chunks": chunks,
+        "idf": append(orjson.dumps(inverse_document_frequencies(term_freqs))),
+    }
+    artifact = dump_artifact(header, bytes(data))
+    return artifact, BuildStats(version=version, chunks=len(chunks), reused=reused, size=len(artifact))
+
+
+def compile_knowledge_base(source_path: Path = KB_PATH, artifact_path: Path = KB_ARTIFACT_PATH) -> BuildStats:
+    """Rebuild the artifact next to the knowledge base, reusing unchanged chunks of the current one."""
+    source_text = source_path.read_text(encoding="utf-8")
+    previous = load_compiled_knowledge_base(artifact_path)
+    try:
+        artifact, stats = build_artifact(source_text, previous)
+    finally:
+        if previous is not None:
+            previous.close()
+
+    # running bots keep their mapping of the old file, the new one replaces it atomically
+    tmp_path = artifact_path.with_suffix(f"{artifact_path.suffix}.tmp")
+    tmp_path.write_bytes(artifact)
+    tmp_path.replace(artifact_path)
+
+    logger.info(
+        "Knowledge base compiled | version={} | chunks={} | reused={} | size={} | path={}",
+        stats.version,
+        stats.chunks,
+        stats.reused,
+        stats.size,
+        artifact_path,
+    )
+    return stats
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import mmap
+import struct
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, overload
+
+import orjson
+from loguru import logger
+
+from bot.core.config import DIR
+from bot.knowledge.sections import KnowledgeSection
+
+KB_ARTIFACT_PATH = Path(DIR) / "knowledge_base.kb"
+
+ARTIFACT_MAGIC = b"GTKB"
+ARTIFACT_FORMAT = 3
+HEADER_STRUCT = struct.Struct(">4sHI")  # magic, format, header length
+
+
+Span = tuple[int, int]  # offset and length of a blob in the data area
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledChunk:
+    """Section of the compiled knowledge base, its content, text and terms live in the data area of the artifact."""
+
+    id: str
+    path: tuple[str, ...]
+    hash: str  # of the minified content, unchanged chunks are reused by incremental builds
+    tokens: int
+    content: Span
+    text: Span
+    terms: Span  # search index term frequencies
+
+
+class CompiledKnowledgeBase:
+    """Read-only view of a knowledge base artifact built by ``convert.py``.
+
+    Only the header with the chunk ids, token counts and spans is parsed on load: chunk contents,
+    texts and terms, the index and the renderings are decoded from the memory-mapped data area
+    when they are needed.
+    """
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        magic, version, header_length = HEADER_STRUCT.unpack_from(buffer)
+        if magic != ARTIFACT_MAGIC or version != ARTIFACT_FORMAT:
+            msg = f"Unsupported knowledge base artifact: {magic!r} format {version}"
+            raise ValueError(msg)
+
+        self.buffer = buffer
+        self.data_start = HEADER_STRUCT.size + header_length
+        header = orjson.loads(memoryview(buffer)[HEADER_STRUCT.size : self.data_start])
+
+        self.version: str = header["version"]
+        self.source_hash: str = header["source_hash"]
+        self.max_chars: int = header["max_chars"]
+        self.rendering: str = header["rendering"]  # of the full text and the token counts
+        self.full_tokens: int = header["full_tokens"]
+        self._full: Span = tuple(header["full"])
+        self._minified: Span = tuple(header["minified"])
+        self._idf: Span = tuple(header["idf"])
+        self.chunks = [
+            CompiledChunk(
+                id=chunk["id"],
+                path=tuple(chunk["path"]),
+                hash=chunk["hash"],
+                tokens=chunk["tokens"],
+                content=tuple(chunk["content"]),
+                text=tuple(chunk["text"]),
+                terms=tuple(chunk["terms"]),
+            )
+            for chunk in header["chunks"]
+        ]
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def _slice(self, span: Span) -> bytes:
+        offset, length = span
+        start = self.data_start + offset
+        return self.buffer[start : start + length]
+
+    @property
+    def full_text(self) -> str:
+        """The full knowledge base in the artifact's rendering, the original file for json."""
+        return self._slice(self._full).decode()
+
+    @property
+    def minified_text(self) -> str:
+        return self._slice(self._minified).decode()
+
+    @property
+    def idf(self) -> dict[str, float]:
+        idf: dict[str, float] = orjson.loads(self._slice(self._idf))
+        return idf
+
+    def chunk_content(self, chunk: CompiledChunk) -> Any:
+        return orjson.loads(self._slice(chunk.content))
+
+    def chunk_text(self, chunk: CompiledChunk) -> str:
+        return self._slice(chunk.text).decode()
+
+    def chunk_terms(self, chunk: CompiledChunk) -> dict[str, int]:
+        terms: dict[str, int] = orjson.loads(self._slice(chunk.terms))
+        return terms
+
+    def section(self, chunk: CompiledChunk) -> KnowledgeSection:
+        return KnowledgeSection(
+            id=chunk.id,
+            path=chunk.path,
+            content=self.chunk_content(chunk),
+            text=self.chunk_text(chunk),
+            tokens=chunk.tokens,
+        )
+
+    def sections(self) -> CompiledSections:
+        return CompiledSections(self)
+
+
+class CompiledSections(Sequence[KnowledgeSection]):
+    """Sections of a compiled knowledge base, each one is decoded the first time it is read."""
+
+    def __init__(self, knowledge_base: CompiledKnowledgeBase) -> None:
+        self.knowledge_base = knowledge_base
+        self._decoded: dict[int, KnowledgeSection] = {}
+
+    def __len__(self) -> int:
+        return len(self.knowledge_base.chunks)
+
+    @overload
+    def __getitem__(self, index: int) -> KnowledgeSection: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[KnowledgeSection]: ...
+
+    def __getitem__(self, index: int | slice) -> KnowledgeSection | list[KnowledgeSection]:
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(len(self))[index]]
+
+        chunk = self.knowledge_base.chunks[index]
+        position = index % len(self)
+        section = self._decoded.get(position)
+        if section is None:
+            section = self._decoded[position] = self.knowledge_base.section(chunk)
+        return section
+
+
+def load_compiled_knowledge_base(path: Path = KB_ARTIFACT_PATH) -> CompiledKnowledgeBase | None:
+    """Memory-map the knowledge base artifact, ``None`` when it is missing or unreadable."""
+    try:
+        with path.open("rb") as file:
+            # the mapping stays valid after the file is closed
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # ValueError: an empty file can not be mapped
+        logger.debug("Knowledge base artifact is not available | path={}", path)
+        return None
+
+    try:
+        return CompiledKnowledgeBase(buffer)
+    except (ValueError, KeyError, struct.error) as e:
+        # also an artifact of an older format, until it is rebuilt
+        logger.warning("Knowledge base artifact is unreadable, run `make kb-build` | path={} | error={}", path, e)
+        buffer.close()
+        return None
+
+
+def dump_artifact(header: dict[str, Any], data: bytes) -> bytes:
+    header_bytes = orjson.dumps(header)
+    return HEADER_STRUCT.pack(ARTIFACT_MAGIC, ARTIFACT_FORMAT, len(header_bytes)) + header_bytes + data
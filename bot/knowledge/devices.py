@@ -0,0 +1,319 @@
+from __future__ import annotations
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.knowledge.intents import PROBLEM_RE, IntentMatch, is_filler
+from bot.knowledge.registry import knowledge_base_registry
+from bot.services.metrics import intent_requests
+
+if TYPE_CHECKING:
+    from bot.knowledge.registry import KnowledgeBase
+
+WORD_RE = re.compile(r"[^\W_]+|\+", re.UNICODE)
+PART_RE = re.compile(r"\d+|[^\W\d_]+", re.UNICODE)
+NOTE_RE = re.compile(r"\(.*?\)")
+# tells models apart, unlike the other notes: "iPad Pro 11-inch (second generation)"
+GENERATION_NOTE_RE = re.compile(r"\((\w+ generation)\)")
+ORDINAL_RE = re.compile(r"^(\d+)(?:st|nd|rd|th)$")
+
+# roman numerals and ordinals of model generations
+NUMBER_WORDS = {
+    "ii": "2", "iii": "3", "iv": "4", "v": "5", "vi": "6", "first": "1", "second": "2", "third": "3", "fourth": "4",
+    "fifth": "5", "sixth": "6", "seventh": "7", "eighth": "8", "ninth": "9", "tenth": "10",
+}  # fmt: skip
+ALIASES = {
+    "ip": ("iphone",),
+    "iph": ("iphone",),
+    "+": ("plus",),
+    "u": ("ultra",),
+    "pm": ("pro", "max"),
+    "promax": ("pro", "max"),
+    "moto": ("motorola",),
+    "mi": ("xiaomi",),
+    "про": ("pro",),
+    "макс": ("max",),
+    "мини": ("mini",),
+    "плюс": ("plus",),
+    "ультра": ("ultra",),
+    "лайт": ("lite",),
+}
+PREFIX_ALIASES = {
+    "айфон": "iphone",
+    "айпад": "ipad",
+    "самсунг": "samsung",
+    "галакс": "galaxy",
+    "пиксел": "pixel",
+    "гугл": "google",
+    "сяоми": "xiaomi",
+    "ксиоми": "xiaomi",
+    "хуаве": "huawei",
+    "хонор": "honor",
+    "моторол": "motorola",
+}
+# not needed to tell devices apart, users often leave them out
+OPTIONAL_WORDS = frozenset({"apple", "samsung", "galaxy", "google", "5g", "inch", "generation", "gen"})
+# optional in a device name, but a question about the feature itself otherwise: "does iphone 13 support 5g?"
+FEATURE_WORDS = frozenset({"5g"})
+FAMILY_MIN_LEN = 3  # a model word this long makes the brand optional: "xperia 10", but "xiaomi 13"
+MODIFIER_WORDS = frozenset({"pro", "max", "plus", "lite", "mini", "ultra"})
+FUZZY_MIN_LEN = 5
+FUZZY_PENALTY = 0.1
+FUZZY_LONG_LEN = 8  # words this long may have two typos
+CORRECTIONS_CACHE_SIZE = 10_000
+NOT_FUZZY = frozenset({"phone", "phones", "mobile", "device", "devices", "model", "tablet"})
+
+# only an explicit question about eSIM support is answered, "will my iphone 13 work in japan?" is not one
+COMPATIBILITY_RE = re.compile(
+    r"\bsupport\w*|\bcompatib\w*|\b(?:have|has|works?|working) with (?:an? |the |your )?e-?sim\b"
+    r"|\b(?:have|has) (?:an? )?e-?sim\b|\be-?sim[\s-](?:capable|ready|enabled)\b|поддерж\w*|совместим\w*"
+    r"|compatível|kompatibel|unterstütz\w*|prend en charge|支持|兼容|対応|지원|호환|يدعم|متوافق",
+)
+
+TEMPLATES = {
+    "en": "Yes, {device} supports eSIM and works with the GlobusTelecom eSIM.",
+    "es": "Sí, {device} es compatible con eSIM y funciona con la eSIM de GlobusTelecom.",
+    "pt": "Sim, {device} é compatível com eSIM e funciona com o eSIM da GlobusTelecom.",
+    "fr": "Oui, {device} prend en charge l'eSIM et fonctionne avec l'eSIM GlobusTelecom.",
+    "de": "Ja, {device} unterstützt eSIM und funktioniert mit der GlobusTelecom eSIM.",
+    "zh": "是的，{device} 支持 eSIM，可以使用 GlobusTelecom eSIM。",
+    "ja": "はい、{device} は eSIM に対応しており、GlobusTelecom eSIM を利用できます。",
+    "ko": "네, {device} 는 eSIM을 지원하며 GlobusTelecom eSIM을 사용할 수 있습니다.",
+    "ru": "Да, {device} поддерживает eSIM и работает с eSIM GlobusTelecom.",
+    "ar": "نعم، {device} يدعم eSIM ويعمل مع شريحة GlobusTelecom eSIM.",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceEntry:
+    name: str  # as written in the knowledge base, including notes like "(only phones bought with Google Fi)"
+    brand: str
+    tokens: tuple[str, ...]  # normalized model tokens that must all appear in the question, in order
+
+
+def _canonical_word(word: str) -> tuple[str, ...]:
+    word = ORDINAL_RE.sub(r"\1", word)
+    if word in ALIASES:
+        return ALIASES[word]
+    if word in NUMBER_WORDS:
+        return (NUMBER_WORDS[word],)
+    if word == "5g":
+        return (word,)
+    for prefix, alias in PREFIX_ALIASES.items():
+        if word.startswith(prefix):
+            return (alias,)
+
+    # glued names: "ip15" -> "iphone 15", "s23u" -> "s 23 ultra"
+    parts = PART_RE.findall(word)
+    if len(parts) == 1:
+        return (word,)
+    return tuple(token for part in parts for token in ALIASES.get(part, (part,)))
+
+
+def normalize_device_text(text: str) -> list[str]:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return [token for word in WORD_RE.findall(text) for token in _canonical_word(word)]
+
+
+def _is_family_word(token: str) -> bool:
+    return token.isalpha() and len(token) >= FAMILY_MIN_LEN and token not in MODIFIER_WORDS
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance that also counts a swap of adjacent letters as one edit."""
+    prev2: list[int] = []
+    prev = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(prev[j] + 1, current[j - 1] + 1, prev[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], prev2[j - 2] + 1)
+        prev2, prev = prev, current
+    return prev[-1]
+
+
+def name_tokens(name: str) -> list[str]:
+    """Normalized tokens of a device name, without its notes except the generation."""
+    return normalize_device_text(NOTE_RE.sub(" ", GENERATION_NOTE_RE.sub(r" \1 ", name)))
+
+
+def build_entry(name: str, brand: str) -> DeviceEntry:
+    tokens = name_tokens(name)
+    required = [token for token in tokens if token not in OPTIONAL_WORDS]
+    if any(_is_family_word(token) for token in required if token != brand):
+        required = [token for token in required if token != brand]
+    elif brand and brand not in OPTIONAL_WORDS and brand not in required:
+        required.insert(0, brand)
+    return DeviceEntry(name=name, brand=brand, tokens=tuple(required))
+
+
+def load_device_entries(knowledge_base: dict[str, Any]) -> list[DeviceEntry]:
+    """Every supported device of ``compatibility.supported_devices``, the brand is taken from the enclosing key."""
+    entries: list[DeviceEntry] = []
+
+    def visit(value: Any, brand: str) -> None:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                # category keys (smartphones, other_phones, ...) keep the brand of the parent
+                visit(item, key if key not in {"smartphones", "tablets", "other_phones", "android"} else brand)
+        elif isinstance(value, list):
+            for item in value:
+                visit(item, brand)
+        elif isinstance(value, str) and value.strip():
+            entries.append(build_entry(value.strip(), brand))
+
+    visit(knowledge_base.get("compatibility", {}).get("supported_devices", {}), "")
+    return entries
+
+
+def has_other_words(tokens: list[str], entry: DeviceEntry) -> bool:
+    """Whether the question tokens contain more than the device, its brand and filler words."""
+    rest = list(tokens)
+    for token in (*name_tokens(entry.name), entry.brand):
+        if token in rest:
+            rest.remove(token)
+    return any(
+        token in FEATURE_WORDS or not (token in OPTIONAL_WORDS or token in NOT_FUZZY or is_filler(token))
+        for token in rest
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceMatch:
+    entries: tuple[DeviceEntry, ...]  # all equally specific matches, e.g. both iPad Pro 11-inch generations
+    confidence: float
+
+
+class DeviceIndex:
+    """Finds supported devices mentioned in a question, tolerating aliases, glued names and typos."""
+
+    def __init__(self, entries: list[DeviceEntry], min_confidence: float = settings.INTENTS_MIN_CONFIDENCE) -> None:
+        self.min_confidence = min_confidence
+        self.by_first_token: dict[str, list[DeviceEntry]] = defaultdict(list)
+        seen: set[str] = set()
+        for entry in entries:
+            # some devices are listed twice, under their brand and in "other_phones"
+            if entry.tokens and entry.name.casefold() not in seen:
+                seen.add(entry.name.casefold())
+                self.by_first_token[entry.tokens[0]].append(entry)
+
+        vocabulary = {token for entry in entries for token in entry.tokens} | OPTIONAL_WORDS
+        self.vocabulary = vocabulary
+        self.fuzzy_vocabulary = sorted(token for token in vocabulary if len(token) >= FUZZY_MIN_LEN)
+        self.corrections: dict[str, str | None] = {}  # words repeat a lot across questions
+
+    def _closest(self, token: str) -> str | None:
+        if token in self.corrections:
+            return self.corrections[token]
+
+        max_distance = 1 if len(token) < FUZZY_LONG_LEN else 2
+        distance, closest = min(
+            (
+                (edit_distance(token, known), known)
+                for known in self.fuzzy_vocabulary
+                if abs(len(known) - len(token)) <= max_distance
+            ),
+            default=(max_distance + 1, token),
+        )
+        if len(self.corrections) >= CORRECTIONS_CACHE_SIZE:
+            self.corrections.clear()
+        self.corrections[token] = closest if distance <= max_distance else None
+        return self.corrections[token]
+
+    def _correct(self, tokens: list[str]) -> tuple[list[str], int]:
+        """Replace misspelled model words with the closest known one: one typo allowed, two in long words."""
+        corrected: list[str] = []
+        fixes = 0
+        for token in tokens:
+            if token in self.vocabulary or len(token) < FUZZY_MIN_LEN or token in NOT_FUZZY or not token.isalpha():
+                corrected.append(token)
+            elif closest := self._closest(token):
+                corrected.append(closest)
+                fixes += 1
+            else:
+                corrected.append(token)
+        return corrected, fixes
+
+    def find(self, text: str) -> tuple[DeviceMatch | None, list[str]]:
+        """Best matching devices and the normalized question tokens."""
+        tokens, fixes = self._correct(normalize_device_text(text))
+        haystack = f" {' '.join(token for token in tokens if token not in OPTIONAL_WORDS)} "
+
+        best: list[DeviceEntry] = []
+        for token in set(tokens):
+            for entry in self.by_first_token.get(token, ()):
+                if f" {' '.join(entry.tokens)} " not in haystack:
+                    continue
+                # the most specific device wins: "iphone 15 pro max" over "iphone 15"
+                if not best or len(entry.tokens) > len(best[0].tokens):
+                    best = [entry]
+                elif len(entry.tokens) == len(best[0].tokens):
+                    best.append(entry)
+
+        if not best:
+            return None, tokens
+        return DeviceMatch(entries=tuple(best), confidence=max(0.0, 1.0 - fixes * FUZZY_PENALTY)), tokens
+
+    def answer(self, question: str, language_code: str) -> IntentMatch | None:
+        text = unicodedata.normalize("NFKC", question).casefold()
+        if PROBLEM_RE.search(text) or not COMPATIBILITY_RE.search(text):
+            return None
+
+        match, tokens = self.find(COMPATIBILITY_RE.sub(" ", text))
+        if match is None:
+            return None
+
+        if has_other_words(tokens, match.entries[0]):
+            # the device is mentioned, but the question is about something else: "iphone 13 esim support in japan"
+            return None
+
+        if match.confidence < self.min_confidence:
+            logger.debug(
+                "Device match confidence too low | device={} | confidence={:.2f}",
+                match.entries[0].name,
+                match.confidence,
+            )
+            return None
+
+        device = ", ".join(entry.name for entry in match.entries)
+        template = TEMPLATES.get(language_code) or TEMPLATES["en"]
+        return IntentMatch(
+            intent="device_compatibility",
+            confidence=match.confidence,
+            answer=template.format(device=device),
+        )
+
+
+def build_device_index(knowledge_base: KnowledgeBase) -> DeviceIndex:
+    entries = load_device_entries(knowledge_base.data)
+    index = DeviceIndex(entries)
+    logger.info(
+        "Device index built | version={} | devices={} | keys={}",
+        knowledge_base.version,
+        len(entries),
+        len(index.by_first_token),
+    )
+    return index
+
+
+def get_device_index() -> DeviceIndex:
+    """Get the supported devices index of the current knowledge base version."""
+    return knowledge_base_registry.derive("device_index", build_device_index)
+
+
+def get_device_answer(question: str, language_code: str) -> IntentMatch | None:
+    """Local answer for "is my phone supported" questions about a device from the knowledge base."""
+    if not settings.DEVICE_LOOKUP_ENABLED:
+        return None
+
+    match = get_device_index().answer(question, language_code)
+    if match is not None:
+        intent_requests.labels(intent=match.intent).inc()
+        logger.info("Answered by device index | answer={!r} | confidence={:.2f}", match.answer, match.confidence)
+    return match
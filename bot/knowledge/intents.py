@@ -0,0 +1,451 @@
+from __future__ import annotations
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.knowledge.registry import knowledge_base_registry
+from bot.knowledge.retrieval import CJK_RE, QUESTION_STOPWORDS, TOKEN_RE
+from bot.knowledge.sections import flatten_text
+from bot.services.metrics import intent_requests
+
+if TYPE_CHECKING:
+    from bot.knowledge.registry import KnowledgeBase
+
+BARE_KEYWORD_CONFIDENCE = 0.8  # "balance?" is clear enough, but less than "how do I check my balance?"
+
+# questions about a failure need troubleshooting, not the fact itself
+PROBLEM_RE = re.compile(
+    r"\b(?:not|no|never|can'?t|cannot|doesn'?t|don'?t|won'?t|didn'?t|error|fail\w*|problem|issue|wrong|refund|why)\b"
+    r"|\b(?:pas|nicht|не|não)\b|erreur|fehler|problema|problème|ошибк|проблем|почему|falh|échou"
+    r"|不|没|错误|为什么|できない|エラー|問題|않|오류|문제|خطأ|مشكلة|\bلا\b|\bلم\b",
+)
+# how-to and where-to phrasing, a single-fact answer fits these questions
+CUE_RE = re.compile(
+    r"\b(?:how|where|can i|could i|tell me)\b|\b(?:cómo|como|dónde|onde|comment|où|wie|wo|как|где)\b"
+    r"|如何|怎么|怎样|哪里|どう|どこ|方法|어떻게|어디|방법|كيف|أين",
+)
+# words that carry no content in a how-to question, the rest must be explained by the intent
+FILLER_WORDS = QUESTION_STOPWORDS | frozenset(
+    {
+        "e", "esim", "sim", "s", "t", "please", "pls", "hi", "hello", "could", "would", "should", "need", "want",
+        "like", "globustele", "globustelecom", "globus", "telecom", "favor", "quiero", "quero", "necesito",
+        "preciso", "gostaria", "bitte", "möchte", "voudrais", "veux", "plaît", "vous", "пожалуйста", "можно",
+        "нужно", "хочу", "свой", "мою", "подскажите", "من", "فضلك", "أريد", "يمكنني",
+    },
+)  # fmt: skip
+# particles and question endings of scripts written without spaces, removed character-wise
+CJK_FILLERS = tuple(
+    sorted(
+        {
+            "请问", "请", "如何", "怎么", "怎样", "我的", "我", "的", "在哪里", "在哪", "哪里", "可以", "能", "吗",
+            "呢", "要", "想", "どうすれば", "どう", "どこ", "で", "を", "の", "は", "が", "に", "したい", "します",
+            "していますか", "すれば", "するには", "する", "いい", "ですか", "できますか", "か", "方法", "教えて",
+            "ください", "私", "어떻게", "어디", "에서", "을", "를", "은", "는", "이", "가", "내", "제", "하나요",
+            "하면", "되나요", "할", "수", "있나요", "하려면", "방법", "알려", "주세요", "해요",
+        },
+        key=len,
+        reverse=True,
+    ),
+)  # fmt: skip
+
+# values the templates are filled with, the first group (or the whole match) of each pattern in the knowledge base
+FACT_PATTERNS = {
+    "top_up_url": re.compile(r"https://\S+#x-topup"),
+    "buy_url": re.compile(r"https://\S+#x-plan"),
+    "site": re.compile(r"https://([\w.-]+)/\S*#x-plan"),
+    "top_up_field": re.compile(r"Enter the (\w+) of your eSIM \(found in your account dashboard\)"),
+    "top_up_minimum": re.compile(r"\(minimum is (\d+) [A-Z]{3}\)"),
+    "currency": re.compile(r"All transactions are processed in ([A-Z]{3})"),
+    "buy_button": re.compile(r"Click the '([^']+)' button"),
+    # statements the templates make in every language, without them the intent is not answered
+    "card_payment": re.compile(r"payment (?:using a|with your) bank card"),
+    "dashboard_details": re.compile(r"eSIM details will be available in your personal account dashboard"),
+    "dashboard_balance": re.compile(r"'Current Balance' in your personal account dashboard"),
+    "apn_automatic": re.compile(r"APN[^.]* settings are typically configured automatically"),
+    "apn_instructions": re.compile(r"how to set your APN are included in the eSIM installation instructions SMS"),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Intent:
+    name: str
+    pattern: re.Pattern[str]
+    templates: dict[str, str]
+    requires: frozenset[str]  # knowledge base facts the templates state
+    extras: re.Pattern[str] | None = None  # other words the question may contain, e.g. "check" for the balance
+    overrides: frozenset[str] = frozenset()  # intents that are part of this one, e.g. "top up balance"
+
+
+@dataclass(frozen=True, slots=True)
+class IntentMatch:
+    intent: str
+    confidence: float
+    answer: str
+
+
+INTENTS = (
+    Intent(
+        name="top_up",
+        pattern=re.compile(
+            r"top[\s-]?up|recharge|refill|add (?:money|funds|credit)|recarg|aufladen|aufladung|пополн"
+            r"|充值|チャージ|入金|충전|شحن|تعبئة",
+        ),
+        templates={
+            "en": (
+                "You can top up your balance at {top_up_url}. Enter the {top_up_field} of your eSIM (found in your "
+                "account dashboard) and the amount in {currency} (minimum {top_up_minimum} {currency}), then pay with "
+                "a bank card."
+            ),
+            "es": (
+                "Puede recargar su saldo en {top_up_url}. Introduzca el {top_up_field} de su eSIM (lo encontrará en su "
+                "panel de cuenta) y el importe en {currency} (mínimo {top_up_minimum} {currency}), y pague con tarjeta "
+                "bancaria."
+            ),
+            "pt": (
+                "Você pode recarregar seu saldo em {top_up_url}. Informe o {top_up_field} do seu eSIM (disponível no "
+                "painel da sua conta) e o valor em {currency} (mínimo de {top_up_minimum} {currency}) e pague com "
+                "cartão bancário."
+            ),
+            "fr": (
+                "Vous pouvez recharger votre solde sur {top_up_url}. Saisissez l'{top_up_field} de votre eSIM (dans "
+                "votre espace client) et le montant en {currency} (minimum {top_up_minimum} {currency}), puis payez "
+                "par carte bancaire."
+            ),
+            "de": (
+                "Sie können Ihr Guthaben unter {top_up_url} aufladen. Geben Sie die {top_up_field} Ihrer eSIM (in "
+                "Ihrem Kundenkonto) und den Betrag in {currency} (mindestens {top_up_minimum} {currency}) ein und "
+                "bezahlen Sie mit Bankkarte."
+            ),
+            "zh": (
+                "您可以在 {top_up_url} 充值余额。输入您的 eSIM 的 {top_up_field}（可在账户面板中找到）和 {currency}"
+                " 金额（最低 {top_up_minimum} {currency}），然后使用银行卡付款。"
+            ),
+            "ja": (
+                "残高のチャージは {top_up_url} で行えます。eSIM の {top_up_field}（アカウントのダッシュボードに表示"
+                "）と {currency} での金額（最低 {top_up_minimum} {currency}）を入力し、銀行カードでお支払いください"
+                "。"
+            ),
+            "ko": (
+                "{top_up_url} 에서 잔액을 충전할 수 있습니다. 계정 대시보드에 있는 eSIM의 {top_up_field}와 {currency}"
+                " 금액(최소 {top_up_minimum} {currency})을 입력한 후 은행 카드로 결제하세요."
+            ),
+            "ru": (
+                "Пополнить баланс можно на странице {top_up_url}. Укажите {top_up_field} вашей eSIM (есть в личном "
+                "кабинете) и сумму в {currency} (минимум {top_up_minimum} {currency}), затем оплатите банковской "
+                "картой."
+            ),
+            "ar": (
+                "يمكنك شحن رصيدك عبر {top_up_url}. أدخل رقم {top_up_field} الخاص بشريحة eSIM (تجده في لوحة حسابك) "
+                "والمبلغ بعملة {currency} ({top_up_minimum} {currency} كحد أدنى)، ثم ادفع بالبطاقة البنكية."
+            ),
+        },
+        requires=frozenset({"top_up_url", "top_up_field", "top_up_minimum", "currency", "card_payment"}),
+        extras=re.compile(r"\b(?:account|online)\b"),
+        overrides=frozenset({"balance"}),
+    ),
+    Intent(
+        name="buy",
+        pattern=re.compile(
+            r"\b(?:buy|purchase|order)\b|where (?:can|do) i get|comprar|acheter|kaufen|купить|приобрести|покупк"
+            r"|购买|買|購入|구매|구입|شراء|أشتري",
+        ),
+        templates={
+            "en": (
+                "You can buy the GlobusTelecom eSIM at {buy_url}: click '{buy_button}', sign in or register and pay "
+                "with a bank card. The eSIM details will appear in your account dashboard."
+            ),
+            "es": (
+                "Puede comprar la eSIM de GlobusTelecom en {buy_url}: pulse '{buy_button}', inicie sesión o regístrese "
+                "y pague con tarjeta bancaria. Los datos de la eSIM aparecerán en su panel de cuenta."
+            ),
+            "pt": (
+                "Você pode comprar o eSIM GlobusTelecom em {buy_url}: clique em '{buy_button}', entre ou cadastre-se e "
+                "pague com cartão bancário. Os dados do eSIM aparecerão no painel da sua conta."
+            ),
+            "fr": (
+                "Vous pouvez acheter l'eSIM GlobusTelecom sur {buy_url} : cliquez sur '{buy_button}', connectez-vous "
+                "ou inscrivez-vous et payez par carte bancaire. Les informations de l'eSIM apparaîtront dans votre "
+                "espace client."
+            ),
+            "de": (
+                "Sie können die GlobusTelecom eSIM unter {buy_url} kaufen: Klicken Sie auf '{buy_button}', melden Sie "
+                "sich an oder registrieren Sie sich und bezahlen Sie mit Bankkarte. Die eSIM-Daten erscheinen in Ihrem "
+                "Kundenkonto."
+            ),
+            "zh": (
+                "您可以在 {buy_url} 购买 GlobusTelecom eSIM：点击 '{buy_button}'，登录或注册后使用银行卡付款。eSIM "
+                "信息将显示在您的账户面板中。"
+            ),
+            "ja": (
+                "GlobusTelecom eSIM は {buy_url} で購入できます。「{buy_button}」をクリックし、ログインまたは登録し"
+                "て銀行カードでお支払いください。eSIM の情報はアカウントのダッシュボードに表示されます。"
+            ),
+            "ko": (
+                "GlobusTelecom eSIM은 {buy_url} 에서 구매할 수 있습니다. '{buy_button}'를 누르고 로그인 또는 가입한"
+                " 후 은행 카드로 결제하세요. eSIM 정보는 계정 대시보드에 표시됩니다."
+            ),
+            "ru": (
+                "Купить eSIM GlobusTelecom можно на странице {buy_url}: нажмите '{buy_button}', войдите или "
+                "зарегистрируйтесь и оплатите банковской картой. Данные eSIM появятся в личном кабинете."
+            ),
+            "ar": (
+                "يمكنك شراء شريحة GlobusTelecom eSIM عبر {buy_url}: اضغط على '{buy_button}'، ثم سجّل الدخول أو أنشئ "
+                "حسابًا وادفع بالبطاقة البنكية. ستظهر بيانات الشريحة في لوحة حسابك."
+            ),
+        },
+        requires=frozenset({"buy_url", "buy_button", "card_payment", "dashboard_details"}),
+        extras=re.compile(r"\bnew\b|\bnueva\b|\bnovo\b|\bnouvelle\b|\bneue\b|\bнов\w*"),
+    ),
+    Intent(
+        name="balance",
+        pattern=re.compile(
+            r"\bbalance\b|how much (?:money|credit) (?:do i have|is left)|\*\d+#|\bsaldo\b|\bsolde\b|guthaben"
+            r"|kontostand|баланс|余额|残高|잔액|رصيد",
+        ),
+        templates={
+            "en": (
+                "To check your balance, dial {ussd_code} in your Phone app and wait for the operator message. You can "
+                "also see the current balance in your account dashboard on {site}."
+            ),
+            "es": (
+                "Para consultar su saldo, marque {ussd_code} en la aplicación Teléfono y espere el mensaje del "
+                "operador. También puede ver el saldo actual en su panel de cuenta en {site}."
+            ),
+            "pt": (
+                "Para verificar seu saldo, disque {ussd_code} no aplicativo Telefone e aguarde a mensagem da "
+                "operadora. Você também pode ver o saldo atual no painel da sua conta em {site}."
+            ),
+            "fr": (
+                "Pour consulter votre solde, composez {ussd_code} dans l'application Téléphone et attendez le message "
+                "de l'opérateur. Le solde actuel est aussi affiché dans votre espace client sur {site}."
+            ),
+            "de": (
+                "Um Ihr Guthaben zu prüfen, wählen Sie {ussd_code} in der Telefon-App und warten Sie auf die Nachricht "
+                "des Betreibers. Das aktuelle Guthaben sehen Sie auch in Ihrem Kundenkonto auf {site}."
+            ),
+            "zh": (
+                "查询余额：在电话应用中拨打 {ussd_code}，等待运营商消息。您也可以在 {site} 的账户面板中查看当前余额。"
+            ),
+            "ja": (
+                "残高を確認するには、電話アプリで {ussd_code} をダイヤルし、オペレーターからのメッセージをお待ちく"
+                "ださい。{site} のアカウントのダッシュボードでも現在の残高を確認できます。"
+            ),
+            "ko": (
+                "잔액을 확인하려면 전화 앱에서 {ussd_code} 를 누르고 통신사 메시지를 기다리세요. {site} 계정 대시보"
+                "드에서도 현재 잔액을 확인할 수 있습니다."
+            ),
+            "ru": (
+                "Чтобы узнать баланс, наберите {ussd_code} в приложении «Телефон» и дождитесь сообщения оператора. "
+                "Текущий баланс также виден в личном кабинете на {site}."
+            ),
+            "ar": (
+                "للتحقق من رصيدك، اطلب {ussd_code} من تطبيق الهاتف وانتظر رسالة المشغل. يمكنك أيضًا رؤية الرصيد الحالي "
+                "في لوحة حسابك على {site}."
+            ),
+        },
+        requires=frozenset({"ussd_code", "site", "dashboard_balance"}),
+        extras=re.compile(
+            r"\b(?:check|see|view|find|know|current|remaining|consultar|verificar|ver|actual|atual|consulter|vérifier"
+            r"|voir|prüfen|sehen|abfragen|aktuell\w*|узнать|проверить|посмотреть|текущий)\b"
+            r"|查询|查看|確認|확인|معرفة|التحقق",
+        ),
+    ),
+    Intent(
+        name="apn",
+        pattern=re.compile(
+            r"\bapn(?![a-z])|access point|punto de acceso|ponto de acesso|point d'acc[eè]s|zugangspunkt|точк\w* доступа"
+            r"|接入点|アクセスポイント|액세스 포인트|نقطة الوصول",
+        ),
+        templates={
+            "en": (
+                "APN settings are usually configured automatically, manual setup is not required for most devices. If "
+                "your eSIM needs an APN, the details are in the installation instructions SMS you receive after "
+                "installing the eSIM."
+            ),
+            "es": (
+                "La configuración del APN suele hacerse automáticamente; en la mayoría de los dispositivos no hace "
+                "falta configurarlo a mano. Si su eSIM necesita un APN, los datos vienen en el SMS con las "
+                "instrucciones de instalación que recibe tras instalar la eSIM."
+            ),
+            "pt": (
+                "As configurações de APN normalmente são feitas automaticamente; na maioria dos aparelhos não é "
+                "preciso configurar manualmente. Se o seu eSIM precisar de APN, os dados estão no SMS com as "
+                "instruções de instalação que você recebe após instalar o eSIM."
+            ),
+            "fr": (
+                "Les paramètres APN sont généralement configurés automatiquement, aucune configuration manuelle n'est "
+                "nécessaire sur la plupart des appareils. Si votre eSIM nécessite un APN, les informations figurent "
+                "dans le SMS d'instructions d'installation reçu après l'installation de l'eSIM."
+            ),
+            "de": (
+                "Die APN-Einstellungen werden in der Regel automatisch vorgenommen, bei den meisten Geräten ist keine "
+                "manuelle Einrichtung nötig. Falls Ihre eSIM einen APN benötigt, finden Sie die Angaben in der SMS mit "
+                "der Installationsanleitung, die Sie nach der Installation der eSIM erhalten."
+            ),
+            "zh": (
+                "APN 设置通常会自动配置，大多数设备无需手动设置。如果您的 eSIM 需要设置 APN，相关信息会包含在安装 e"
+                "SIM 后收到的安装说明短信中。"
+            ),
+            "ja": (
+                "APN 設定は通常自動で構成され、ほとんどの端末で手動設定は不要です。eSIM で APN が必要な場合は、eSIM"
+                " のインストール後に届くインストール手順の SMS に記載されています。"
+            ),
+            "ko": (
+                "APN 설정은 보통 자동으로 구성되며 대부분의 기기에서는 수동 설정이 필요하지 않습니다. eSIM에 APN이 "
+                "필요한 경우 eSIM 설치 후 받는 설치 안내 SMS에 정보가 있습니다."
+            ),
+            "ru": (
+                "Настройки APN обычно задаются автоматически, на большинстве устройств настраивать их вручную не "
+                "нужно. Если вашей eSIM нужен APN, данные есть в SMS с инструкцией по установке, которое приходит "
+                "после установки eSIM."
+            ),
+            "ar": (
+                "يتم ضبط إعدادات APN تلقائيًا عادةً، ولا حاجة للإعداد اليدوي في معظم الأجهزة. إذا كانت شريحة eSIM "
+                "تحتاج إلى APN، فستجد التفاصيل في رسالة SMS الخاصة بتعليمات التثبيت التي تصلك بعد تثبيت الشريحة."
+            ),
+        },
+        requires=frozenset({"apn_automatic", "apn_instructions"}),
+        extras=re.compile(
+            r"\b(?:settings?|set|setup|up|configure|configuration|name|configuración|configurar|configuração"
+            r"|paramètres|configurer|einstellung\w*|einrichten|настро\w*)\b|设置|設定|설정|إعدادات",
+        ),
+    ),
+)
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def extract_facts(knowledge_base: dict[str, Any]) -> dict[str, str]:
+    """Values the answer templates are filled with, taken from the knowledge base so they never diverge."""
+    facts: dict[str, str] = {}
+
+    for method in knowledge_base.get("account_management", {}).get("balance_check", []):
+        if isinstance(method, dict) and method.get("ussd_code"):
+            facts["ussd_code"] = method["ussd_code"]
+            break
+
+    text = flatten_text(knowledge_base)
+    for name, pattern in FACT_PATTERNS.items():
+        if match := pattern.search(text):
+            facts[name] = (match.group(1) if pattern.groups else match.group()).rstrip(".")
+
+    return facts
+
+
+def is_filler(word: str) -> bool:
+    """Whether a word carries no content, in scripts without spaces once the particles are removed."""
+    if not CJK_RE.search(word):
+        return word in FILLER_WORDS
+    for filler in CJK_FILLERS:
+        word = word.replace(filler, " ")
+    return all(not CJK_RE.search(part) and part in FILLER_WORDS for part in word.split())
+
+
+def has_content_left(text: str, covered: list[tuple[int, int]]) -> bool:
+    """Whether a word of the question is neither filler nor inside one of the ``covered`` spans."""
+    for token in TOKEN_RE.finditer(text):
+        start, end = token.span()
+        if CJK_RE.search(token.group()):
+            # without spaces a match covers only its own characters, the rest must be particles
+            rest = "".join(
+                " " if any(left <= idx < right for left, right in covered) else char
+                for idx, char in enumerate(token.group(), start)
+            )
+            if not all(is_filler(part) for part in rest.split()):
+                return True
+        elif not is_filler(token.group()) and not any(left < end and start < right for left, right in covered):
+            return True
+    return False
+
+
+class IntentClassifier:
+    """Answers questions about a single well known fact (balance code, top-up link, ...) from templates.
+
+    A question matches an intent only if every content word is explained by it: the intent's keywords,
+    how/where-to phrasing or the few extra words the intent allows. "How do I check my balance?" is
+    answered, "Does the balance expire?" and "Can I buy more data for Japan?" go to the LLM.
+    """
+
+    def __init__(
+        self,
+        intents: tuple[Intent, ...],
+        facts: dict[str, str],
+        min_confidence: float = settings.INTENTS_MIN_CONFIDENCE,
+    ) -> None:
+        self.intents = intents
+        self.facts = facts
+        self.min_confidence = min_confidence
+
+    def classify(self, question: str) -> tuple[Intent, float] | None:
+        text = normalize(question)
+        if PROBLEM_RE.search(text):
+            return None
+
+        matched = [intent for intent in self.intents if intent.pattern.search(text)]
+        if not matched:
+            return None
+
+        intent, *others = matched
+        if any(other.name not in intent.overrides for other in others):
+            # the question is about several things at once
+            return None
+
+        patterns = [intent.pattern, CUE_RE, *(other.pattern for other in others)]
+        if intent.extras is not None:
+            patterns.append(intent.extras)
+        covered = [match.span() for pattern in patterns for match in pattern.finditer(text)]
+        if has_content_left(text, covered):
+            return None
+
+        return intent, 1.0 if CUE_RE.search(text) else BARE_KEYWORD_CONFIDENCE
+
+    def answer(self, question: str, language_code: str) -> IntentMatch | None:
+        result = self.classify(question)
+        if result is None:
+            return None
+
+        intent, confidence = result
+        if confidence < self.min_confidence:
+            logger.debug("Intent confidence too low | intent={} | confidence={:.2f}", intent.name, confidence)
+            return None
+
+        if missing := intent.requires - self.facts.keys():
+            logger.warning("Intent answer is missing knowledge base facts | intent={} | facts={}", intent.name, missing)
+            return None
+
+        template = intent.templates.get(language_code) or intent.templates["en"]
+        return IntentMatch(intent=intent.name, confidence=confidence, answer=template.format(**self.facts))
+
+
+def build_intent_classifier(knowledge_base: KnowledgeBase) -> IntentClassifier:
+    facts = extract_facts(knowledge_base.data)
+    logger.info(
+        "Intent classifier loaded | version={} | intents={} | facts={}",
+        knowledge_base.version,
+        len(INTENTS),
+        sorted(facts),
+    )
+    return IntentClassifier(intents=INTENTS, facts=facts)
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Get the intent classifier of the current knowledge base version."""
+    return knowledge_base_registry.derive("intent_classifier", build_intent_classifier)
+
+
+def get_intent_answer(question: str, language_code: str) -> IntentMatch | None:
+    """Templated answer for a high-confidence intent, ``None`` lets the question through to the LLM."""
+    if not settings.INTENTS_ENABLED:
+        return None
+
+    match = get_intent_classifier().answer(question, language_code)
+    intent_requests.labels(intent=match.intent if match else "none").inc()
+    if match is not None:
+        logger.info("Answered by intent | intent={} | confidence={:.2f}", match.intent, match.confidence)
+    return match
@@ -0,0 +1,266 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, TypeVar, cast
+
+import orjson
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot.core.config import DIR, settings
+from bot.services.metrics import knowledge_base_reloads
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from redis.asyncio import Redis
+
+KB_PATH = Path(DIR) / "knowledge_base.json"
+
+KB_REDIS_KEY = "knowledge_base:current"  # hash with the text, version and revision of the newest knowledge base
+KB_VERSIONS_KEY = "knowledge_base:versions"  # set of every version ever published, to recognize outdated files
+KB_CHANNEL = "knowledge_base:updates"  # the new version is published here after every change
+RECONNECT_DELAY = 5  # seconds
+
+_T = TypeVar("_T")
+
+
+def knowledge_base_version(text: str) -> str:
+    """Short content hash, identical on every replica that has the same knowledge base."""
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def decode_knowledge_base(text: str) -> dict[str, Any] | None:
+    try:
+        data = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        logger.exception("Knowledge base is not a valid JSON")
+        return None
+
+    return data if isinstance(data, dict) else None
+
+
+@dataclass(frozen=True, slots=True)
+class KnowledgeBase:
+    """One immutable version of the knowledge base and everything built from it."""
+
+    version: str
+    text: str
+    data: dict[str, Any]
+    revision: int = 0  # increases with every publication to Redis, 0 for a file that was not published yet
+    derived: dict[str, Any] = field(default_factory=dict, compare=False)  # search index, device index, ...
+
+    @classmethod
+    def from_text(cls, text: str, revision: int = 0) -> KnowledgeBase | None:
+        data = decode_knowledge_base(text) if text else None
+        if data is None:
+            return None
+        return cls(version=knowledge_base_version(text), text=text, data=data, revision=revision)
+
+
+def read_knowledge_base_file(path: Path) -> KnowledgeBase | None:
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError:
+        logger.exception("Failed to read knowledge base | path={}", path)
+        return None
+    return KnowledgeBase.from_text(text)
+
+
+class KnowledgeBaseRegistry:
+    """Holds the current knowledge base and swaps in new versions while the bot is running.
+
+    A new version is picked up from the file or from another replica via Redis pub/sub.
+    Replicas agree on the newest version by the revision counter of the publication,
+    not by file times, which differ between hosts and survive copying.
+    Everything derived from it is built in a worker thread before the swap, so the event
+    loop is never blocked, and requests already running keep the version they started with.
+    """
+
+    def __init__(self, path: Path = KB_PATH, poll_interval: float = settings.KB_RELOAD_INTERVAL) -> None:
+        self.path = path
+        self.poll_interval = poll_interval
+        self.builders: dict[str, Callable[[KnowledgeBase], Any]] = {}
+        self._current: KnowledgeBase | None = None
+        self.revision = 0  # of the newest publication this replica has seen
+        self._file_state: tuple[int, int] | None = None
+        self._lock = asyncio.Lock()
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def current(self) -> KnowledgeBase:
+        if self._current is None:
+            self._file_state = self._stat()
+            # an unreadable knowledge base leaves the bot answering without it, as before
+            self._current = read_knowledge_base_file(self.path) or KnowledgeBase(
+                version=knowledge_base_version(""),
+                text="",
+                data={},
+            )
+        return self._current
+
+    def derive(self, name: str, builder: Callable[[KnowledgeBase], _T]) -> _T:
+        """Object built from the current knowledge base, rebuilt in the background for every new version."""
+        self.builders[name] = builder
+        knowledge_base = self.current
+        if name not in knowledge_base.derived:
+            knowledge_base.derived[name] = builder(knowledge_base)
+        return cast("_T", knowledge_base.derived[name])
+
+    def _prepare(self, knowledge_base: KnowledgeBase) -> None:
+        for name, builder in list(self.builders.items()):
+            knowledge_base.derived[name] = builder(knowledge_base)
+
+    async def swap(self, knowledge_base: KnowledgeBase, source: str) -> bool:
+        """Make ``knowledge_base`` the current version, ``False`` when it already is."""
+        async with self._lock:
+            previous = self.current
+            if knowledge_base.version == previous.version:
+                return False
+
+            try:
+                await asyncio.to_thread(self._prepare, knowledge_base)
+            except Exception:  # noqa: BLE001
+                # a builder failing on the new version must not take down the one being served
+                logger.exception(
+                    "Failed to prepare knowledge base | version={} | source={}",
+                    knowledge_base.version,
+                    source,
+                )
+                knowledge_base_reloads.labels(source=source, result="failed").inc()
+                return False
+
+            self._current = knowledge_base
+            self.revision = max(self.revision, knowledge_base.revision)
+
+        knowledge_base_reloads.labels(source=source, result="swapped").inc()
+        logger.info(
+            "Knowledge base swapped | version={} | previous={} | source={}",
+            knowledge_base.version,
+            previous.version,
+            source,
+        )
+        return True
+
+    async def publish(self, redis: Redis, knowledge_base: KnowledgeBase) -> int:
+        """Share ``knowledge_base`` with the other replicas, returns the revision of the publication."""
+        async with redis.pipeline(transaction=True) as pipeline:
+            pipeline.hincrby(KB_REDIS_KEY, "revision", 1)
+            pipeline.hset(KB_REDIS_KEY, mapping={"version": knowledge_base.version, "text": knowledge_base.text})
+            pipeline.sadd(KB_VERSIONS_KEY, knowledge_base.version)
+            pipeline.publish(KB_CHANNEL, knowledge_base.version)
+            revision, *_ = await pipeline.execute()
+
+        self.revision = max(self.revision, int(revision))
+        logger.info("Knowledge base published | version={} | revision={}", knowledge_base.version, revision)
+        return int(revision)
+
+    async def fetch(self, redis: Redis) -> KnowledgeBase | None:
+        """The knowledge base last published by any replica."""
+        raw = await cast("Awaitable[dict[bytes, bytes]]", redis.hgetall(KB_REDIS_KEY))
+        if not raw:
+            return None
+
+        blob = {key.decode(): value.decode() for key, value in raw.items()}
+        knowledge_base = await asyncio.to_thread(KnowledgeBase.from_text, blob["text"], int(blob.get("revision", 0)))
+        if knowledge_base is None or knowledge_base.version != blob["version"]:
+            logger.warning("Published knowledge base is corrupted | version={}", blob.get("version"))
+            return None
+        return knowledge_base
+
+    async def sync(self, redis: Redis) -> None:
+        """Agree with the other replicas on the newest knowledge base: take the published one or publish ours.
+
+        Our version is newer only if it was never published: the file was edited or deployed since.
+        A version published before was replaced by the current publication, the file is outdated then.
+        """
+        published = await self.fetch(redis)
+        current = self.current
+        if published is not None and published.version == current.version:
+            self.revision = max(self.revision, published.revision)
+            return
+
+        # an unreadable file is never published, but takes the published version
+        is_outdated = not current.text or await cast(
+            "Awaitable[int]",
+            redis.sismember(KB_VERSIONS_KEY, current.version),
+        )
+        if published is not None and is_outdated:
+            await self.swap(published, source="redis")
+        elif current.text:
+            await self.publish(redis, current)
+
+    async def watch_file(self, redis: Redis) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+
+            state = await asyncio.to_thread(self._stat)
+            if state is None or state == self._file_state:
+                continue
+            self._file_state = state
+
+            knowledge_base = await asyncio.to_thread(read_knowledge_base_file, self.path)
+            if knowledge_base is None:
+                # half-written or broken file, keep serving the current version
+                knowledge_base_reloads.labels(source="file", result="failed").inc()
+                continue
+
+            if await self.swap(knowledge_base, source="file"):
+                # an edit always wins, even when it restores a version published before
+                with contextlib.suppress(RedisError):
+                    await self.publish(redis, knowledge_base)
+
+    async def listen(self, redis: Redis) -> None:
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(KB_CHANNEL)
+                    # updates published while we were not subscribed
+                    await self.sync(redis)
+
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        version = message["data"].decode()
+                        if version == self.current.version:
+                            continue
+
+                        knowledge_base = await self.fetch(redis)
+                        if knowledge_base is not None and knowledge_base.revision > self.revision:
+                            await self.swap(knowledge_base, source="redis")
+            except RedisError:
+                logger.exception("Knowledge base updates subscription lost, reconnecting | delay={}", RECONNECT_DELAY)
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    def start(self, redis: Redis) -> None:
+        if not settings.KB_RELOAD_ENABLED or self._tasks:
+            return
+
+        self._tasks = [
+            asyncio.create_task(self.watch_file(redis), name="knowledge_base_file"),
+            asyncio.create_task(self.listen(redis), name="knowledge_base_updates"),
+        ]
+        logger.info(
+            "Knowledge base reloading started | version={} | interval={}",
+            self.current.version,
+            self.poll_interval,
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+knowledge_base_registry = KnowledgeBaseRegistry()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import re
+from typing import TYPE_CHECKING, Any
+
+import orjson
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+INLINE_ITEM_CHARS = 60  # lists of longer facts get a line per item, short names share one line
+RANGE_MIN_MODELS = 3  # "iPhone 12, iPhone 13, iPhone 14" -> "iPhone 12–14"
+DEVICE_LISTS_KEY = "supported_devices"
+DEVICE_CATEGORIES = frozenset({"smartphones", "tablets", "other_phones", "android"})
+MODEL_NUMBER_RE = re.compile(r"^(.*?)(\d+)(.*)$")
+
+
+def is_empty(value: Any) -> bool:
+    if isinstance(value, dict):
+        return all(is_empty(item) for item in value.values())
+    if isinstance(value, list):
+        return all(is_empty(item) for item in value)
+    return value is None or value == ""
+
+
+def render_json(document: dict[str, Any]) -> str:
+    return orjson.dumps(document, option=orjson.OPT_INDENT_2).decode()
+
+
+def render_minified(document: dict[str, Any]) -> str:
+    return orjson.dumps(document).decode()
+
+
+def render_list(path: str, items: list[str]) -> list[str]:
+    """Short facts share one line, longer ones get a line per item."""
+    if all(len(item) <= INLINE_ITEM_CHARS and ";" not in item for item in items):
+        return [f"{path}: {'; '.join(items)}"]
+    return [f"{path}:", *(f"- {item}" for item in items)]
+
+
+def render_lines(document: dict[str, Any]) -> str:
+    """One "path: fact" line per value, grouped under a "# section" heading.
+
+    Example:
+    >>> render_lines({"account_management": {"balance_check": {"ussd_code": "*187#"}}})
+    "# account_management\\nbalance_check.ussd_code: *187#"
+
+    """
+    lines: list[str] = []
+
+    def visit(path: str, value: Any) -> None:
+        if is_empty(value):
+            return
+
+        if isinstance(value, dict):
+            for key, item in value.items():
+                visit(f"{path}.{key}" if path else key, item)
+        elif isinstance(value, list) and any(isinstance(item, dict | list) for item in value):
+            for idx, item in enumerate(value, 1):
+                visit(f"{path}.{idx}", item)
+        elif isinstance(value, list):
+            lines.extend(render_list(path, [str(item) for item in value if not is_empty(item)]))
+        else:
+            lines.append(f"{path}: {value}")
+
+    for key, value in document.items():
+        if isinstance(value, dict) and not is_empty(value):
+            lines.append(f"# {key}")
+            visit("", value)
+        else:
+            visit(key, value)
+
+    return "\n".join(lines)
+
+
+def group_model_numbers(models: list[str]) -> dict[tuple[str, str], set[int]]:
+    """(prefix, suffix) -> model numbers, e.g. ("iPhone ", " Pro") -> {12, 13, 14}."""
+    families: dict[tuple[str, str], set[int]] = {}
+    for model in models:
+        if match := MODEL_NUMBER_RE.match(model):
+            prefix, number, suffix = match.groups()
+            # "iPhone 08" is not in the same range as "iPhone 8"
+            if number == str(int(number)):
+                families.setdefault((prefix, suffix), set()).add(int(number))
+    return families
+
+
+def collapse_model_ranges(models: list[str]) -> list[str]:
+    """Replace runs of consecutive model numbers with a range, keeping the position of the run's first model.
+
+    Example:
+    >>> collapse_model_ranges(["iPhone 14 Pro", "iPhone 14", "iPhone 13 Pro", "iPhone 12 Pro", "iPhone SE"])
+    ["iPhone 12–14 Pro", "iPhone 14", "iPhone SE"]
+
+    """
+    collapsed: dict[str, list[str]] = {}  # first model of a run -> rendered names
+    replaced: set[str] = set()
+    for (prefix, suffix), numbers in group_model_numbers(models).items():
+        run: list[int] = []
+        for number in [*sorted(numbers), None]:
+            if run and number == run[-1] + 1:
+                run.append(number)
+                continue
+            if len(run) >= RANGE_MIN_MODELS:
+                names = [f"{prefix}{item}{suffix}" for item in run]
+                first = next(model for model in models if model in names)
+                collapsed[first] = [f"{prefix}{run[0]}–{run[-1]}{suffix}"]
+                replaced.update(names)
+            run = [number] if number is not None else []
+
+    result: list[str] = []
+    for model in models:
+        if model in collapsed:
+            result.extend(collapsed[model])
+        elif model not in replaced:
+            result.append(model)
+    return result
+
+
+def compact_device_lists(document: dict[str, Any]) -> dict[str, Any]:
+    """Copy of the document with shorter supported device lists.
+
+    Brand names repeated in every model are dropped, devices listed twice are kept
+    only once and consecutive model numbers are collapsed into ranges.
+    """
+    seen: set[str] = set()
+
+    def visit(value: Any, brand: str) -> Any:
+        if isinstance(value, dict):
+            return {key: visit(item, brand if key in DEVICE_CATEGORIES else key) for key, item in value.items()}
+        if not isinstance(value, list):
+            return value
+
+        models: list[str] = []
+        for item in value:
+            if not isinstance(item, str):
+                models.append(item)
+                continue
+            model = item[len(brand) + 1 :] if brand and item.casefold().startswith(f"{brand.casefold()} ") else item
+            # "Fairphone 4" stays as it is, a bare number is not a model name
+            model = model if model[:1].isalpha() else item
+            if item.casefold() in seen or model.casefold() in seen:
+                continue
+            seen.update((item.casefold(), model.casefold()))
+            models.append(model)
+        return collapse_model_ranges(models) if all(isinstance(model, str) for model in models) else models
+
+    def walk(value: dict[str, Any]) -> dict[str, Any]:
+        return {
+            key: visit(item, "") if key == DEVICE_LISTS_KEY else walk(item) if isinstance(item, dict) else item
+            for key, item in value.items()
+        }
+
+    return walk(document)
+
+
+def render_compact(document: dict[str, Any]) -> str:
+    return render_lines(compact_device_lists(document))
+
+
+RENDERINGS: dict[str, Callable[[dict[str, Any]], str]] = {
+    "json": render_json,
+    "minified": render_minified,
+    "lines": render_lines,
+    "compact": render_compact,
+}
+
+# how the knowledge base is described to the model in the instructions
+RENDERING_DESCRIPTIONS = {
+    "json": "in json format",
+    "minified": "in json format",
+    "lines": 'as "section.path: fact" lines',
+    "compact": (
+        'as "section.path: fact" lines, a device range like "iPhone 12–14 Pro" includes every model number in between'
+    ),
+}
+
+
+def render_document(document: dict[str, Any], rendering: str) -> str:
+    return RENDERINGS[rendering](document)
@@ -0,0 +1,315 @@
+from __future__ import annotations
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.knowledge.compiled import KB_ARTIFACT_PATH, load_compiled_knowledge_base
+from bot.knowledge.registry import knowledge_base_registry
+from bot.knowledge.renderings import render_document
+from bot.knowledge.sections import (
+    SECTION_MAX_CHARS,
+    KnowledgeSection,
+    render_sections,
+    split_sections,
+)
+from bot.utils.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping, Sequence
+
+    from bot.knowledge.registry import KnowledgeBase
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    {
+        "a", "about", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does", "for", "from",
+        "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "so", "that", "the", "this", "to",
+        "what", "when", "where", "which", "why", "will", "with", "you", "your",
+    },
+)  # fmt: skip
+SUFFIXES = ("ing", "ed", "es", "s")
+# function words of the other languages the bot answers in, questions are asked in all of them
+QUESTION_STOPWORDS = STOPWORDS | frozenset(
+    {
+        # es, pt
+        "al", "como", "cómo", "con", "cual", "cuál", "da", "de", "del", "do", "donde", "dónde", "el", "em", "en",
+        "es", "está", "eu", "la", "las", "lo", "los", "mi", "minha", "mis", "meu", "na", "no", "o", "onde", "os",
+        "para", "pode", "por", "posso", "puede", "puedo", "qual", "que", "qué", "se", "su", "um", "uma", "un",
+        "una", "y", "é",
+        # fr
+        "au", "ce", "comment", "d", "des", "du", "est", "et", "il", "j", "je", "l", "le", "les", "ma", "mes",
+        "mon", "où", "ou", "peut", "peux", "pour", "qu", "quel", "quelle", "sur", "une", "à",
+        # de
+        "das", "dem", "den", "der", "die", "ein", "eine", "einen", "für", "ich", "im", "ist", "kann", "mein",
+        "meine", "meinen", "mich", "mir", "mit", "und", "von", "was", "welche", "wie", "wo", "zu", "zum",
+        # ru
+        "а", "в", "во", "где", "и", "или", "как", "какой", "какая", "ли", "мне", "меня", "мой", "моя", "мою",
+        "на", "о", "по", "с", "у", "что", "это", "я",
+        # ar
+        "أنا", "أين", "إلى", "في", "كيف", "ما", "من", "هل", "و", "على",
+    },
+)  # fmt: skip
+# scripts written without spaces between words, their terms are character bigrams
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def stem(token: str) -> str:
+    """Very light suffix stripping, enough to match "installing" with "installation" prefixes."""
+    for suffix in SUFFIXES:
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    return [stem(token) for token in TOKEN_RE.findall(text.casefold()) if token not in STOPWORDS]
+
+
+def question_terms(text: str) -> frozenset[str]:
+    """Content terms of a question in any of the bot's languages, for telling questions apart."""
+    terms: set[str] = set()
+    for token in TOKEN_RE.findall(text.casefold()):
+        if token in QUESTION_STOPWORDS:
+            continue
+        if CJK_RE.search(token):
+            terms.update(token[idx : idx + 2] for idx in range(max(1, len(token) - 1)))
+        else:
+            terms.add(stem(token))
+    return frozenset(terms)
+
+
+def inverse_document_frequencies(term_freqs: Sequence[Mapping[str, int]]) -> dict[str, float]:
+    doc_freqs: Counter[str] = Counter()
+    for term_freq in term_freqs:
+        doc_freqs.update(term_freq.keys())
+
+    total = len(term_freqs)
+    return {term: math.log(1 + (total - freq + 0.5) / (freq + 0.5)) for term, freq in doc_freqs.items()}
+
+
+class BM25Index:
+    """Okapi BM25 index over a fixed list of documents."""
+
+    def __init__(
+        self,
+        documents: list[list[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        term_freqs: list[Mapping[str, int]] | None = None,
+        idf: dict[str, float] | None = None,
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.term_freqs: list[Mapping[str, int]] = (
+            term_freqs if term_freqs is not None else [Counter(document) for document in documents]
+        )
+        self.lengths = [sum(term_freq.values()) for term_freq in self.term_freqs]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.idf = idf if idf is not None else inverse_document_frequencies(self.term_freqs)
+
+    @classmethod
+    def from_term_freqs(cls, term_freqs: list[Mapping[str, int]], idf: dict[str, float]) -> BM25Index:
+        """Restore a prebuilt index without tokenizing the documents again."""
+        return cls([], term_freqs=term_freqs, idf=idf)
+
+    def scores(self, query: list[str]) -> list[float]:
+        terms = [term for term in set(query) if term in self.idf]
+        results = [0.0] * len(self.term_freqs)
+        if not terms:
+            return results
+
+        for idx, term_freq in enumerate(self.term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[idx] / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = term_freq.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results[idx] = score
+
+        return results
+
+
+@dataclass(frozen=True, slots=True)
+class RetrievalResult:
+    context: str
+    section_ids: tuple[str, ...]
+    top_score: float
+    is_fallback: bool
+    tokens: int
+    dropped: int = 0  # relevant sections left out to fit the token budget
+
+
+class KnowledgeRetriever:
+    """Selects only the knowledge base sections that are relevant to a question.
+
+    Sections of a compiled knowledge base are decoded as they are selected, a callable
+    ``full_text`` is called the first time the full knowledge base is sent.
+    """
+
+    def __init__(
+        self,
+        sections: Sequence[KnowledgeSection],
+        full_text: str | Callable[[], str],
+        index: BM25Index | None = None,
+        full_tokens: int | None = None,
+        rendering: str = "json",
+    ) -> None:
+        self.sections = sections
+        self._full_text = full_text
+        self.rendering = rendering
+        self.top_k = settings.KB_RETRIEVAL_TOP_K
+        self.min_score = settings.KB_RETRIEVAL_MIN_SCORE
+        self.full_tokens = full_tokens if full_tokens is not None else estimate_tokens(self.full_text)
+        self.index = index or BM25Index([tokenize(section.text) for section in sections])
+
+    @cached_property
+    def full_text(self) -> str:
+        return self._full_text() if callable(self._full_text) else self._full_text
+
+    def _order(self, question: str) -> list[tuple[int, float]]:
+        """Positions of every section ordered by relevance, ties keep the knowledge base order."""
+        scores = self.index.scores(tokenize(question))
+        return sorted(enumerate(scores), key=lambda item: item[1], reverse=True)
+
+    def rank(self, question: str) -> list[tuple[KnowledgeSection, float]]:
+        """Every section ordered by relevance, ties keep the knowledge base order."""
+        return [(self.sections[idx], score) for idx, score in self._order(question)]
+
+    def search(self, question: str) -> list[tuple[KnowledgeSection, float]]:
+        return [(self.sections[idx], score) for idx, score in self._order(question)[: self.top_k] if score > 0]
+
+    def retrieve(self, question: str, max_tokens: int | None = None, prefer_full: bool = False) -> RetrievalResult:
+        """Return the prompt context for a question, falling back to the full knowledge base when unsure.
+
+        With ``max_tokens`` the context is packed from the most relevant sections that fit the budget,
+        the full knowledge base is sent only if it fits as a whole. ``prefer_full`` sends the full
+        knowledge base whenever it fits, which keeps the prompt prefix identical across questions.
+        """
+        ranked = self._order(question)
+        top_score = ranked[0][1] if ranked else 0.0
+        is_fallback = top_score < self.min_score
+
+        if (is_fallback or prefer_full) and (max_tokens is None or self.full_tokens <= max_tokens):
+            return RetrievalResult(
+                context=self.full_text,
+                section_ids=(),
+                top_score=top_score,
+                is_fallback=is_fallback,
+                tokens=self.full_tokens,
+            )
+
+        if not is_fallback:
+            ranked = [(idx, score) for idx, score in ranked[: self.top_k] if score > 0]
+        candidates = [self.sections[idx] for idx, _ in ranked]
+        positions = {section.id: idx for section, (idx, _) in zip(candidates, ranked, strict=True)}
+
+        selected = pack_sections(candidates, max_tokens)
+        # rendered in the knowledge base order, so the same sections always give the same text
+        selected.sort(key=lambda section: positions[section.id])
+        return RetrievalResult(
+            context=render_sections(selected, self.rendering) if selected else "",
+            section_ids=tuple(section.id for section in selected),
+            top_score=top_score,
+            is_fallback=is_fallback,
+            tokens=sum(section.tokens for section in selected),
+            dropped=len(candidates) - len(selected),
+        )
+
+
+def pack_sections(sections: list[KnowledgeSection], max_tokens: int | None) -> list[KnowledgeSection]:
+    """Greedily take sections in the given (relevance) order, skipping the ones that no longer fit."""
+    if max_tokens is None:
+        return sections
+
+    selected: list[KnowledgeSection] = []
+    remaining = max_tokens
+    for section in sections:
+        if section.tokens <= remaining:
+            selected.append(section)
+            remaining -= section.tokens
+    return selected
+
+
+def build_knowledge_retriever(knowledge_base: KnowledgeBase, rendering: str | None = None) -> KnowledgeRetriever:
+    """Index a knowledge base version, the prompt context is rendered in ``rendering`` (``KB_RENDERING`` by default).
+
+    The compiled artifact of ``convert.py`` is used when it matches the knowledge base,
+    otherwise the knowledge base is split and indexed at runtime.
+    """
+    rendering = rendering or settings.KB_RENDERING
+    compiled = load_compiled_knowledge_base()
+    if (
+        compiled is not None
+        and compiled.version == knowledge_base.version
+        and compiled.max_chars == SECTION_MAX_CHARS
+        and compiled.rendering == rendering
+    ):
+        # the index is needed by every question, contents and texts are decoded from the mapping when selected
+        retriever = KnowledgeRetriever(
+            sections=compiled.sections(),
+            full_text=lambda: compiled.full_text,
+            index=BM25Index.from_term_freqs(
+                [compiled.chunk_terms(chunk) for chunk in compiled.chunks],
+                compiled.idf,
+            ),
+            full_tokens=compiled.full_tokens,
+            rendering=rendering,
+        )
+        source = "artifact"
+    else:
+        if compiled is not None:
+            compiled.close()
+            # expected after every edit of the knowledge base until the artifact is rebuilt
+            logger.info(
+                "Knowledge base artifact is of another version, indexing at runtime | version={} | path={}",
+                compiled.version,
+                KB_ARTIFACT_PATH,
+            )
+        # the original file is the json rendering of the full knowledge base
+        full_text = knowledge_base.text if rendering == "json" else render_document(knowledge_base.data, rendering)
+        retriever = KnowledgeRetriever(
+            sections=split_sections(knowledge_base.data, rendering=rendering),
+            full_text=full_text,
+            rendering=rendering,
+        )
+        source = "runtime"
+
+    logger.info(
+        "Knowledge base indexed | version={} | source={} | rendering={} | sections={} | full_tokens={} | top_k={}",
+        knowledge_base.version,
+        source,
+        rendering,
+        len(retriever.sections),
+        retriever.full_tokens,
+        retriever.top_k,
+    )
+    return retriever
+
+
+def get_knowledge_retriever() -> KnowledgeRetriever:
+    """Get the retriever of the current knowledge base version."""
+    return knowledge_base_registry.derive("retriever", build_knowledge_retriever)
+
+
+def get_knowledge_context(question: str, max_tokens: int | None = None, prefer_full: bool = False) -> RetrievalResult:
+    """Knowledge base content to send along with the question, limited to ``max_tokens`` estimated tokens."""
+    # with retrieval disabled nothing scores and the full knowledge base is sent while it fits the budget
+    query = question if settings.KB_RETRIEVAL_ENABLED else ""
+    result = get_knowledge_retriever().retrieve(query, max_tokens=max_tokens, prefer_full=prefer_full)
+
+    logger.debug(
+        "Knowledge base retrieval | fallback={} | score={:.2f} | sections={} | dropped={} | tokens={}",
+        result.is_fallback,
+        result.top_score,
+        result.section_ids,
+        result.dropped,
+        result.tokens,
+    )
+    return result
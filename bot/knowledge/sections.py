@@ -0,0 +1,110 @@
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from typing import Any
+
+import orjson
+
+from bot.knowledge.registry import knowledge_base_registry
+from bot.knowledge.renderings import is_empty, render_document
+from bot.utils.tokens import estimate_tokens
+
+SECTION_MAX_CHARS = 700  # bigger subtrees are split into their children
+SKIPPED_SECTIONS = frozenset({"metadata"})
+
+
+@dataclass(frozen=True, slots=True)
+class KnowledgeSection:
+    """A self-contained part of the knowledge base addressed by its dotted path."""
+
+    id: str
+    path: tuple[str, ...]
+    content: Any
+    text: str
+    tokens: int  # estimated prompt tokens of the rendered section
+
+
+def load_knowledge_base_text() -> str:
+    """The current knowledge base JSON."""
+    return knowledge_base_registry.current.text
+
+
+def get_knowledge_base_version() -> str:
+    """Short content hash of the knowledge base, changes whenever the file does."""
+    return knowledge_base_registry.current.version
+
+
+def load_knowledge_base() -> dict[str, Any]:
+    return knowledge_base_registry.current.data
+
+
+def flatten_text(value: Any) -> str:
+    """Collect all keys and scalar values of a subtree into plain text for indexing."""
+    if isinstance(value, dict):
+        return " ".join(f"{key.replace('_', ' ')} {flatten_text(item)}" for key, item in value.items())
+    if isinstance(value, list):
+        return " ".join(flatten_text(item) for item in value)
+    return "" if value is None else str(value)
+
+
+def _dumps(value: Any) -> str:
+    return orjson.dumps(value).decode()
+
+
+def split_sections(
+    knowledge_base: dict[str, Any],
+    max_chars: int = SECTION_MAX_CHARS,
+    count_tokens: bool = True,
+    rendering: str = "json",
+) -> list[KnowledgeSection]:
+    """Split the knowledge base into sections (compatibility, installation, payment, ...).
+
+    Subtrees larger than ``max_chars`` are split further into their children,
+    so that every section stays small enough to be retrieved on its own.
+    Token estimates are of the sections in ``rendering``, without ``count_tokens``
+    they are left at zero for the caller to fill in.
+    """
+    sections: list[KnowledgeSection] = []
+
+    def visit(path: tuple[str, ...], value: Any) -> None:
+        if is_empty(value):
+            return
+
+        if isinstance(value, dict) and len(value) > 1 and len(_dumps(value)) > max_chars:
+            for key, item in value.items():
+                visit((*path, key), item)
+            return
+
+        path_text = " ".join(part.replace("_", " ") for part in path)
+        section = KnowledgeSection(
+            id=".".join(path),
+            path=path,
+            content=value,
+            text=f"{path_text} {flatten_text(value)}",
+            tokens=0,
+        )
+        if count_tokens:
+            section = replace(section, tokens=estimate_section_tokens(section, rendering))
+        sections.append(section)
+
+    for key, value in knowledge_base.items():
+        if key in SKIPPED_SECTIONS:
+            continue
+        visit((key,), value)
+
+    return sections
+
+
+def estimate_section_tokens(section: KnowledgeSection, rendering: str = "json") -> int:
+    return estimate_tokens(render_sections([section], rendering))
+
+
+def render_sections(sections: list[KnowledgeSection], rendering: str = "json") -> str:
+    """Rebuild a nested document out of the selected sections, keeping the original layout, and render it."""
+    document: dict[str, Any] = {}
+    for section in sections:
+        node = document
+        for part in section.path[:-1]:
+            node = node.setdefault(part, {})
+        node[section.path[-1]] = section.content
+
+    return render_document(document, rendering)
@@ -3,20 +3,30 @@ from aiogram.utils.callback_answer import CallbackAnswerMiddleware
 
 from .auth import AuthMiddleware
 from .database import DatabaseMiddleware
+from .debounce import DebounceMiddleware
 from .i18n import ACLMiddleware
 from .logging import LoggingMiddleware
+from .profile import UserProfileMiddleware
 from .throttling import ThrottlingMiddleware
 from bot.core.loader import i18n as _i18n
 from bot.core.config import settings
+from bot.handlers.start import Onboarding
 
 
 def register_middlewares(dp: Dispatcher) -> None:
+    if settings.DEBOUNCE_ENABLED:
+        # before the database session is opened and before throttling, which would drop the merged message
+        dp.update.outer_middleware(DebounceMiddleware(states=[Onboarding.ask_question]))
+
     dp.message.outer_middleware(ThrottlingMiddleware())
 
     dp.update.outer_middleware(LoggingMiddleware())
 
     dp.update.outer_middleware(DatabaseMiddleware())
 
+    # before the message middlewares and filters, which all read it
+    dp.update.outer_middleware(UserProfileMiddleware())
+
     dp.message.middleware(AuthMiddleware())
 
     if settings.USE_I18N and _i18n and _i18n.locales:
@@ -5,7 +5,7 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message
 from loguru import logger
 
-from bot.services.users import add_user, user_exists
+from bot.services.users import UserProfile, add_user
 from bot.utils.command import find_command_argument
 
 if TYPE_CHECKING:
@@ -32,7 +32,7 @@ class AuthMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        if await user_exists(session, user.id):
+        if data.get("user_profile") is not None:
             return await handler(event, data)
 
         referrer = find_command_argument(message.text)
@@ -40,5 +40,6 @@ class AuthMiddleware(BaseMiddleware):
         logger.info(f"new user registration | user_id: {user.id} | message: {message.text}")
 
         await add_user(session=session, user=user, referrer=referrer)
+        data["user_profile"] = UserProfile(id=user.id, language_code=user.language_code or "", is_admin=False)
 
         return await handler(event, data)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from loguru import logger
+
+from bot.core.config import settings
+from bot.services.metrics import debounced_messages
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Collection
+
+    from aiogram.fsm.state import State
+    from aiogram.types import TelegramObject
+
+
+@dataclass(slots=True)
+class PendingMessages:
+    texts: list[str]
+    started_at: float = field(default_factory=monotonic)
+    arrived: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class DebounceMiddleware(BaseMiddleware):
+    """Merges text messages a user sends in quick succession into one message.
+
+    The first message waits until the user has been quiet for ``window`` seconds, every
+    message arriving meanwhile is appended to it and restarts the window, but the first
+    message is never held longer than ``max_wait``. The handler then runs once with the
+    merged text. Relies on updates being handled concurrently, the aiogram default for
+    both polling and webhooks.
+
+    Only messages sent in one of the FSM ``states`` are merged, e.g. while a question is asked.
+    It is an update middleware, so that no database session is held while the message waits.
+    """
+
+    def __init__(
+        self,
+        states: Collection[State],
+        window: float = settings.DEBOUNCE_WINDOW,
+        max_wait: float = settings.DEBOUNCE_MAX_WAIT,
+    ) -> None:
+        self.states = frozenset(state.state for state in states)
+        self.window = window
+        self.max_wait = max_wait
+        self.pending: dict[tuple[int, int], PendingMessages] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        message = event.message if isinstance(event, Update) else None
+        # commands, non-text messages and messages outside of the question states are handled right away
+        if (
+            message is None
+            or not message.text
+            or message.text.startswith("/")
+            or not message.from_user
+            or data.get("raw_state") not in self.states
+        ):
+            return await handler(event, data)
+
+        # per user, messages of different members of a group are not merged
+        key = (message.chat.id, message.from_user.id)
+        pending = self.pending.get(key)
+        if pending is not None:
+            pending.texts.append(message.text)
+            pending.arrived.set()
+            debounced_messages.inc()
+            return None
+
+        pending = PendingMessages(texts=[message.text])
+        self.pending[key] = pending
+        try:
+            await self._wait_quiet(pending)
+        finally:
+            del self.pending[key]
+
+        if len(pending.texts) > 1:
+            logger.info("Messages merged | chat_id={} | count={}", message.chat.id, len(pending.texts))
+            merged = message.model_copy(update={"text": "\n".join(pending.texts)})
+            event = event.model_copy(update={"message": merged})
+        return await handler(event, data)
+
+    async def _wait_quiet(self, pending: PendingMessages) -> None:
+        deadline = pending.started_at + self.max_wait
+        while (timeout := min(self.window, deadline - monotonic())) > 0:
+            pending.arrived.clear()
+            try:
+                await asyncio.wait_for(pending.arrived.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return
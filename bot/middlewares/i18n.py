@@ -19,26 +19,22 @@ from typing import TYPE_CHECKING, Any
 from aiogram.utils.i18n.middleware import I18nMiddleware
 
 from bot.core.config import DEFAULT_LOCALE
-from bot.services.users import get_language_code
 
 if TYPE_CHECKING:
-    from aiogram.types import TelegramObject, User
-    from sqlalchemy.ext.asyncio import AsyncSession
+    from aiogram.types import TelegramObject
+
+    from bot.services.users import UserProfile
 
 
 class ACLMiddleware(I18nMiddleware):
     DEFAULT_LANGUAGE_CODE = DEFAULT_LOCALE
 
     async def get_locale(self, event: TelegramObject, data: dict[str, Any]) -> str:
-        session: AsyncSession = data["session"]
-
         if hasattr(event, "chat_member"):
             return self.DEFAULT_LANGUAGE_CODE
 
-        user: User | None = getattr(event, "from_user", None)
-        if not user:
+        user_profile: UserProfile | None = data.get("user_profile")
+        if not user_profile:
             return self.DEFAULT_LANGUAGE_CODE
 
-        language_code: str | None = await get_language_code(session=session, user_id=user.id)
-
-        return language_code or self.DEFAULT_LANGUAGE_CODE
+        return user_profile.language_code or self.DEFAULT_LANGUAGE_CODE
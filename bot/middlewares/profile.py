@@ -0,0 +1,31 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+
+from aiogram import BaseMiddleware
+
+from bot.services.users import get_user_profile
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from aiogram.types import TelegramObject, User
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class UserProfileMiddleware(BaseMiddleware):
+    """Loads the profile of the update's user into ``data["user_profile"]``, ``None`` for unregistered users.
+
+    Registration, the locale, filters and handlers all read it instead of looking the user up one field at a time.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        session: AsyncSession = data["session"]
+
+        data["user_profile"] = await get_user_profile(session, user.id) if user else None
+        return await handler(event, data)
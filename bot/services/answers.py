@@ -0,0 +1,205 @@
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.cache.answers import (
+    build_answer_key,
+    get_answer_by_key,
+    get_cached_answer,
+    get_similar_answer,
+    set_cached_answer,
+)
+from bot.cache.singleflight import single_flight
+from bot.core.config import settings
+from bot.knowledge.answer_bank import get_banked_answer
+from bot.knowledge.devices import get_device_answer
+from bot.knowledge.intents import get_intent_answer
+from bot.knowledge.sections import get_knowledge_base_version
+from bot.services.bulkhead import BulkheadFullError, llm_bulkhead
+from bot.services.conversation import is_follow_up
+from bot.services.router import get_llm_router
+from bot.services.tiering import select_tier
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+
+    from bot.services.prompt import ChatTurn
+
+
+def get_local_answer(question: str, language_code: str) -> str | None:
+    """Answer without the LLM: supported devices and common single-fact intents first, then graded answers.
+
+    Device and intent answers are built from the current knowledge base, graded answers were written for it earlier.
+    """
+    device = get_device_answer(question, language_code)
+    intent = get_intent_answer(question, language_code)
+    if device is not None and intent is not None:
+        # "iphone 14 top up" is neither a compatibility question nor a generic top-up one
+        return None
+    if (match := device or intent) is not None:
+        return match.answer
+
+    banked = get_banked_answer(question, language_code)
+    return banked.entry.answer if banked else None
+
+
+async def get_any_cached_answer(question: str, language_code: str) -> str | None:
+    cached_answer = await get_cached_answer(question, language_code)
+    if cached_answer is None:
+        cached_answer = await get_similar_answer(question, language_code)
+    return cached_answer
+
+
+def get_relevant_history(question: str, history: Sequence[ChatTurn]) -> Sequence[ChatTurn]:
+    """The conversation for a follow-up question, none for a self-contained one.
+
+    A self-contained question is answered as in a new chat: its answer is shared through the cache
+    and single-flight with other users, so it must not depend on this chat's conversation.
+    """
+    return history if history and is_follow_up(question) else ()
+
+
+async def coalesce(
+    question: str,
+    language_code: str,
+    kb_version: str,
+    func: Callable[[], Awaitable[str]],
+) -> str:
+    """Share one upstream call between concurrent identical questions."""
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await func()
+
+    # the answer key already covers the normalized question, language and knowledge base version
+    key = build_answer_key(question, language_code, kb_version)
+    return await single_flight.do(key, func, lookup=lambda: get_answer_by_key(key))
+
+
+async def answer_question(
+    question: str,
+    language_code: str,
+    history: Sequence[ChatTurn] = (),
+    turn: int = 0,
+) -> str:
+    """Answer a user's question, reusing a cached answer for the same or a similar question when possible.
+
+    ``history`` is the conversation so far and ``turn`` the number of earlier questions. Only a
+    follow-up question is answered with the conversation, and its answer is neither taken from nor
+    stored in the shared cache. Raises ``BulkheadFullError`` when the process is too busy to ask the LLM.
+    """
+    # the version the question arrived with, a knowledge base swap must not mix up cached answers
+    kb_version = get_knowledge_base_version()
+    history = get_relevant_history(question, history)
+    if (local_answer := get_local_answer(question, language_code)) is not None:
+        return local_answer
+
+    if not history:
+        cached_answer = await get_any_cached_answer(question, language_code)
+        if cached_answer is not None:
+            return cached_answer
+
+    async def generate() -> str:
+        tier = select_tier(question, turn)
+        async with llm_bulkhead.acquire():
+            answer = await get_llm_router().answer(
+                question=question,
+                language_code=language_code,
+                tier=tier,
+                history=history,
+            )
+        if not history:
+            await set_cached_answer(question, language_code, answer, kb_version)
+        return answer
+
+    if history:
+        return await generate()
+    return await coalesce(question, language_code, kb_version, generate)
+
+
+async def stream_answer(
+    question: str,
+    language_code: str,
+    history: Sequence[ChatTurn] = (),
+    turn: int = 0,
+) -> AsyncIterator[str]:
+    """Streaming counterpart of ``answer_question``.
+
+    Local, cached answers and answers produced by a concurrent identical request are yielded as a single chunk.
+    """
+    kb_version = get_knowledge_base_version()
+    history = get_relevant_history(question, history)
+    if (local_answer := get_local_answer(question, language_code)) is not None:
+        yield local_answer
+        return
+
+    if not history:
+        cached_answer = await get_any_cached_answer(question, language_code)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+
+    async for delta in stream_generated_answer(question, language_code, kb_version, history, turn):
+        yield delta
+
+
+async def stream_generated_answer(
+    question: str,
+    language_code: str,
+    kb_version: str,
+    history: Sequence[ChatTurn],
+    turn: int,
+) -> AsyncIterator[str]:
+    """Stream an answer from the LLM, or the answer of a concurrent identical request as a single chunk."""
+    deltas: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def generate() -> str:
+        tier = select_tier(question, turn)
+        parts: list[str] = []
+        async with llm_bulkhead.acquire():
+            # an interrupted stream raises before the partial answer could be cached
+            async for delta in get_llm_router().stream_answer(
+                question=question,
+                language_code=language_code,
+                tier=tier,
+                history=history,
+            ):
+                parts.append(delta)
+                deltas.put_nowait(delta)
+
+        answer = "".join(parts).strip()
+        if not history:
+            await set_cached_answer(question, language_code, answer, kb_version)
+        return answer
+
+    async def run() -> str:
+        try:
+            if history:
+                return await generate()
+            return await coalesce(question, language_code, kb_version, generate)
+        finally:
+            deltas.put_nowait(None)
+
+    task = asyncio.create_task(run())
+
+    streamed_len = 0
+    try:
+        while (delta := await deltas.get()) is not None:
+            streamed_len += len(delta)
+            yield delta
+
+        answer = await task
+    except BulkheadFullError:
+        raise
+    except Exception:  # noqa: BLE001
+        # the handler keeps what was already shown, or answers with its fallback text if nothing was
+        logger.exception("Answer stream failed | streamed_len={}", streamed_len)
+        return
+    finally:
+        # the reader is gone, e.g. a newer question superseded this one: close the upstream stream.
+        # Cancelling is a no-op once the answer is complete
+        task.cancel()
+
+    # we were a follower of another request with the same question
+    if not streamed_len and answer:
+        yield answer
@@ -0,0 +1,77 @@
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.services.metrics import llm_inflight, llm_queue_depth, llm_queue_rejections, llm_queue_wait
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+class BulkheadFullError(Exception):
+    """Raised when a request can not get a slot within the queue limits."""
+
+
+class Bulkhead:
+    """Caps concurrent LLM requests of the process.
+
+    Requests over ``max_concurrency`` wait in a queue of at most ``max_queue`` entries
+    for up to ``queue_timeout`` seconds, everything beyond that is rejected right away.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        max_queue: int = settings.LLM_MAX_QUEUE,
+        queue_timeout: float = settings.LLM_QUEUE_TIMEOUT,
+    ) -> None:
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        if self.semaphore.locked():
+            await self._wait_for_slot()
+        else:
+            # a free slot is taken without suspending
+            await self.semaphore.acquire()
+            llm_queue_wait.observe(0)
+
+        llm_inflight.inc()
+        try:
+            yield
+        finally:
+            llm_inflight.dec()
+            self.semaphore.release()
+
+    async def _wait_for_slot(self) -> None:
+        if self.waiting >= self.max_queue:
+            llm_queue_rejections.labels(reason="queue_full").inc()
+            logger.warning("LLM queue is full | waiting={}", self.waiting)
+            msg = "LLM queue is full"
+            raise BulkheadFullError(msg)
+
+        self.waiting += 1
+        llm_queue_depth.set(self.waiting)
+        start = monotonic()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            llm_queue_rejections.labels(reason="timeout").inc()
+            logger.warning("LLM queue wait timed out | timeout_s={}", self.queue_timeout)
+            msg = "LLM queue wait timed out"
+            raise BulkheadFullError(msg) from None
+        finally:
+            self.waiting -= 1
+            llm_queue_depth.set(self.waiting)
+            llm_queue_wait.observe(monotonic() - start)
+
+
+llm_bulkhead = Bulkhead()
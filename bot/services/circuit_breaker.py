@@ -0,0 +1,169 @@
+from __future__ import annotations
+import random
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from time import monotonic, time
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.services.metrics import llm_breaker_state
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+
+class BreakerState(Enum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+@dataclass(frozen=True, slots=True)
+class ErrorInfo:
+    """Provider independent classification of a failed request."""
+
+    reason: str
+    retryable: bool
+    retry_after: float | None = None
+
+
+def parse_retry_after(headers: Mapping[str, str] | None) -> float | None:
+    """Read ``retry-after-ms`` or ``retry-after`` (seconds or HTTP date) response headers."""
+    if not headers:
+        return None
+
+    if value := headers.get("retry-after-ms"):
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honors ``Retry-After``."""
+
+    def __init__(
+        self,
+        max_attempts: int = settings.LLM_MAX_ATTEMPTS,
+        base_delay: float = settings.LLM_RETRY_BASE_DELAY,
+        max_delay: float = settings.LLM_RETRY_MAX_DELAY,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt: int, error: ErrorInfo) -> float | None:
+        """Seconds to wait before the next attempt, ``None`` means give up."""
+        if not error.retryable or attempt >= self.max_attempts:
+            return None
+
+        if error.retry_after is not None:
+            # waiting longer than that is worse than failing over to another provider
+            return error.retry_after if error.retry_after <= self.max_delay else None
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))  # noqa: S311
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker driven by the error rate over a rolling time window.
+
+    CLOSED lets every request through; once the failure ratio in the window passes the
+    threshold the breaker goes OPEN and rejects requests for ``open_seconds``. After that
+    a single probe request is allowed in HALF_OPEN state: success closes the breaker,
+    failure opens it again. A probe cancelled before its outcome is released, so the next
+    request probes instead.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = settings.LLM_BREAKER_WINDOW,
+        min_requests: int = settings.LLM_BREAKER_MIN_REQUESTS,
+        failure_ratio: float = settings.LLM_BREAKER_FAILURE_RATIO,
+        open_seconds: float = settings.LLM_BREAKER_OPEN_SECONDS,
+    ) -> None:
+        self.name = name
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+
+        self.outcomes: deque[tuple[float, bool]] = deque()
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._set_state(BreakerState.CLOSED)
+
+    def _set_state(self, state: BreakerState) -> None:
+        self.state = state
+        llm_breaker_state.labels(provider=self.name).set(state.value)
+
+    def _trim(self, now: float) -> None:
+        while self.outcomes and now - self.outcomes[0][0] > self.window:
+            self.outcomes.popleft()
+
+    def allow_request(self) -> bool:
+        if self.state is BreakerState.CLOSED:
+            return True
+
+        if self.state is BreakerState.OPEN:
+            if monotonic() - self.opened_at < self.open_seconds:
+                return False
+            self._set_state(BreakerState.HALF_OPEN)
+            logger.info("Circuit breaker half-open | provider={}", self.name)
+
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """Let another request probe, the probe in flight ended without an outcome."""
+        self.probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.probe_in_flight = False
+        if self.state is BreakerState.HALF_OPEN:
+            self.outcomes.clear()
+            self._set_state(BreakerState.CLOSED)
+            logger.info("Circuit breaker closed | provider={}", self.name)
+            return
+
+        now = monotonic()
+        self.outcomes.append((now, True))
+        self._trim(now)
+
+    def record_failure(self) -> None:
+        self.probe_in_flight = False
+        if self.state is BreakerState.HALF_OPEN:
+            self._open()
+            return
+
+        now = monotonic()
+        self.outcomes.append((now, False))
+        self._trim(now)
+
+        failures = sum(1 for _, ok in self.outcomes if not ok)
+        if len(self.outcomes) >= self.min_requests and failures / len(self.outcomes) >= self.failure_ratio:
+            self._open()
+
+    def _open(self) -> None:
+        self.opened_at = monotonic()
+        self.outcomes.clear()
+        self._set_state(BreakerState.OPEN)
+        logger.warning("Circuit breaker opened | provider={} | open_s={}", self.name, self.open_seconds)
@@ -0,0 +1,174 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+
+import orjson
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot.cache.redis import set_redis_value
+from bot.core.config import settings
+from bot.core.loader import redis_client
+from bot.knowledge.retrieval import question_terms
+from bot.services.metrics import conversation_memory_tokens
+from bot.services.prompt import ChatTurn
+from bot.utils.tokens import estimate_tokens
+
+CONVERSATION_NAMESPACE = "conversation"
+
+SUMMARY_HEADER = "Earlier in this conversation the user asked:\n"
+SUMMARY_QUESTION_CHARS = 160  # of an older question kept in the summary
+SUMMARY_SHARE = 0.3  # of the token ceiling, older summary entries are dropped beyond it
+LAST_EXCHANGE_TURNS = 2  # the latest question and answer are never folded into the summary
+
+FOLLOW_UP_MIN_TERMS = 2  # a question with fewer content terms leans on the conversation, e.g. "and in Spain?"
+# words that refer back to the conversation, or a question that continues the previous one
+FOLLOW_UP_RE = re.compile(
+    r"\b(?:it|its|this|these|those|they|them|also|too|else|same|instead|another|again)\b"
+    r"|^\W*(?:and|but|or|so|what about|how about|y|e|et|und|а|и)\b"
+    r"|\b(?:eso|esto|ese|esa|también|isso|isto|esse|essa|também|ça|cela|aussi|dies|diese|dieser|auch"
+    r"|это|этот|эта|тот|тоже|также)\b"
+    r"|这个|那个|它|还有|その|それ|あれ|그거|그것|이거|هذا|ذلك|أيضا",
+)
+
+
+def shorten(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else f"{text[: max_chars - 1].rstrip()}…"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut the end of a text until its estimate fits into ``max_tokens``."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # one token is left for the ellipsis
+    while text and (tokens := estimate_tokens(text)) >= max_tokens:
+        text = text[: min(len(text) - 1, int(len(text) * (max_tokens - 1) / tokens))]
+    return f"{text.rstrip()}…"
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether a question refers back to the conversation, e.g. "and in Spain?" or "how long does it last?".
+
+    Any other question is answered the same in every conversation, so it shares the answer caches.
+    """
+    text = question.casefold()
+    return bool(FOLLOW_UP_RE.search(text)) or len(question_terms(text)) < FOLLOW_UP_MIN_TERMS
+
+
+@dataclass(slots=True)
+class Conversation:
+    """Recent turns of a chat, with the questions of older turns rolled up into a short summary.
+
+    The summary is extractive: every question that leaves the verbatim window adds one shortened
+    line, the oldest lines are dropped first, so keeping it up to date costs no LLM calls.
+    """
+
+    turns: list[ChatTurn] = field(default_factory=list)
+    summary: list[str] = field(default_factory=list)  # older questions, oldest first
+    questions: int = 0  # asked so far, including the summarized ones
+
+    @property
+    def summary_tokens(self) -> int:
+        return (
+            estimate_tokens(SUMMARY_HEADER) + sum(estimate_tokens(line) for line in self.summary) if self.summary else 0
+        )
+
+    @property
+    def tokens(self) -> int:
+        return self.summary_tokens + sum(estimate_tokens(turn.text) for turn in self.turns)
+
+    def history(self) -> list[ChatTurn]:
+        """Turns to send before the question, oldest first."""
+        if not self.summary:
+            return list(self.turns)
+        summary = SUMMARY_HEADER + "\n".join(f"- {line}" for line in self.summary)
+        return [ChatTurn(role="user", text=summary), *self.turns]
+
+    def _fold_oldest_turn(self) -> None:
+        turn = self.turns.pop(0)
+        if turn.role == "user":
+            self.summary.append(shorten(turn.text, SUMMARY_QUESTION_CHARS))
+
+    def compact(self, max_turns: int, max_tokens: int) -> None:
+        while len(self.turns) > max_turns:
+            self._fold_oldest_turn()
+
+        while self.tokens > max_tokens:
+            if self.summary and (
+                self.summary_tokens > max_tokens * SUMMARY_SHARE or len(self.turns) <= LAST_EXCHANGE_TURNS
+            ):
+                self.summary.pop(0)
+            elif len(self.turns) > LAST_EXCHANGE_TURNS:
+                self._fold_oldest_turn()
+            else:
+                break
+
+    def remember(
+        self,
+        question: str,
+        answer: str,
+        max_turns: int = settings.MEMORY_TURNS,
+        max_tokens: int = settings.MEMORY_MAX_TOKENS,
+    ) -> None:
+        # the latest exchange always fits, a long answer is kept by its beginning
+        turn_tokens = (max_tokens - int(max_tokens * SUMMARY_SHARE)) // LAST_EXCHANGE_TURNS
+        self.turns.append(ChatTurn(role="user", text=truncate_to_tokens(question, turn_tokens)))
+        self.turns.append(ChatTurn(role="assistant", text=truncate_to_tokens(answer, turn_tokens)))
+        self.questions += 1
+        self.compact(max_turns, max_tokens)
+
+    def dumps(self) -> bytes:
+        return orjson.dumps(
+            {
+                "turns": [[turn.role, turn.text] for turn in self.turns],
+                "summary": self.summary,
+                "questions": self.questions,
+            },
+        )
+
+    @classmethod
+    def loads(cls, value: bytes | str) -> Conversation:
+        data = orjson.loads(value)
+        return cls(
+            turns=[ChatTurn(role=role, text=text) for role, text in data["turns"]],
+            summary=list(data["summary"]),
+            questions=int(data["questions"]),
+        )
+
+
+def build_conversation_key(chat_id: int) -> str:
+    return f"{CONVERSATION_NAMESPACE}:{chat_id}"
+
+
+async def load_conversation(chat_id: int) -> Conversation:
+    """The chat's conversation, an empty one when it expired, is disabled or can not be read."""
+    if not settings.MEMORY_ENABLED:
+        return Conversation()
+
+    try:
+        value = await redis_client.get(build_conversation_key(chat_id))
+        return Conversation() if value is None else Conversation.loads(value)
+    except (RedisError, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        logger.exception("Failed to load conversation, answering without it | chat_id={}", chat_id)
+        return Conversation()
+
+
+async def save_conversation(chat_id: int, conversation: Conversation) -> None:
+    """Store the conversation, its TTL starts over with every question."""
+    if not settings.MEMORY_ENABLED:
+        return
+
+    conversation_memory_tokens.observe(conversation.tokens)
+    try:
+        await set_redis_value(build_conversation_key(chat_id), conversation.dumps(), ttl=settings.MEMORY_TTL)
+    except RedisError:
+        logger.exception("Failed to save conversation | chat_id={}", chat_id)
+
+
+async def clear_conversation(chat_id: int) -> None:
+    try:
+        await redis_client.delete(build_conversation_key(chat_id))
+    except RedisError:
+        logger.exception("Failed to clear conversation | chat_id={}", chat_id)
@@ -1,49 +1,85 @@
 from __future__ import annotations
-import asyncio
+import dataclasses
 from functools import lru_cache
-from pathlib import Path
 from time import perf_counter
+from typing import TYPE_CHECKING, Any
 
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from loguru import logger
 
-from bot.core.config import DIR, settings
+from bot.core.config import settings
+from bot.knowledge.renderings import RENDERING_DESCRIPTIONS
+from bot.services.circuit_breaker import BreakerState, ErrorInfo
+from bot.services.llm import LLMProvider
+from bot.services.metrics import llm_time_to_first_token
+from bot.services.prompt import KNOWLEDGE_BASE_HEADER, build_prompt, get_token_budget
 
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
 
-class GeminiClient:
-    """Thin wrapper around Google Gemini 2.5 Flash-Lite for Q&A."""
+    from bot.core.config import LLMTier
+    from bot.services.prompt import ChatTurn, Prompt
+
+SLIM_PROMPT_AFTER_ATTEMPT = 2
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def get_usage(response: Any) -> tuple[int | None, int | None, int | None]:
+    """Prompt tokens, the part of them served from Gemini's implicit context cache and completion tokens."""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return None, None, None
+    return (
+        getattr(metadata, "prompt_token_count", None),
+        getattr(metadata, "cached_content_token_count", None),
+        getattr(metadata, "candidates_token_count", None),
+    )
+
+
+class GeminiClient(LLMProvider):
+    """Thin wrapper around Google Gemini for Q&A, 2.5 Flash-Lite unless a tier asks for another model."""
+
+    name = "gemini"
 
     def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite") -> None:
+        super().__init__()
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(
-            model_name,
-            generation_config={
-                "temperature": 0.3,
-                "top_p": 0.9,
-                "max_output_tokens": 1024,
-            },
-        )
+        self.model_name = model_name
+        self.generation_config = genai.GenerationConfig(temperature=0.3, top_p=0.9, max_output_tokens=1024)
+        self.models: dict[str, genai.GenerativeModel] = {}
         logger.debug("GeminiClient initialized | model={}", model_name)
 
-    @staticmethod
-    @lru_cache(maxsize=1)
-    def load_knowledge_base() -> str:
-        """Load the knowledge base from a JSON file."""
-        path = Path(DIR) / "knowledge_base.json"
-        try:
-            return path.read_text(encoding="utf-8")
-        except Exception:
-            return ""
-
-    async def answer(self, question: str, language_code: str) -> str:
-        """Generate an answer using the selected language and FAQ context."""
-        knowledge_base = self.load_knowledge_base()
-        # Constrain FAQ size to reduce server-side errors
-        # MAX_FAQ_CHARS = 8000
-        # if knowledge_base and len(knowledge_base) > MAX_FAQ_CHARS:
-        #     logger.debug("Truncating knowledge base from {} to {} chars", len(knowledge_base), MAX_FAQ_CHARS)
-        #     knowledge_base = knowledge_base[:MAX_FAQ_CHARS]
+    def get_model(self, tier: LLMTier | None) -> genai.GenerativeModel:
+        """Model of the tier with its output cap, reasoning effort is not supported by this SDK."""
+        model_name = self.get_model_name(tier)
+        max_output_tokens = tier.max_output_tokens if tier else self.generation_config.max_output_tokens
+        key = f"{model_name}:{max_output_tokens}"
+        if key not in self.models:
+            self.models[key] = genai.GenerativeModel(
+                model_name,
+                generation_config=dataclasses.replace(self.generation_config, max_output_tokens=max_output_tokens),
+            )
+        return self.models[key]
 
+    def build_content(
+        self,
+        question: str,
+        language_code: str,
+        budget: int | None = None,
+        model_name: str | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> tuple[list[dict[str, Any]], str, Prompt]:
+        """Prepare request content within the token budget, returns it together with the language label and prompt."""
         language = (language_code or "en").strip().lower()
         # Map Telegram codes to names as hint for the model
         lang_label = {
@@ -59,86 +95,188 @@ class GeminiClient:
             "ar": "Arabic",
         }.get(language, language)
 
+        # the cache friendly layout keeps the instructions identical for every language
+        language_rule = (
+            "Answer strictly in the language requested with the user question."
+            if settings.LLM_CACHE_FRIENDLY_PROMPT
+            else f"Answer strictly in the user's language: {lang_label}."
+        )
+        kb_format = RENDERING_DESCRIPTIONS[settings.KB_RENDERING]
         system_prompt = (
             "You are a helpful, technically skilled support manager for the eSIM store globustele.com. "
-            "Answer strictly in the user's language: {lang}. Be concise, accurate and practical. "
-            "Use the provided knowledge base in json format. If a policy or price is unknown, say that it's unclear and suggest contacting support."
-        ).format(lang=lang_label)
+            f"{language_rule} Be concise, accurate and practical. "
+            f"Use the provided knowledge base {kb_format}. "
+            "If a policy or price is unknown, say that it's unclear and suggest contacting support."
+        )
+
+        prompt = build_prompt(
+            model_name=model_name or self.model_name,
+            system=system_prompt,
+            question=f"User question (reply in {lang_label}):\n{question}",
+            query=question,
+            history=history,
+            budget=budget,
+        )
 
         # Gemini expects roles to be either "user" or "model".
         # We inject the instruction as a user message to avoid invalid role errors.
-        content = [
-            {"role": "user", "parts": [system_prompt]},
+        content: list[dict[str, Any]] = [
+            {"role": "user", "parts": [prompt.system]},
         ]
 
-        if knowledge_base:
-            content.append({"role": "user", "parts": [f"Knowledge base content:\n{knowledge_base}"]})
-
-        content.append({"role": "user", "parts": [f"User question (reply in {lang_label}):\n{question}"]})
-
-        # Retry strategy for transient 5xx issues
-        attempts = [0.0, 0.8, 1.6]
-        last_error: Exception | None = None
-        for attempt, delay in enumerate(attempts, start=1):
-            try:
-                start = perf_counter()
-                logger.info(
-                    "Gemini request \u2192 sending | attempt={} | lang={} | q_len={} | knowledge_base_len={}",
-                    attempt,
-                    lang_label,
-                    len(question or ""),
-                    len(knowledge_base or ""),
-                )
-                response = await self.model.generate_content_async(content)
-                elapsed_ms = int((perf_counter() - start) * 1000)
-
-                finish_reasons = []
-                safety_blocks = []
-                try:
-                    candidates = getattr(response, "candidates", None) or []
-                    for cand in candidates:
-                        fr = getattr(cand, "finish_reason", None)
-                        if fr:
-                            finish_reasons.append(str(fr))
-                        ratings = getattr(cand, "safety_ratings", None) or []
-                        for r in ratings:
-                            cat = getattr(r, "category", None)
-                            blk = getattr(r, "blocked", None)
-                            if blk:
-                                safety_blocks.append(str(cat))
-                    pf = getattr(response, "prompt_feedback", None)
-                    if pf and getattr(pf, "block_reason", None):
-                        safety_blocks.append(str(getattr(pf, "block_reason")))
-                except Exception as _e:
-                    logger.debug("Gemini response summarize failed: {}", _e)
-
-                text: str = (getattr(response, "text", "") or "").strip()
-                logger.info(
-                    "Gemini response \u2190 received | ms={} | text_len={} | finish_reasons={} | safety_blocks={}",
-                    elapsed_ms,
-                    len(text),
-                    finish_reasons or None,
-                    safety_blocks or None,
-                )
-                return text or ""
-            except Exception as e:
-                last_error = e
-                msg = str(e)
-                is_5xx = "InternalServerError" in msg or msg.startswith("500 ")
-                is_resource = "ResourceExhausted" in msg or "quota" in msg.lower()
-                logger.error("Gemini request failed | attempt={} | error={}", attempt, msg)
-
-                if attempt < len(attempts) and (is_5xx or is_resource):
-                    await asyncio.sleep(delay)
-                    # On retry, try slimmer prompt without FAQ for robustness
-                    if attempt == 2 and knowledge_base:
-                        logger.debug("Retrying without Knowledge base context to reduce payload")
-                        content = [c for c in content if "Knowledge base content" not in (c.get("parts", [""])[0] or "")]
+        if prompt.knowledge_base:
+            content.append({"role": "user", "parts": [f"{KNOWLEDGE_BASE_HEADER}{prompt.knowledge_base}"]})
+
+        content.extend(
+            {"role": "model" if turn.role == "assistant" else "user", "parts": [turn.text]} for turn in prompt.history
+        )
+
+        content.append({"role": "user", "parts": [prompt.question]})
+
+        return content, lang_label, prompt
+
+    async def request(
+        self,
+        question: str,
+        language_code: str,
+        attempt: int,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> str:
+        """Make a single generation request using the selected language, FAQ context and model tier."""
+        model_name = self.get_model_name(tier)
+        # On the last retries, try a slimmer prompt with only the most relevant knowledge base sections
+        budget = get_token_budget(model_name)
+        if attempt > SLIM_PROMPT_AFTER_ATTEMPT:
+            logger.debug("Retrying with half of the prompt token budget to reduce payload")
+            budget //= 2
+
+        content, lang_label, prompt = self.build_content(question, language_code, budget, model_name, history)
+
+        start = perf_counter()
+        logger.info(
+            "Gemini request \u2192 sending | attempt={} | model={} | lang={} | q_len={} | prompt_tokens={}",
+            attempt,
+            model_name,
+            lang_label,
+            len(question or ""),
+            prompt.tokens,
+        )
+        response = await self.get_model(tier).generate_content_async(content)
+        elapsed_ms = int((perf_counter() - start) * 1000)
+
+        finish_reasons = []
+        safety_blocks = []
+        try:
+            candidates = getattr(response, "candidates", None) or []
+            for cand in candidates:
+                fr = getattr(cand, "finish_reason", None)
+                if fr:
+                    finish_reasons.append(str(fr))
+                ratings = getattr(cand, "safety_ratings", None) or []
+                for r in ratings:
+                    cat = getattr(r, "category", None)
+                    blk = getattr(r, "blocked", None)
+                    if blk:
+                        safety_blocks.append(str(cat))
+            pf = getattr(response, "prompt_feedback", None)
+            if pf and getattr(pf, "block_reason", None):
+                safety_blocks.append(str(pf.block_reason))
+        except (AttributeError, TypeError, ValueError) as _e:
+            logger.debug("Gemini response summarize failed: {}", _e)
+
+        prompt_tokens, cached_tokens, completion_tokens = get_usage(response)
+        self.record_usage(prompt_tokens, cached_tokens, completion_tokens, tier)
+
+        text: str = (getattr(response, "text", "") or "").strip()
+        logger.info(
+            "Gemini response \u2190 received | ms={} | text_len={} | finish_reasons={} | safety_blocks={} | "
+            "prompt_tokens={} | cached_tokens={}",
+            elapsed_ms,
+            len(text),
+            finish_reasons or None,
+            safety_blocks or None,
+            prompt_tokens,
+            cached_tokens,
+        )
+        return text or ""
+
+    def classify_error(self, error: Exception) -> ErrorInfo:
+        if isinstance(error, RETRYABLE_ERRORS):
+            return ErrorInfo(reason=type(error).__name__, retryable=True)
+        return ErrorInfo(reason=type(error).__name__, retryable=False)
+
+    async def stream_answer(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> AsyncIterator[str]:
+        """Generate an answer like ``answer`` but yield text deltas as soon as the model produces them.
+
+        If the stream fails before the first token, the regular request with retries is used instead.
+        """
+        model_name = self.get_model_name(tier)
+        content, lang_label, prompt = self.build_content(
+            question, language_code, model_name=model_name, history=history
+        )
+
+        if not self.allow_request():
+            return
+        probe = self.breaker.state is BreakerState.HALF_OPEN
+
+        start = perf_counter()
+        logger.info(
+            "Gemini stream \u2192 sending | model={} | lang={} | q_len={} | prompt_tokens={}",
+            model_name,
+            lang_label,
+            len(question or ""),
+            prompt.tokens,
+        )
+
+        first_token_ms: int | None = None
+        text_len = 0
+        usage: tuple[int | None, int | None, int | None] = (None, None, None)
+        try:
+            response = await self.get_model(tier).generate_content_async(content, stream=True)
+            async for chunk in response:
+                # every chunk reports the usage so far, the last one has the totals
+                usage = get_usage(chunk)
+                delta = getattr(chunk, "text", "") or ""
+                if not delta:
                     continue
-                break
+                if first_token_ms is None:
+                    first_token_ms = int((perf_counter() - start) * 1000)
+                    llm_time_to_first_token.labels(provider=self.name).observe(first_token_ms / 1000)
+                text_len += len(delta)
+                yield delta
+        except Exception as e:
+            self.record_error(e)
+            if first_token_ms is not None:
+                raise
+            logger.error("Gemini stream failed before first token, falling back | error={}", e)
+            text = await self.answer(question=question, language_code=language_code, tier=tier, history=history)
+            if text:
+                yield text
+            return
+        except BaseException:
+            # closed by the reader or cancelled, the probe has no outcome then
+            if probe:
+                self.breaker.release_probe()
+            raise
 
-        logger.exception("Gemini request failed after retries: {}", last_error)
-        return ""
+        self.breaker.record_success()
+        prompt_tokens, cached_tokens, completion_tokens = usage
+        self.record_usage(prompt_tokens, cached_tokens, completion_tokens, tier)
+        logger.info(
+            "Gemini stream \u2190 finished | ttft_ms={} | ms={} | text_len={} | prompt_tokens={} | cached_tokens={}",
+            first_token_ms,
+            int((perf_counter() - start) * 1000),
+            text_len,
+            prompt_tokens,
+            cached_tokens,
+        )
 
 
 @lru_cache(maxsize=1)
@@ -146,7 +284,6 @@ def get_gemini_client() -> GeminiClient:
     """Get a singleton instance of the Gemini client."""
     api_key = settings.GEMINI_API_KEY or ""
     if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not configured")
+        msg = "GEMINI_API_KEY is not configured"
+        raise RuntimeError(msg)
     return GeminiClient(api_key=api_key)
-
-
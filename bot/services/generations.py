@@ -0,0 +1,73 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.services.metrics import superseded_answers
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine
+
+_T = TypeVar("_T")
+
+
+@dataclass(slots=True)
+class Generation:
+    """One answer being generated for a chat."""
+
+    chat_id: int
+    task: asyncio.Task[Any] | None = None
+    superseded: bool = False  # the chat asked a newer question, the result must not be sent
+
+
+class ChatGenerations:
+    """Tracks the answer in progress of every chat, a newer question supersedes the older one.
+
+    With the ``cancel`` policy the superseded generation is cancelled, which closes the upstream
+    stream and stops token billing. With ``discard`` it runs to the end, so the answer still lands
+    in the cache, but is not sent. ``keep`` answers every question, as before.
+    Generations are tracked per process, updates of one chat are expected on the same replica.
+    """
+
+    def __init__(self, policy: str = settings.SUPERSEDED_ANSWERS) -> None:
+        self.policy = policy
+        self.active: dict[int, Generation] = {}
+
+    def _supersede(self, generation: Generation) -> None:
+        generation.superseded = True
+        superseded_answers.labels(policy=self.policy).inc()
+        logger.info("Answer superseded by a newer question | chat_id={} | policy={}", generation.chat_id, self.policy)
+
+        if self.policy == "cancel" and generation.task is not None:
+            generation.task.cancel()
+
+    async def run(self, chat_id: int, func: Callable[[Generation], Coroutine[Any, Any, _T]]) -> _T | None:
+        """Generate the chat's answer with ``func``, ``None`` when a newer question superseded it."""
+        generation = Generation(chat_id=chat_id)
+        if self.policy == "keep":
+            return await func(generation)
+
+        previous = self.active.get(chat_id)
+        self.active[chat_id] = generation
+        if previous is not None and not previous.superseded:
+            self._supersede(previous)
+
+        # a task of its own, so that a newer question cancels the generation and not the whole update
+        generation.task = asyncio.create_task(func(generation))
+        try:
+            result = await generation.task
+        except asyncio.CancelledError:
+            if not (generation.superseded and generation.task.cancelled()):
+                raise
+            return None
+        finally:
+            if self.active.get(chat_id) is generation:
+                del self.active[chat_id]
+
+        return None if generation.superseded else result
+
+
+chat_generations = ChatGenerations()
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import asyncio
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.services.circuit_breaker import BreakerState, CircuitBreaker, ErrorInfo, RetryPolicy
+from bot.services.metrics import (
+    llm_breaker_rejections,
+    llm_prompt_cache_ratio,
+    llm_prompt_cached_tokens,
+    llm_prompt_input_tokens,
+    llm_retries,
+    llm_tier_tokens,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
+
+    from bot.core.config import LLMTier
+    from bot.services.prompt import ChatTurn
+
+
+class LLMProvider(ABC):
+    """Common interface of the LLM clients used to answer user questions.
+
+    ``answer`` wraps single ``request`` attempts with the provider's circuit breaker
+    and retry policy, so an outage fails fast instead of retrying every request.
+    """
+
+    name: str
+    model_name: str  # used when no tier is selected or the tier has no model for this provider
+
+    def __init__(self) -> None:
+        self.breaker = CircuitBreaker(self.name)
+        self.retry_policy = RetryPolicy()
+
+    @abstractmethod
+    async def request(
+        self,
+        question: str,
+        language_code: str,
+        attempt: int,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> str:
+        """Make a single request to the provider, errors are raised as is."""
+
+    @abstractmethod
+    def classify_error(self, error: Exception) -> ErrorInfo:
+        """Map an SDK exception to a retry decision."""
+
+    @abstractmethod
+    def stream_answer(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> AsyncIterator[str]:
+        """Generate an answer as a stream of text deltas."""
+
+    def get_model_name(self, tier: LLMTier | None) -> str:
+        return tier.models.get(self.name, self.model_name) if tier else self.model_name
+
+    def allow_request(self) -> bool:
+        """Whether the circuit breaker lets a request through, rejections are counted."""
+        if self.breaker.allow_request():
+            return True
+        llm_breaker_rejections.labels(provider=self.name).inc()
+        logger.warning("{} request rejected, circuit breaker is {}", self.name, self.breaker.state.name)
+        return False
+
+    def record_error(self, error: Exception) -> ErrorInfo:
+        info = self.classify_error(error)
+        if info.retryable:
+            self.breaker.record_failure()
+        else:
+            # the provider is reachable, the request itself is wrong
+            self.breaker.record_success()
+        return info
+
+    def record_usage(
+        self,
+        prompt_tokens: int | None,
+        cached_tokens: int | None,
+        completion_tokens: int | None = None,
+        tier: LLMTier | None = None,
+    ) -> None:
+        """Export tokens reported by the provider together with its prefix cache hits."""
+        if tier is not None:
+            llm_tier_tokens.labels(tier=tier.name, kind="prompt").inc(prompt_tokens or 0)
+            llm_tier_tokens.labels(tier=tier.name, kind="completion").inc(completion_tokens or 0)
+        if not prompt_tokens:
+            return
+        cached_tokens = cached_tokens or 0
+        llm_prompt_input_tokens.labels(provider=self.name).inc(prompt_tokens)
+        llm_prompt_cached_tokens.labels(provider=self.name).inc(cached_tokens)
+        llm_prompt_cache_ratio.labels(provider=self.name).observe(cached_tokens / prompt_tokens)
+
+    async def answer(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> str:
+        """Generate a complete answer, an empty string means the provider failed.
+
+        ``history`` holds the earlier turns of the conversation, oldest first.
+        """
+        if not self.allow_request():
+            return ""
+
+        probe = self.breaker.state is BreakerState.HALF_OPEN
+        attempt = 1
+        while True:
+            try:
+                text = await self.request(
+                    question=question,
+                    language_code=language_code,
+                    attempt=attempt,
+                    tier=tier,
+                    history=history,
+                )
+            except Exception as e:  # noqa: BLE001
+                info = self.record_error(e)
+                logger.error(
+                    "{} request failed | attempt={} | reason={} | error={}", self.name, attempt, info.reason, e
+                )
+
+                delay = self.retry_policy.get_delay(attempt, info)
+                if delay is None:
+                    break
+                if not self.breaker.allow_request():
+                    llm_breaker_rejections.labels(provider=self.name).inc()
+                    break
+
+                llm_retries.labels(provider=self.name, reason=info.reason).inc()
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # cancelled, e.g. a hedge that lost, the probe has no outcome then
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            return text
+
+        logger.error("{} request failed after {} attempt(s)", self.name, attempt)
+        return ""
@@ -0,0 +1,189 @@
+import prometheus_client
+
+METRICS_PREFIX = "tgbot"
+
+answer_cache_requests = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_answer_cache_requests",
+    documentation="Total answer cache lookups by result (hit or miss).",
+    labelnames=["result"],
+)
+
+similar_answer_requests = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_similar_answer_requests",
+    documentation="Total near-duplicate question lookups by result (hit, miss or rejected candidate).",
+    labelnames=["result"],
+)
+
+single_flight_calls = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_single_flight_calls",
+    documentation="Total single-flight calls by role (leader, local_follower or remote_follower).",
+    labelnames=["role"],
+)
+
+llm_request_duration = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_llm_request_duration",
+    documentation="Histogram of LLM request latency by provider and status (in seconds).",
+    labelnames=["provider", "status"],
+    unit="seconds",
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60),
+)
+
+llm_hedged_requests = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_hedged_requests",
+    documentation="Total hedged LLM requests by the provider they were sent to.",
+    labelnames=["provider"],
+)
+
+llm_wins = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_wins",
+    documentation="Total answers by the provider that delivered them.",
+    labelnames=["provider"],
+)
+
+llm_breaker_state = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_llm_breaker_state",
+    documentation="Circuit breaker state by provider (0 closed, 1 half-open, 2 open).",
+    labelnames=["provider"],
+)
+
+llm_breaker_rejections = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_breaker_rejections",
+    documentation="Total LLM requests rejected by an open circuit breaker by provider.",
+    labelnames=["provider"],
+)
+
+llm_retries = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_retries",
+    documentation="Total LLM request retries by provider and error reason.",
+    labelnames=["provider", "reason"],
+)
+
+llm_inflight = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_llm_inflight",
+    documentation="Gauge of LLM requests currently holding a concurrency slot.",
+)
+
+llm_queue_depth = prometheus_client.Gauge(
+    name=f"{METRICS_PREFIX}_llm_queue_depth",
+    documentation="Gauge of LLM requests waiting for a concurrency slot.",
+)
+
+llm_queue_wait = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_llm_queue_wait",
+    documentation="Histogram of time spent waiting for an LLM concurrency slot (in seconds).",
+    unit="seconds",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+llm_queue_rejections = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_queue_rejections",
+    documentation="Total LLM requests rejected by the admission queue by reason (queue_full or timeout).",
+    labelnames=["reason"],
+)
+
+llm_prompt_tokens = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_llm_prompt_tokens",
+    documentation="Histogram of estimated prompt tokens sent to the model.",
+    labelnames=["model"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+
+llm_prompt_input_tokens = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_prompt_input_tokens",
+    documentation="Total prompt tokens billed by the provider.",
+    labelnames=["provider"],
+)
+
+llm_prompt_cached_tokens = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_prompt_cached_tokens",
+    documentation="Total prompt tokens served from the provider's prefix cache, divide by input tokens for the ratio.",
+    labelnames=["provider"],
+)
+
+llm_prompt_cache_ratio = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_llm_prompt_cache_ratio",
+    documentation="Histogram of the share of prompt tokens served from the provider's prefix cache per request.",
+    labelnames=["provider"],
+    buckets=(0, 0.1, 0.25, 0.5, 0.75, 0.9, 1),
+)
+
+llm_time_to_first_token = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_llm_time_to_first_token",
+    documentation="Histogram of time until the first streamed token (in seconds).",
+    labelnames=["provider"],
+    unit="seconds",
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 21),
+)
+
+intent_requests = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_intent_requests",
+    documentation="Total questions checked against local intents by the matched intent, none means passed to the LLM.",
+    labelnames=["intent"],
+)
+
+knowledge_base_reloads = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_knowledge_base_reloads",
+    documentation="Total knowledge base versions picked up while running, by where they came from.",
+    labelnames=["source", "result"],
+)
+
+llm_tier_requests = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_tier_requests",
+    documentation="Total questions routed to each model tier.",
+    labelnames=["tier"],
+)
+
+llm_tier_duration = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_llm_tier_duration",
+    documentation="Histogram of the time to a complete answer per model tier (in seconds).",
+    labelnames=["tier"],
+    unit="seconds",
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+
+llm_tier_tokens = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_llm_tier_tokens",
+    documentation="Total tokens billed by the providers per model tier, prompt or completion.",
+    labelnames=["tier", "kind"],
+)
+
+superseded_answers = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_superseded_answers",
+    documentation="Total answers in progress superseded by a newer question from the same chat, by policy.",
+    labelnames=["policy"],
+)
+
+debounced_messages = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_debounced_messages",
+    documentation="Total messages merged into an earlier message of the same chat instead of being answered alone.",
+)
+
+conversation_memory_tokens = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_conversation_memory_tokens",
+    documentation="Histogram of the estimated tokens of a stored conversation, turns and summary.",
+    buckets=(50, 100, 200, 400, 600, 800, 1000, 1200, 1600),
+)
+
+answer_bank_requests = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_answer_bank_requests",
+    documentation="Total questions checked against the graded answer bank by result, hit, near_miss or miss.",
+    labelnames=["result"],
+)
+
+answer_bank_similarity = prometheus_client.Histogram(
+    name=f"{METRICS_PREFIX}_answer_bank_similarity",
+    documentation="Histogram of the similarity of a question to the closest question of the answer bank.",
+    buckets=(0.2, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1),
+)
+
+cache_requests = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_cache_requests",
+    documentation="Total lookups of @cached functions by layer, local (in-process) or redis, and result.",
+    labelnames=["layer", "result"],
+)
+
+cache_recomputations = prometheus_client.Counter(
+    name=f"{METRICS_PREFIX}_cache_recomputations",
+    documentation="Total calls of @cached functions by reason: a miss, a stale value or an early (XFetch) refresh.",
+    labelnames=["reason"],
+)
@@ -1,38 +1,76 @@
 from __future__ import annotations
-import asyncio
 from functools import lru_cache
-from pathlib import Path
+from http import HTTPStatus
 from time import perf_counter
+from typing import TYPE_CHECKING, Any
 
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletionMessageParam
+import openai
 from loguru import logger
+from openai import AsyncOpenAI
+from openai.types.chat import (
+    ChatCompletionAssistantMessageParam,
+    ChatCompletionMessageParam,
+    ChatCompletionUserMessageParam,
+)
+
+from bot.core.config import settings
+from bot.knowledge.renderings import RENDERING_DESCRIPTIONS
+from bot.services.circuit_breaker import BreakerState, ErrorInfo, parse_retry_after
+from bot.services.llm import LLMProvider
+from bot.services.metrics import llm_time_to_first_token
+from bot.services.prompt import KNOWLEDGE_BASE_HEADER, build_prompt, get_token_budget
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
+
+    from openai.types import CompletionUsage
+
+    from bot.core.config import LLMTier
+    from bot.services.prompt import ChatTurn, Prompt
+
+SLIM_PROMPT_AFTER_ATTEMPT = 2
+RETRYABLE_STATUSES = frozenset({HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.CONFLICT, HTTPStatus.TOO_MANY_REQUESTS})
+
+
+def get_usage(usage: CompletionUsage | None) -> tuple[int | None, int | None, int | None]:
+    """Prompt tokens, the part of them served from OpenAI's prefix cache and completion tokens."""
+    if usage is None:
+        return None, None, None
+    details = usage.prompt_tokens_details
+    return usage.prompt_tokens, details.cached_tokens if details else None, usage.completion_tokens
 
-from bot.core.config import DIR, settings
 
+def get_tier_options(tier: LLMTier | None) -> dict[str, Any]:
+    """Output cap and reasoning effort of the tier, the API defaults without one."""
+    if tier is None:
+        return {}
+    options: dict[str, Any] = {"max_completion_tokens": tier.max_output_tokens}
+    if tier.reasoning_effort:
+        options["reasoning_effort"] = tier.reasoning_effort
+    return options
 
-class OpenAIClient:
+
+class OpenAIClient(LLMProvider):
     """Thin wrapper around OpenAI API for Q&A."""
 
+    name = "openai"
+
     def __init__(self, api_key: str, model_name: str = "gpt-5-nano") -> None:
-        self.client = AsyncOpenAI(api_key=api_key)
+        super().__init__()
+        # retries are driven by our own retry policy and circuit breaker
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
         self.model_name = model_name
         logger.debug("OpenAIClient initialized | model={}", model_name)
 
-    @staticmethod
-    @lru_cache(maxsize=1)
-    def load_knowledge_base() -> str:
-        """Load the knowledge base from a JSON file."""
-        path = Path(DIR) / "knowledge_base.json"
-        try:
-            return path.read_text(encoding="utf-8")
-        except Exception:
-            return ""
-
-    async def answer(self, question: str, language_code: str) -> str:
-        """Generate an answer using the selected language and FAQ context."""
-        knowledge_base = self.load_knowledge_base()
-
+    def build_messages(
+        self,
+        question: str,
+        language_code: str,
+        budget: int | None = None,
+        model_name: str | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> tuple[list[ChatCompletionMessageParam], str, Prompt]:
+        """Prepare chat messages within the token budget, returns them together with the language label and prompt."""
         language = (language_code or "en").strip().lower()
         # Map Telegram codes to names as hint for the model
         lang_label = {
@@ -48,75 +86,198 @@ class OpenAIClient:
             "ar": "Arabic",
         }.get(language, language)
 
+        # the cache friendly layout keeps the instructions identical for every language
+        language_rule = (
+            "Answer strictly in the language requested with the user question."
+            if settings.LLM_CACHE_FRIENDLY_PROMPT
+            else f"Answer strictly in the user's language: {lang_label}."
+        )
+        kb_format = RENDERING_DESCRIPTIONS[settings.KB_RENDERING]
         system_prompt = (
             "You are a helpful, technically skilled support manager for the eSIM store globustele.com. "
-            "Answer strictly in the user's language: {lang}. Be concise, accurate and practical. "
-            "Use the provided knowledge base in json format. If a policy or price is unknown, say that it's unclear and suggest contacting support. "
-            "IMPORTANT: Do not use any markdown or HTML formatting in your response. Provide the answer as plain text only."
-        ).format(lang=lang_label)
+            f"{language_rule} Be concise, accurate and practical. "
+            f"Use the provided knowledge base {kb_format}. "
+            "If a policy or price is unknown, say that it's unclear and suggest contacting support. "
+            "IMPORTANT: Do not use any markdown or HTML formatting in your response. "
+            "Provide the answer as plain text only."
+        )
+
+        prompt = build_prompt(
+            model_name=model_name or self.model_name,
+            system=system_prompt,
+            question=f"User question (reply in {lang_label}):\n{question}",
+            query=question,
+            history=history,
+            budget=budget,
+        )
 
         # Prepare messages for OpenAI
         messages: list[ChatCompletionMessageParam] = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": prompt.system},
         ]
 
-        if knowledge_base:
-            messages.append({"role": "user", "content": f"Knowledge base content:\n{knowledge_base}"})
-
-        messages.append({"role": "user", "content": f"User question (reply in {lang_label}):\n{question}"})
-
-        # Retry strategy for transient issues
-        attempts = [0.0, 0.8, 1.6]
-        last_error: Exception | None = None
-        for attempt, delay in enumerate(attempts, start=1):
-            try:
-                start = perf_counter()
-                logger.info(
-                    "OpenAI request \u2192 sending | attempt={} | lang={} | q_len={} | knowledge_base_len={}",
-                    attempt,
-                    lang_label,
-                    len(question or ""),
-                    len(knowledge_base or ""),
-                )
-
-                response = await self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    # max_completion_tokens=1024,
-                )
-
-                elapsed_ms = int((perf_counter() - start) * 1000)
-
-                finish_reason = response.choices[0].finish_reason if response.choices else None
-
-                text: str = response.choices[0].message.content or "" if response.choices else ""
-                text = text.strip()
-
-                logger.info(
-                    "OpenAI response \u2190 received | ms={} | text_len={} | finish_reason={}",
-                    elapsed_ms,
-                    len(text),
-                    finish_reason,
-                )
-                return text or ""
-            except Exception as e:
-                last_error = e
-                msg = str(e)
-                is_5xx = "500" in msg or "InternalServerError" in msg
-                is_resource = "RateLimitError" in msg or "quota" in msg.lower()
-                logger.error("OpenAI request failed | attempt={} | error={}", attempt, msg)
-
-                if attempt < len(attempts) and (is_5xx or is_resource):
-                    await asyncio.sleep(delay)
-                    # On retry, try slimmer prompt without FAQ for robustness
-                    if attempt == 2 and knowledge_base:
-                        logger.debug("Retrying without Knowledge base context to reduce payload")
-                        messages = [msg for msg in messages if "Knowledge base content" not in (msg.get("content") or "")]
-                    continue
-                break
-
-        logger.exception("OpenAI request failed after retries: {}", last_error)
-        return ""
+        if prompt.knowledge_base:
+            messages.append({"role": "user", "content": f"{KNOWLEDGE_BASE_HEADER}{prompt.knowledge_base}"})
+
+        for turn in prompt.history:
+            if turn.role == "assistant":
+                messages.append(ChatCompletionAssistantMessageParam(role="assistant", content=turn.text))
+            else:
+                messages.append(ChatCompletionUserMessageParam(role="user", content=turn.text))
+
+        messages.append({"role": "user", "content": prompt.question})
+
+        return messages, lang_label, prompt
+
+    async def request(
+        self,
+        question: str,
+        language_code: str,
+        attempt: int,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> str:
+        """Make a single chat completion request using the selected language, FAQ context and model tier."""
+        model_name = self.get_model_name(tier)
+        # On the last retries, try a slimmer prompt with only the most relevant knowledge base sections
+        budget = get_token_budget(model_name)
+        if attempt > SLIM_PROMPT_AFTER_ATTEMPT:
+            logger.debug("Retrying with half of the prompt token budget to reduce payload")
+            budget //= 2
+
+        messages, lang_label, prompt = self.build_messages(question, language_code, budget, model_name, history)
+
+        start = perf_counter()
+        logger.info(
+            "OpenAI request \u2192 sending | attempt={} | model={} | lang={} | q_len={} | prompt_tokens={}",
+            attempt,
+            model_name,
+            lang_label,
+            len(question or ""),
+            prompt.tokens,
+        )
+
+        response = await self.client.chat.completions.create(
+            model=model_name,
+            messages=messages,
+            **get_tier_options(tier),
+        )
+
+        elapsed_ms = int((perf_counter() - start) * 1000)
+
+        finish_reason = response.choices[0].finish_reason if response.choices else None
+        prompt_tokens, cached_tokens, completion_tokens = get_usage(response.usage)
+        self.record_usage(prompt_tokens, cached_tokens, completion_tokens, tier)
+
+        text: str = response.choices[0].message.content or "" if response.choices else ""
+        text = text.strip()
+
+        logger.info(
+            "OpenAI response \u2190 received | ms={} | text_len={} | finish_reason={} | prompt_tokens={} "
+            "| cached_tokens={}",
+            elapsed_ms,
+            len(text),
+            finish_reason,
+            prompt_tokens,
+            cached_tokens,
+        )
+        return text or ""
+
+    def classify_error(self, error: Exception) -> ErrorInfo:
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+            return ErrorInfo(reason="connection", retryable=True)
+
+        if isinstance(error, openai.APIStatusError):
+            retry_after = parse_retry_after(error.response.headers)
+            if isinstance(error, openai.RateLimitError):
+                # an exhausted quota does not recover by retrying
+                if error.code == "insufficient_quota":
+                    return ErrorInfo(reason="quota", retryable=False)
+                return ErrorInfo(reason="rate_limit", retryable=True, retry_after=retry_after)
+            if error.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR or error.status_code in RETRYABLE_STATUSES:
+                return ErrorInfo(reason=f"http_{error.status_code}", retryable=True, retry_after=retry_after)
+            return ErrorInfo(reason=f"http_{error.status_code}", retryable=False)
+
+        return ErrorInfo(reason=type(error).__name__, retryable=False)
+
+    async def stream_answer(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> AsyncIterator[str]:
+        """Generate an answer like ``answer`` but yield text deltas as soon as the model produces them.
+
+        If the stream fails before the first token, the regular request with retries is used instead.
+        """
+        model_name = self.get_model_name(tier)
+        messages, lang_label, prompt = self.build_messages(
+            question, language_code, model_name=model_name, history=history
+        )
+
+        if not self.allow_request():
+            return
+        probe = self.breaker.state is BreakerState.HALF_OPEN
+
+        start = perf_counter()
+        logger.info(
+            "OpenAI stream \u2192 sending | model={} | lang={} | q_len={} | prompt_tokens={}",
+            model_name,
+            lang_label,
+            len(question or ""),
+            prompt.tokens,
+        )
+
+        first_token_ms: int | None = None
+        text_len = 0
+        usage: CompletionUsage | None = None
+        try:
+            stream = await self.client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **get_tier_options(tier),
+            )
+            async with stream:
+                async for chunk in stream:
+                    # usage arrives in the last chunk, which has no choices
+                    usage = chunk.usage or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = int((perf_counter() - start) * 1000)
+                        llm_time_to_first_token.labels(provider=self.name).observe(first_token_ms / 1000)
+                    text_len += len(delta)
+                    yield delta
+        except Exception as e:
+            self.record_error(e)
+            if first_token_ms is not None:
+                raise
+            logger.error("OpenAI stream failed before first token, falling back | error={}", e)
+            text = await self.answer(question=question, language_code=language_code, tier=tier, history=history)
+            if text:
+                yield text
+            return
+        except BaseException:
+            # closed by the reader or cancelled, the probe has no outcome then
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+        self.breaker.record_success()
+        prompt_tokens, cached_tokens, completion_tokens = get_usage(usage)
+        self.record_usage(prompt_tokens, cached_tokens, completion_tokens, tier)
+        logger.info(
+            "OpenAI stream \u2190 finished | ttft_ms={} | ms={} | text_len={} | prompt_tokens={} | cached_tokens={}",
+            first_token_ms,
+            int((perf_counter() - start) * 1000),
+            text_len,
+            prompt_tokens,
+            cached_tokens,
+        )
 
 
 @lru_cache(maxsize=1)
@@ -124,5 +285,6 @@ def get_openai_client() -> OpenAIClient:
     """Get a singleton instance of the OpenAI client."""
     api_key = settings.OPENAI_API_KEY or ""
     if not api_key:
-        raise RuntimeError("OPENAI_API_KEY is not configured")
+        msg = "OPENAI_API_KEY is not configured"
+        raise RuntimeError(msg)
     return OpenAIClient(api_key=api_key)
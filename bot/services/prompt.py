@@ -0,0 +1,111 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.knowledge.retrieval import get_knowledge_context
+from bot.services.metrics import llm_prompt_tokens
+from bot.utils.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators around every message
+HISTORY_SHARE = 0.25  # of the free budget, the rest is left to the knowledge base
+KNOWLEDGE_BASE_HEADER = "Knowledge base content:\n"
+
+
+@dataclass(frozen=True, slots=True)
+class ChatTurn:
+    role: str  # "user" or "assistant"
+    text: str
+
+
+@dataclass(frozen=True, slots=True)
+class Prompt:
+    system: str
+    knowledge_base: str  # empty when nothing fits or nothing is relevant
+    history: tuple[ChatTurn, ...]
+    question: str
+    tokens: int
+    budget: int
+
+
+def get_token_budget(model_name: str) -> int:
+    return settings.LLM_PROMPT_TOKEN_BUDGETS.get(model_name, settings.LLM_PROMPT_TOKEN_BUDGET)
+
+
+def _message_tokens(text: str) -> int:
+    return estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+
+def fit_history(history: Sequence[ChatTurn], max_tokens: int) -> tuple[list[ChatTurn], int]:
+    """Keep the most recent turns that fit into ``max_tokens``, returns them with their token count."""
+    kept: list[ChatTurn] = []
+    used = 0
+    for turn in reversed(history):
+        cost = _message_tokens(turn.text)
+        if used + cost > max_tokens:
+            break
+        kept.append(turn)
+        used += cost
+
+    kept.reverse()
+    return kept, used
+
+
+def build_prompt(  # noqa: PLR0913
+    model_name: str,
+    system: str,
+    question: str,
+    query: str,
+    history: Sequence[ChatTurn] = (),
+    budget: int | None = None,
+) -> Prompt:
+    """Assemble a prompt that fits the model's token budget.
+
+    Instructions and the question are always sent. Recent history gets a share of
+    what is left, the knowledge base is filled with the sections most relevant to
+    ``query`` in the remaining space, instead of being sent or dropped as a whole.
+    With ``LLM_PREFER_FULL_KB`` the full knowledge base is sent whenever it fits, which trades
+    the smaller retrieved context for a prefix the provider can serve from its cache.
+    """
+    budget = budget or get_token_budget(model_name)
+    fixed = _message_tokens(system) + _message_tokens(question)
+    if fixed > budget:
+        logger.warning("Prompt instructions and question exceed the budget | model={} | tokens={}", model_name, fixed)
+
+    free = max(0, budget - fixed)
+    turns, history_tokens = fit_history(history, int(free * HISTORY_SHARE))
+
+    knowledge_budget = free - history_tokens - _message_tokens(KNOWLEDGE_BASE_HEADER)
+    knowledge_budget = max(0, knowledge_budget)
+    retrieval = get_knowledge_context(query, max_tokens=knowledge_budget, prefer_full=settings.LLM_PREFER_FULL_KB)
+    knowledge_tokens = retrieval.tokens + _message_tokens(KNOWLEDGE_BASE_HEADER) if retrieval.context else 0
+
+    tokens = fixed + history_tokens + knowledge_tokens
+    llm_prompt_tokens.labels(model=model_name).observe(tokens)
+    logger.info(
+        "Prompt assembled | model={} | tokens={} | budget={} | kb_tokens={} | kb_full={} | sections={} | "
+        "dropped_sections={} | history_turns={}/{}",
+        model_name,
+        tokens,
+        budget,
+        knowledge_tokens,
+        bool(retrieval.context) and not retrieval.section_ids,
+        len(retrieval.section_ids),
+        retrieval.dropped,
+        len(turns),
+        len(history),
+    )
+
+    return Prompt(
+        system=system,
+        knowledge_base=retrieval.context,
+        history=tuple(turns),
+        question=question,
+        tokens=tokens,
+        budget=budget,
+    )
@@ -0,0 +1,313 @@
+from __future__ import annotations
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.services.gemini import get_gemini_client
+from bot.services.metrics import llm_hedged_requests, llm_request_duration, llm_tier_duration, llm_wins
+from bot.services.openai import get_openai_client
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
+
+    from bot.core.config import LLMTier
+    from bot.services.llm import LLMProvider
+    from bot.services.prompt import ChatTurn
+
+LATENCY_WINDOW = 200  # latest successful requests kept per provider
+LATENCY_MIN_SAMPLES = 20  # below it the configured hedge delay is used
+
+
+class LatencyTracker:
+    """Rolling window of request latencies of a single provider."""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+@dataclass(slots=True)
+class ProviderStream:
+    """An answer stream of one provider, pumped into a queue by its own task so it can be raced and abandoned."""
+
+    provider: LLMProvider
+    deltas: asyncio.Queue[str | None]
+    task: asyncio.Task[None]
+    started: float
+
+
+class LLMRouter:
+    """Routes questions across LLM providers and hedges slow requests.
+
+    The primary provider is asked first; if it has not answered within its p95
+    latency (or fails), the next provider is asked as well. Whichever answer
+    arrives first wins and the other request is cancelled. Streams are hedged the
+    same way on the time to the first token. Nothing is waited for longer than
+    ``timeout`` in total.
+    """
+
+    def __init__(
+        self,
+        providers: list[LLMProvider],
+        hedge_delay: float = settings.LLM_HEDGE_DELAY,
+        hedging: bool = settings.LLM_HEDGING_ENABLED,
+        timeout: float = settings.LLM_ROUTER_TIMEOUT,
+    ) -> None:
+        if not providers:
+            msg = "At least one LLM provider must be configured"
+            raise RuntimeError(msg)
+
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.hedging = hedging
+        self.timeout = timeout
+        self.latencies = {provider.name: LatencyTracker() for provider in providers}
+        self.first_token_latencies = {provider.name: LatencyTracker() for provider in providers}
+
+    def get_hedge_delay(self, provider: LLMProvider, first_token: bool = False) -> float:
+        tracker = (self.first_token_latencies if first_token else self.latencies)[provider.name]
+        if len(tracker) < LATENCY_MIN_SAMPLES:
+            return self.hedge_delay
+        return tracker.percentile(95) or self.hedge_delay
+
+    def get_wait_timeout(self, deadline: float, hedge_delay: float | None) -> float:
+        """Time to wait for the next event: the hedge delay while a fallback is left, never past the deadline."""
+        remaining = max(0.0, deadline - perf_counter())
+        return remaining if hedge_delay is None else min(hedge_delay, remaining)
+
+    async def _timed_answer(
+        self,
+        provider: LLMProvider,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None,
+        history: Sequence[ChatTurn],
+    ) -> str:
+        start = perf_counter()
+        text = await provider.answer(question=question, language_code=language_code, tier=tier, history=history)
+        elapsed = perf_counter() - start
+
+        llm_request_duration.labels(provider=provider.name, status="ok" if text else "error").observe(elapsed)
+        if text:
+            self.latencies[provider.name].observe(elapsed)
+        return text
+
+    async def answer(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> str:
+        start = perf_counter()
+        text = await self._answer(question, language_code, tier, history)
+        if text and tier is not None:
+            llm_tier_duration.labels(tier=tier.name).observe(perf_counter() - start)
+        return text
+
+    async def _answer(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None,
+        history: Sequence[ChatTurn],
+    ) -> str:
+        primary, *fallbacks = self.providers
+        pending: dict[asyncio.Task[str], LLMProvider] = {
+            asyncio.create_task(self._timed_answer(primary, question, language_code, tier, history)): primary,
+        }
+        deadline = perf_counter() + self.timeout
+
+        try:
+            while pending:
+                hedge_delay = self.get_hedge_delay(primary) if self.hedging and fallbacks else None
+                timeout = self.get_wait_timeout(deadline, hedge_delay)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if error := task.exception():
+                        logger.error("LLM provider failed | provider={} | error={}", provider.name, error)
+                        continue
+                    text = task.result()
+                    if text:
+                        llm_wins.labels(provider=provider.name).inc()
+                        return text
+                    logger.warning("LLM provider returned no answer | provider={}", provider.name)
+
+                if perf_counter() >= deadline:
+                    logger.error("LLM providers timed out | providers={} | after_s={}", len(pending), self.timeout)
+                    break
+                if not fallbacks:
+                    continue
+
+                # the primary is slow or failed: ask the next provider too
+                provider = fallbacks.pop(0)
+                if not done:
+                    llm_hedged_requests.labels(provider=provider.name).inc()
+                    logger.info("Hedging LLM request | provider={} | after_s={:.2f}", provider.name, timeout)
+                task = asyncio.create_task(self._timed_answer(provider, question, language_code, tier, history))
+                pending[task] = provider
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return ""
+
+    def _open_stream(
+        self,
+        provider: LLMProvider,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None,
+        history: Sequence[ChatTurn],
+    ) -> ProviderStream:
+        deltas: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def pump() -> None:
+            try:
+                async for delta in provider.stream_answer(
+                    question=question,
+                    language_code=language_code,
+                    tier=tier,
+                    history=history,
+                ):
+                    deltas.put_nowait(delta)
+            finally:
+                deltas.put_nowait(None)
+
+        return ProviderStream(provider, deltas, asyncio.create_task(pump()), perf_counter())
+
+    async def _first_stream(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None,
+        history: Sequence[ChatTurn],
+    ) -> tuple[ProviderStream, str] | None:
+        """Open provider streams until one yields text, the losing streams are closed.
+
+        A primary slower than its p95 time to the first token gets the next provider's stream as a hedge.
+        """
+        primary, *fallbacks = self.providers
+        waiting: dict[asyncio.Task[str | None], ProviderStream] = {}
+
+        def open_stream(provider: LLMProvider) -> None:
+            stream = self._open_stream(provider, question, language_code, tier, history)
+            waiting[asyncio.create_task(stream.deltas.get())] = stream
+
+        open_stream(primary)
+        deadline = perf_counter() + self.timeout
+        try:
+            while waiting:
+                hedge_delay = self.get_hedge_delay(primary, first_token=True) if self.hedging and fallbacks else None
+                timeout = self.get_wait_timeout(deadline, hedge_delay)
+                done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for first in done:
+                    stream = waiting.pop(first)
+                    if (delta := first.result()) is not None:
+                        self.first_token_latencies[stream.provider.name].observe(perf_counter() - stream.started)
+                        return stream, delta
+                    await self._discard_stream(stream)
+
+                if perf_counter() >= deadline:
+                    logger.error("LLM streams timed out | providers={} | after_s={}", len(waiting), self.timeout)
+                    break
+                if not fallbacks:
+                    continue
+
+                # no first token from the primary yet, or it failed: open the next provider's stream too
+                provider = fallbacks.pop(0)
+                if not done:
+                    llm_hedged_requests.labels(provider=provider.name).inc()
+                    logger.info("Hedging LLM stream | provider={} | after_s={:.2f}", provider.name, timeout)
+                open_stream(provider)
+        finally:
+            for first, stream in waiting.items():
+                first.cancel()
+                stream.task.cancel()
+
+        return None
+
+    def _observe_stream(self, stream: ProviderStream, ok: bool) -> None:
+        elapsed = perf_counter() - stream.started
+        llm_request_duration.labels(provider=stream.provider.name, status="ok" if ok else "error").observe(elapsed)
+        if ok:
+            self.latencies[stream.provider.name].observe(elapsed)
+
+    async def _discard_stream(self, stream: ProviderStream) -> None:
+        """Record a stream that ended without any text."""
+        try:
+            await stream.task
+        except Exception as e:  # noqa: BLE001
+            logger.error("LLM provider stream failed | provider={} | error={}", stream.provider.name, e)
+        else:
+            logger.warning("LLM provider streamed no answer | provider={}", stream.provider.name)
+        self._observe_stream(stream, ok=False)
+
+    async def stream_answer(
+        self,
+        question: str,
+        language_code: str,
+        tier: LLMTier | None = None,
+        history: Sequence[ChatTurn] = (),
+    ) -> AsyncIterator[str]:
+        """Stream from the provider that produces the first text, the others are hedges or used on failure."""
+        start = perf_counter()
+        found = await self._first_stream(question, language_code, tier, history)
+        if found is None:
+            return
+
+        stream, first_delta = found
+        try:
+            yield first_delta
+            while (delta := await stream.deltas.get()) is not None:
+                yield delta
+            # a stream failing midway raises here, its partial answer must not pass for a complete one
+            await stream.task
+        except Exception:
+            self._observe_stream(stream, ok=False)
+            raise
+        finally:
+            # the reader is gone or the stream is complete, cancelling is a no-op then
+            stream.task.cancel()
+
+        self._observe_stream(stream, ok=True)
+        llm_wins.labels(provider=stream.provider.name).inc()
+        if tier is not None:
+            llm_tier_duration.labels(tier=tier.name).observe(perf_counter() - start)
+
+
+def create_provider(name: str) -> LLMProvider | None:
+    """Create the client of a configured provider, ``None`` if it is unknown or not configured."""
+    factories = {"openai": get_openai_client, "gemini": get_gemini_client}
+    try:
+        return factories[name]()
+    except (KeyError, RuntimeError) as e:
+        logger.warning("LLM provider skipped | provider={} | reason={}", name, e)
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_llm_router() -> LLMRouter:
+    """Get a singleton instance of the LLM router with every configured provider."""
+    providers = [provider for name in settings.LLM_PROVIDERS if (provider := create_provider(name)) is not None]
+    return LLMRouter(providers)
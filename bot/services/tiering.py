@@ -0,0 +1,82 @@
+from __future__ import annotations
+import unicodedata
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from bot.core.config import settings
+from bot.knowledge.intents import PROBLEM_RE, get_intent_classifier
+from bot.services.metrics import llm_tier_requests
+from bot.utils.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from bot.core.config import LLMTier
+
+LONG_QUESTION_TOKENS = 30
+VERY_LONG_QUESTION_TOKENS = 80
+LONG_CONVERSATION_TURNS = 3  # follow-ups deep into a conversation depend on its context
+
+PROBLEM_SCORE = 2
+LENGTH_SCORE = 1  # for each length threshold
+SEVERAL_QUESTIONS_SCORE = 1
+LONG_CONVERSATION_SCORE = 1
+KNOWN_INTENT_SCORE = -1  # about a single known topic: buying, topping up, balance, APN
+KNOWN_INTENT_MIN_CONFIDENCE = 0.7  # long or multi-topic questions only mention the topic
+
+
+@dataclass(frozen=True, slots=True)
+class QuestionDifficulty:
+    score: float
+    reasons: tuple[str, ...]
+
+
+def score_question(question: str, turn: int = 0) -> QuestionDifficulty:
+    """Estimate how hard a question is to answer well, without calling any model.
+
+    ``turn`` is the number of earlier questions in the conversation.
+    """
+    text = unicodedata.normalize("NFKC", question).casefold()
+    score = 0.0
+    reasons: list[str] = []
+
+    tokens = estimate_tokens(text)
+    for threshold in (LONG_QUESTION_TOKENS, VERY_LONG_QUESTION_TOKENS):
+        if tokens > threshold:
+            score += LENGTH_SCORE
+            reasons.append(f"tokens>{threshold}")
+
+    if PROBLEM_RE.search(text):
+        score += PROBLEM_SCORE
+        reasons.append("troubleshooting")
+
+    if text.count("?") + text.count("？") > 1:
+        score += SEVERAL_QUESTIONS_SCORE
+        reasons.append("several_questions")
+
+    if turn >= LONG_CONVERSATION_TURNS:
+        score += LONG_CONVERSATION_SCORE
+        reasons.append(f"turn>={LONG_CONVERSATION_TURNS}")
+
+    intent = get_intent_classifier().classify(question)
+    if intent is not None and intent[1] >= KNOWN_INTENT_MIN_CONFIDENCE:
+        score += KNOWN_INTENT_SCORE
+        reasons.append(f"intent={intent[0].name}")
+
+    return QuestionDifficulty(score=score, reasons=tuple(reasons))
+
+
+def select_tier(question: str, turn: int = 0, tiers: list[LLMTier] = settings.LLM_TIERS) -> LLMTier | None:
+    """The highest tier whose ``min_score`` the question reaches, ``None`` keeps the providers' default models."""
+    if not settings.LLM_TIERING_ENABLED or not tiers:
+        return None
+
+    difficulty = score_question(question, turn)
+    ordered = sorted(tiers, key=lambda tier: tier.min_score)
+    tier = next((tier for tier in reversed(ordered) if difficulty.score >= tier.min_score), ordered[0])
+
+    llm_tier_requests.labels(tier=tier.name).inc()
+    logger.info(
+        "Question tier selected | tier={} | score={} | reasons={}", tier.name, difficulty.score, difficulty.reasons
+    )
+    return tier
@@ -1,9 +1,11 @@
 from __future__ import annotations
+from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
 from sqlalchemy import func, select, update
 
 from bot.cache.redis import build_key, cached, clear_cache
+from bot.cache.serialization import DataclassSerializer, ModelRowSerializer
 from bot.database.models import UserModel
 
 if TYPE_CHECKING:
@@ -11,6 +13,15 @@ if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
 
 
+@dataclass(frozen=True, slots=True)
+class UserProfile:
+    """What handling an update needs to know about the user, loaded once per update by ``UserProfileMiddleware``."""
+
+    id: int
+    language_code: str  # empty when the user has not chosen one
+    is_admin: bool
+
+
 async def add_user(
     session: AsyncSession,
     user: User,
@@ -36,18 +47,24 @@ async def add_user(
 
     session.add(new_user)
     await session.commit()
-    await clear_cache(user_exists, user_id)
+    await clear_cache(get_user_profile, user_id)
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
-async def user_exists(session: AsyncSession, user_id: int) -> bool:
-    """Checks if the user is in the database."""
-    query = select(UserModel.id).filter_by(id=user_id).limit(1)
+@cached(
+    key_builder=lambda session, user_id: build_key(user_id),
+    serializer=DataclassSerializer(UserProfile),
+    local=True,
+)
+async def get_user_profile(session: AsyncSession, user_id: int) -> UserProfile | None:
+    """The user's profile with a single query, ``None`` when the user is not registered yet."""
+    query = select(UserModel.id, UserModel.language_code, UserModel.is_admin).filter_by(id=user_id)
 
     result = await session.execute(query)
 
-    user = result.scalar_one_or_none()
-    return bool(user)
+    row = result.one_or_none()
+    if row is None:
+        return None
+    return UserProfile(id=row.id, language_code=row.language_code or "", is_admin=bool(row.is_admin))
 
 
 @cached(key_builder=lambda session, user_id: build_key(user_id))
@@ -60,16 +77,6 @@ async def get_first_name(session: AsyncSession, user_id: int) -> str:
     return first_name or ""
 
 
-@cached(key_builder=lambda session, user_id: build_key(user_id))
-async def get_language_code(session: AsyncSession, user_id: int) -> str:
-    query = select(UserModel.language_code).filter_by(id=user_id)
-
-    result = await session.execute(query)
-
-    language_code = result.scalar_one_or_none()
-    return language_code or ""
-
-
 async def set_language_code(
     session: AsyncSession,
     user_id: int,
@@ -79,27 +86,25 @@ async def set_language_code(
 
     await session.execute(stmt)
     await session.commit()
-    await clear_cache(get_language_code, user_id)
-
-
-@cached(key_builder=lambda session, user_id: build_key(user_id))
-async def is_admin(session: AsyncSession, user_id: int) -> bool:
-    query = select(UserModel.is_admin).filter_by(id=user_id)
-
-    result = await session.execute(query)
-
-    is_admin = result.scalar_one_or_none()
-    return bool(is_admin)
+    await clear_cache(get_user_profile, user_id)
 
 
-async def set_is_admin(session: AsyncSession, user_id: int, is_admin: bool) -> None:
-    stmt = update(UserModel).where(UserModel.id == user_id).values(is_admin=is_admin)
+async def set_is_admin(session: AsyncSession, user_id: int, admin: bool) -> None:
+    stmt = update(UserModel).where(UserModel.id == user_id).values(is_admin=admin)
 
     await session.execute(stmt)
     await session.commit()
+    await clear_cache(get_user_profile, user_id)
 
 
-@cached(key_builder=lambda session: build_key())
+# hot keys: read by every export, recomputed by one caller while the others get the current list
+@cached(
+    key_builder=lambda session: build_key(),
+    serializer=ModelRowSerializer(UserModel, compression="zlib"),
+    lock=True,
+    early_refresh=1.0,
+    stale_ttl=30,
+)
 async def get_all_users(session: AsyncSession) -> list[UserModel]:
     query = select(UserModel)
 
@@ -109,7 +114,7 @@ async def get_all_users(session: AsyncSession) -> list[UserModel]:
     return list(users)
 
 
-@cached(key_builder=lambda session: build_key())
+@cached(key_builder=lambda session: build_key(), lock=True, early_refresh=1.0, stale_ttl=30)
 async def get_user_count(session: AsyncSession) -> int:
     query = select(func.count()).select_from(UserModel)
 
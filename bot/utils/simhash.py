@@ -0,0 +1,76 @@
+from __future__ import annotations
+import hashlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 8  # pigeonhole: signatures within 7 bits share at least one band
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+
+
+def simhash(features: Iterable[str]) -> int:
+    """64-bit SimHash signature of a bag of features."""
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        value = _feature_hash(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def similarity(a: int, b: int) -> float:
+    return 1 - hamming_distance(a, b) / SIMHASH_BITS
+
+
+def bands(signature: int) -> list[tuple[int, int]]:
+    return [(band, signature >> (band * BAND_BITS) & BAND_MASK) for band in range(SIMHASH_BANDS)]
+
+
+class SimHashIndex:
+    """In-memory LSH index of SimHash signatures, candidates are looked up by band instead of a full scan."""
+
+    def __init__(self) -> None:
+        self.values: dict[int, str] = {}
+        self.buckets: dict[tuple[int, int], set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, signature: int, value: str) -> None:
+        self.values[signature] = value
+        for band in bands(signature):
+            self.buckets.setdefault(band, set()).add(signature)
+
+    def remove(self, signature: int) -> None:
+        if self.values.pop(signature, None) is None:
+            return
+        for band in bands(signature):
+            bucket = self.buckets.get(band)
+            if bucket:
+                bucket.discard(signature)
+
+    def candidates(self, signature: int, min_similarity: float) -> list[tuple[int, str, float]]:
+        """Stored signatures, their values and similarities of at least ``min_similarity``, the closest first."""
+        signatures: set[int] = set()
+        for band in bands(signature):
+            signatures |= self.buckets.get(band, set())
+
+        found = [(candidate, self.values[candidate], similarity(signature, candidate)) for candidate in signatures]
+        return sorted((item for item in found if item[2] >= min_similarity), key=lambda item: item[2], reverse=True)
+
+    def nearest(self, signature: int, min_similarity: float) -> tuple[str, float] | None:
+        """Return the closest stored value and its similarity if it passes ``min_similarity``."""
+        found = self.candidates(signature, min_similarity)
+        return (found[0][1], found[0][2]) if found else None
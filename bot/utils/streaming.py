@@ -0,0 +1,106 @@
+from __future__ import annotations
+import asyncio
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from loguru import logger
+
+if TYPE_CHECKING:
+    from aiogram.types import InlineKeyboardMarkup, Message
+
+MESSAGE_MAX_LEN = 4000  # Telegram message limit safety
+EDIT_INTERVAL = 1.0  # seconds between edits of the same message
+# answers are sent as plain text, streamed or not: the model's "<" and "&" are not escaped
+# and a message cut in the middle of a tag could not be parsed
+ANSWER_PARSE_MODE = None
+
+
+class MessageStreamWriter:
+    """Progressively renders a streamed answer into Telegram messages.
+
+    The first chunk is sent as a new message right away, later chunks are coalesced
+    into at most one ``edit_message_text`` per ``edit_interval``. Text that does not
+    fit into ``max_len`` rolls over into a new message.
+    """
+
+    def __init__(
+        self,
+        message: Message,
+        max_len: int = MESSAGE_MAX_LEN,
+        edit_interval: float = EDIT_INTERVAL,
+    ) -> None:
+        self.message = message
+        self.max_len = max_len
+        self.edit_interval = edit_interval
+
+        self.current: Message | None = None
+        self.text = ""  # text of the current message
+        self.shown = ""  # text of the current message as the user sees it
+        self.next_edit_at = 0.0
+        self.messages_sent = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return self.messages_sent == 0 and not self.text
+
+    async def write(self, delta: str) -> None:
+        self.text += delta
+
+        while len(self.text) > self.max_len:
+            head, self.text = self.text[: self.max_len], self.text[self.max_len :]
+            await self._flush(head, force=True)
+            self.current = None
+            self.shown = ""
+
+        await self._flush(self.text)
+
+    async def finish(self, suffix: str = "", reply_markup: InlineKeyboardMarkup | None = None) -> None:
+        """Render the remaining text, optionally appending a suffix and keyboard to the last message."""
+        self.text = self.text.strip()
+        if suffix:
+            if self.text and len(self.text) + len(suffix) > self.max_len:
+                await self._flush(self.text, force=True)
+                self.current = None
+                self.shown = ""
+                self.text = ""
+            self.text = f"{self.text}{suffix}".strip()
+
+        if self.text:
+            await self._flush(self.text, force=True, reply_markup=reply_markup)
+
+    async def _flush(
+        self,
+        text: str,
+        force: bool = False,
+        reply_markup: InlineKeyboardMarkup | None = None,
+    ) -> None:
+        if not text.strip() or (text == self.shown and reply_markup is None):
+            return
+
+        if self.current is None:
+            self.current = await self.message.answer(text, parse_mode=ANSWER_PARSE_MODE, reply_markup=reply_markup)
+            self.messages_sent += 1
+            self.shown = text
+            self.next_edit_at = monotonic() + self.edit_interval
+            return
+
+        if not force and monotonic() < self.next_edit_at:
+            return
+
+        try:
+            await self.current.edit_text(text, parse_mode=ANSWER_PARSE_MODE, reply_markup=reply_markup)
+        except TelegramRetryAfter as e:
+            if not force:
+                self.next_edit_at = monotonic() + e.retry_after
+                return
+            # the final text of a message must not be lost
+            await asyncio.sleep(e.retry_after)
+            await self.current.edit_text(text, parse_mode=ANSWER_PARSE_MODE, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            # "message is not modified" is harmless, anything else is worth a warning
+            if "not modified" not in str(e):
+                logger.warning("Failed to edit streamed message | error={}", e)
+
+        self.shown = text
+        self.next_edit_at = monotonic() + self.edit_interval
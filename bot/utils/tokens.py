@@ -0,0 +1,42 @@
+from __future__ import annotations
+import math
+import re
+
+PIECE_RE = re.compile(r"[^\W\d_]+|\d+|\s+|[^\w\s]", re.UNICODE)
+CJK_RE = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")  # kana, hanzi, hangul
+
+ASCII_CHARS_PER_TOKEN = 6  # English words are mostly one or two BPE tokens
+OTHER_CHARS_PER_TOKEN = 3  # Cyrillic, Arabic, accented Latin split into shorter pieces
+DIGITS_PER_TOKEN = 3
+
+
+def _word_tokens(word: str) -> int:
+    if word.isascii():
+        return math.ceil(len(word) / ASCII_CHARS_PER_TOKEN)
+    cjk = len(CJK_RE.findall(word))
+    return cjk + math.ceil((len(word) - cjk) / OTHER_CHARS_PER_TOKEN)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of BPE tokens in a text, without calling any tokenizer.
+
+    Errs on the high side for typical chat and JSON content, so a prompt that fits
+    the estimate also fits the real context window.
+    """
+    if not text:
+        return 0
+
+    total = 0
+    for piece in PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isspace():
+            # spaces are merged into the next word, line breaks with indentation are a token of their own
+            total += "\n" in piece
+        elif first.isdigit():
+            total += math.ceil(len(piece) / DIGITS_PER_TOKEN)
+        elif first.isalpha():
+            total += _word_tokens(piece)
+        else:
+            total += 1
+
+    return total
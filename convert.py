@@ -1,5 +1,6 @@
 import json
 import re
+import sys
 from typing import Dict, List, Any
 
 def parse_markdown_faq(md_content: str) -> Dict[str, Any]:
@@ -311,13 +312,32 @@ def extend_knowledge_base(kb_file: str, new_data: Dict[str, Any], section: str):
     
     print(f"✅ База знаний обновлена: добавлен раздел '{section}'")
 
+def compile_kb() -> None:
+    """
+    Собирает knowledge_base.json в артефакт knowledge_base.kb, который бот загружает через mmap
+    """
+    # импорт здесь: модули бота читают настройки из .env
+    from bot.knowledge.build import compile_knowledge_base  # noqa: PLC0415
+
+    stats = compile_knowledge_base()
+    print(f"✅ Артефакт собран: версия {stats.version}, секций {stats.chunks}, без изменений {stats.reused}")  # noqa: T201
+
 if __name__ == "__main__":
+    # Только сборка артефакта из текущего JSON: python convert.py --compile-only
+    if "--compile-only" in sys.argv:
+        compile_kb()
+        sys.exit(0)
+
     # Запуск конвертации
     input_md = "globustelefaq.md"  # имя вашего MD файла
     output_json = "knowledge_base.json"
     
     # Конвертируем
     kb = convert_md_to_json(input_md, output_json)
+
+    # Пересобираем артефакт, изменённые секции индексируются заново
+    if kb is not None:
+        compile_kb()
     
     # Пример добавления новых данных (раскомментируйте при необходимости)
     """
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import asyncio
+import math
+import os
+from collections import Counter
+from datetime import timedelta
+from typing import Any
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from typing_extensions import Self
+
+# the settings are read when bot modules are imported, the bot itself is never started
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+
+
+class Clock:
+    """Time that moves only when the test moves it, patched in for ``time`` or ``monotonic``."""
+
+    def __init__(self, now: float = 1_700_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeLock:
+    def __init__(self, redis: FakeRedis, name: str) -> None:
+        self.redis = redis
+        self.name = name
+
+    async def acquire(self, blocking: bool = True, blocking_timeout: float | None = None) -> bool:
+        self.redis.check()
+        loop = asyncio.get_running_loop()
+        deadline = math.inf if blocking_timeout is None else loop.time() + blocking_timeout
+        while self.name in self.redis.locks:
+            if not blocking or loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.001)
+        self.redis.locks.add(self.name)
+        return True
+
+    async def release(self) -> None:
+        self.redis.locks.discard(self.name)
+
+    async def locked(self) -> bool:
+        return self.name in self.redis.locks
+
+
+class FakePubSub:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.messages: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self.channels: list[str] = []
+
+    async def subscribe(self, channel: str) -> None:
+        self.channels.append(channel)
+        self.redis.subscribers.setdefault(channel, []).append(self.messages)
+
+    async def get_message(self, ignore_subscribe_messages: bool, timeout: float) -> dict[str, Any] | None:  # noqa: ARG002
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def reset(self) -> None:
+        for channel in self.channels:
+            self.redis.subscribers[channel].remove(self.messages)
+
+
+class FakePipeline:
+    """Queues commands and runs them in order on ``execute``, like a Redis pipeline."""
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands: list[tuple[str, tuple[Any, ...], dict[str, Any]]] = []
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *_: object) -> None:
+        return None
+
+    def __getattr__(self, name: str) -> Any:
+        def command(*args: Any, **kwargs: Any) -> FakePipeline:
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return command
+
+    async def execute(self) -> list[Any]:
+        commands, self.commands = self.commands, []
+        return [self.redis.run(name, *args, **kwargs) for name, args, kwargs in commands]
+
+
+class FakeRedis:
+    """In-memory Redis with the commands the bot uses, keys expire on the test clock.
+
+    Commands are awaited like those of ``redis.asyncio`` or queued in a ``pipeline``,
+    ``calls`` counts them by name and ``fail`` makes every one of them raise.
+    """
+
+    def __init__(self, clock: Clock | None = None) -> None:
+        self.clock = clock or Clock()
+        self.values: dict[str, tuple[bytes, float]] = {}  # value and the time it expires
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+        self.sets: dict[str, set[str]] = {}
+        self.locks: set[str] = set()
+        self.subscribers: dict[str, list[asyncio.Queue[dict[str, Any]]]] = {}
+        self.published: list[str] = []
+        self.calls: Counter[str] = Counter()
+        self.fail = False
+
+    def check(self) -> None:
+        if self.fail:
+            raise RedisConnectionError
+
+    def run(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        self.check()
+        self.calls[name] += 1
+        return getattr(self, f"_{name}")(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if not hasattr(type(self), f"_{name}"):
+            raise AttributeError(name)
+
+        async def command(*args: Any, **kwargs: Any) -> Any:
+            return self.run(name, *args, **kwargs)
+
+        return command
+
+    def lock(self, name: str, timeout: float | None = None) -> FakeLock:  # noqa: ARG002
+        return FakeLock(self, name)
+
+    def pubsub(self) -> FakePubSub:
+        return FakePubSub(self)
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:  # noqa: ARG002
+        return FakePipeline(self)
+
+    def _get(self, key: str) -> bytes | None:
+        value, expires_at = self.values.get(key, (b"", 0.0))
+        return value if expires_at > self.clock() else None
+
+    def _mget(self, keys: list[str]) -> list[bytes | None]:
+        return [self._get(key) for key in keys]
+
+    def _set(self, key: str, value: bytes | str, ex: int | timedelta | None = None) -> bool:
+        ttl = ex.total_seconds() if isinstance(ex, timedelta) else ex
+        expires_at = math.inf if ttl is None else self.clock() + ttl
+        self.values[key] = (value.encode() if isinstance(value, str) else value, expires_at)
+        return True
+
+    def _pttl(self, key: str) -> int:
+        if self._get(key) is None:
+            return -2
+        expires_at = self.values[key][1]
+        return -1 if expires_at == math.inf else int((expires_at - self.clock()) * 1000)
+
+    def _delete(self, *keys: str) -> int:
+        return sum(self.values.pop(key, None) is not None for key in keys)
+
+    def _hincrby(self, key: str, field: str, amount: int) -> int:
+        value = int(self.hashes.setdefault(key, {}).get(field.encode(), b"0")) + amount
+        self.hashes[key][field.encode()] = str(value).encode()
+        return value
+
+    def _expire(self, key: str, seconds: int) -> bool:
+        if self._get(key) is None:
+            # hashes and sets never expire here
+            return key in self.hashes or key in self.sets
+        self.values[key] = (self.values[key][0], self.clock() + seconds)
+        return True
+
+    def _hset(
+        self, key: str, field: str | None = None, value: str | None = None, mapping: dict[str, str] | None = None
+    ) -> int:
+        items = {**(mapping or {}), **({field: value} if field is not None and value is not None else {})}
+        self.hashes.setdefault(key, {}).update({name.encode(): item.encode() for name, item in items.items()})
+        return len(items)
+
+    def _hdel(self, key: str, *fields: str) -> int:
+        values = self.hashes.get(key, {})
+        return sum(values.pop(name.encode(), None) is not None for name in fields)
+
+    def _hgetall(self, key: str) -> dict[bytes, bytes]:
+        return dict(self.hashes.get(key, {}))
+
+    def _sadd(self, key: str, value: str) -> int:
+        self.sets.setdefault(key, set()).add(value)
+        return 1
+
+    def _sismember(self, key: str, value: str) -> int:
+        return int(value in self.sets.get(key, set()))
+
+    def _publish(self, channel: str, message: str) -> int:
+        self.published.append(message)
+        queues = self.subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait({"type": "message", "data": message.encode()})
+        return len(queues)
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def redis(clock: Clock) -> FakeRedis:
+    return FakeRedis(clock)
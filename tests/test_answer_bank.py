@@ -0,0 +1,158 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+
+import orjson
+import pytest
+from prometheus_client import REGISTRY
+
+from bot.knowledge import answer_bank
+from bot.knowledge.answer_bank import (
+    AnswerBank,
+    BankedAnswer,
+    get_banked_answer,
+    load_graded_answers,
+)
+from bot.services import answers
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+BALANCE = "How do I check the balance of my eSIM?"
+BALANCE_ANSWER = "Dial **\\*100#** or open your account dashboard."
+
+
+def item(question: str, answer: str, score: int, language: str = "en") -> dict[str, Any]:
+    return {"question": question, "language": language, "globustele_bot_answer": answer, "total_score": score}
+
+
+def write_qa(path: Path, items: list[dict[str, Any]], version: str | None = "1.0 (MD)") -> Path:
+    data: dict[str, Any] = {"questions": [items]}
+    if version is not None:
+        data["knowledge_base_version"] = version
+    path.write_bytes(orjson.dumps(data))
+    return path
+
+
+def entry(question: str, language: str = "en", answer: str = "answer") -> BankedAnswer:
+    return BankedAnswer(question=question, language=language, answer=answer, score=50, source="qa1.json")
+
+
+@pytest.fixture
+def bank() -> AnswerBank:
+    return AnswerBank(
+        [
+            entry(BALANCE, answer="balance"),
+            entry("Why is my eSIM not working?", answer="troubleshooting"),
+            entry("Как проверить баланс eSIM?", language="ru", answer="баланс"),
+        ],
+        min_similarity=0.85,
+    )
+
+
+def near_misses() -> float:
+    return REGISTRY.get_sample_value("tgbot_answer_bank_requests_total", {"result": "near_miss"}) or 0.0
+
+
+def test_best_graded_answer_per_question_is_loaded(tmp_path: Path) -> None:
+    path = write_qa(
+        tmp_path / "qa1.json",
+        [
+            item(BALANCE, "Dial *100#.", 46),
+            item("how do i check the balance of my esim?", BALANCE_ANSWER, 49),
+            item("What is eSIM?", "A digital SIM.", 30),
+            item("Where can I buy an eSIM?", "", 50),
+        ],
+    )
+
+    entries = load_graded_answers([path], min_score=45, knowledge_base_version="1.0")
+
+    assert [(found.answer, found.score) for found in entries] == [("Dial \\*100# or open your account dashboard.", 49)]
+
+
+@pytest.mark.parametrize(("version", "loaded"), [("1.0 (MD)", True), ("1.0", True), ("2.0 (MD)", False), (None, False)])
+def test_answers_graded_against_another_knowledge_base_are_skipped(
+    tmp_path: Path,
+    version: str | None,
+    loaded: bool,
+) -> None:
+    path = write_qa(tmp_path / "qa1.json", [item(BALANCE, "Dial *100#.", 50)], version=version)
+
+    assert bool(load_graded_answers([path], min_score=45, knowledge_base_version="1.0")) is loaded
+
+
+def test_broken_file_is_skipped(tmp_path: Path) -> None:
+    broken = tmp_path / "qa2.json"
+    broken.write_text('{"questions": [[{"question": "What is eSIM?" "language": "en"}]]}')
+    path = write_qa(tmp_path / "qa1.json", [item(BALANCE, "Dial *100#.", 50)])
+
+    assert len(load_graded_answers([broken, tmp_path / "missing.json", path], 45, "1.0")) == 1
+
+
+@pytest.mark.parametrize(
+    ("question", "language_code", "answer"),
+    [
+        (BALANCE, "en", "balance"),
+        ("how do i check the balance of my esim", "en", "balance"),
+        ("Check my eSIM balance?", "en", "balance"),
+        ("Why is my eSIM not working?", "en", "troubleshooting"),
+        ("Как проверить баланс eSIM?", "ru", "баланс"),
+        # one more word still asks the same, two more change the question or a problem with the balance
+        ("How do I check the balance of my eSIM in Japan?", "en", "balance"),
+        ("How do I check the remaining balance of my eSIM online?", "en", None),
+        ("Why can't I check the balance of my eSIM?", "en", None),
+        ("How do I top up my eSIM?", "en", None),
+        # no graded answers in the language, other languages are not a fallback
+        ("Wie prüfe ich das Guthaben meiner eSIM?", "de", None),
+        (BALANCE, "de", None),
+        ("", "en", None),
+    ],
+)
+def test_only_strong_matches_are_served(
+    bank: AnswerBank, question: str, language_code: str, answer: str | None
+) -> None:
+    match = bank.match(question, language_code)
+
+    assert (match.entry.answer if match else None) == answer
+
+
+def test_near_miss_is_counted(bank: AnswerBank, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(answer_bank, "get_answer_bank", lambda: bank)
+    before = near_misses()
+
+    assert get_banked_answer("How do I check the remaining balance of my eSIM online?", "en") is None
+    assert get_banked_answer("How do I install an eSIM on Android?", "en") is None
+
+    assert near_misses() == before + 1
+
+
+@pytest.mark.parametrize(
+    ("device", "intent", "banked", "answer"),
+    [
+        ("device", None, "banked", "device"),
+        (None, "intent", "banked", "intent"),
+        (None, None, "banked", "banked"),
+        ("device", "intent", "banked", None),
+        (None, None, None, None),
+    ],
+)
+def test_knowledge_base_answers_come_before_graded_ones(
+    monkeypatch: pytest.MonkeyPatch,
+    device: str | None,
+    intent: str | None,
+    banked: str | None,
+    answer: str | None,
+) -> None:
+    def match(text: str | None) -> Any:
+        return None if text is None else type("Match", (), {"answer": text})()
+
+    monkeypatch.setattr(answers, "get_device_answer", lambda *_: match(device))
+    monkeypatch.setattr(answers, "get_intent_answer", lambda *_: match(intent))
+    monkeypatch.setattr(
+        answers,
+        "get_banked_answer",
+        lambda *_: None
+        if banked is None
+        else answer_bank.AnswerBankMatch(entry=entry(BALANCE, answer=banked), similarity=1),
+    )
+
+    assert answers.get_local_answer(BALANCE, "en") == answer
@@ -0,0 +1,151 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import pytest
+from prometheus_client import REGISTRY
+
+from bot.cache import answers as answer_cache
+from bot.cache import redis as redis_cache
+from bot.cache.answers import (
+    ANSWERS_NAMESPACE,
+    build_answer_key,
+    get_cached_answer,
+    normalize_question,
+    set_cached_answer,
+)
+from bot.core.config import settings
+
+if TYPE_CHECKING:
+    from tests.conftest import Clock, FakeRedis
+
+QUESTION = "How do I install an eSIM?"
+
+
+class Versions:
+    """The current knowledge base version, swapped by the tests."""
+
+    def __init__(self, current: str = "kb1") -> None:
+        self.current = current
+
+    def __call__(self) -> str:
+        return self.current
+
+
+@pytest.fixture
+def kb_version(monkeypatch: pytest.MonkeyPatch, redis: FakeRedis) -> Versions:
+    versions = Versions()
+    monkeypatch.setattr(answer_cache, "get_knowledge_base_version", versions)
+    monkeypatch.setattr(answer_cache, "redis_client", redis)
+    monkeypatch.setattr(redis_cache, "redis_client", redis)
+    monkeypatch.setattr(settings, "SIMILAR_ANSWERS_ENABLED", False)
+    return versions
+
+
+def answer_lookups(result: str) -> float:
+    return REGISTRY.get_sample_value("tgbot_answer_cache_requests_total", {"result": result}) or 0.0
+
+
+@pytest.mark.parametrize(
+    ("question", "normalized"),
+    [
+        ("  What is   eSIM?! ", "what is esim"),
+        ("HOW do I install an eSIM", "how do i install an esim"),
+        ("Prices,please", "prices please"),
+        ("\uff25\uff53\uff49\uff4d\uff1f", "esim"),  # full-width letters and marks
+        ("Straße\tund\nRoaming", "strasse und roaming"),
+        ("что такое eSIM?", "что такое esim"),
+        ("?!...", ""),
+    ],
+)
+def test_normalize_question(question: str, normalized: str) -> None:
+    assert normalize_question(question) == normalized
+
+
+@pytest.mark.parametrize(
+    "variant",
+    [
+        QUESTION,
+        "how do i install an esim",
+        "  How do I install an eSIM ?? ",
+        "HOW DO I INSTALL AN ESIM!",
+        "How do I\ninstall an eSIM…",
+        "\uff28\uff4f\uff57 do I install an eSIM\uff1f",  # full-width
+    ],
+)
+def test_variants_of_a_question_share_a_key(variant: str) -> None:
+    assert build_answer_key(variant, "en", "kb1") == build_answer_key(QUESTION, "en", "kb1")
+
+
+@pytest.mark.parametrize(
+    ("question", "language_code", "version"),
+    [
+        ("How do I install an eSIM on iPhone?", "en", "kb1"),  # another question
+        ("How do I install eSIM?", "en", "kb1"),
+        (QUESTION, "de", "kb1"),
+        (QUESTION, "en", "kb2"),  # the knowledge base was updated
+    ],
+)
+def test_key_changes_with_the_question_language_and_version(question: str, language_code: str, version: str) -> None:
+    assert build_answer_key(question, language_code, version) != build_answer_key(QUESTION, "en", "kb1")
+
+
+def test_key_uses_the_current_version_by_default(kb_version: Versions) -> None:
+    key = build_answer_key(QUESTION, "en")
+
+    assert key == build_answer_key(QUESTION, "en", "kb1")
+    assert key.startswith(f"{ANSWERS_NAMESPACE}:kb1:en:")
+    kb_version.current = "kb2"
+    assert build_answer_key(QUESTION, "en") != key
+
+
+@pytest.mark.usefixtures("kb_version")
+async def test_cached_answer_is_served_for_a_variant() -> None:
+    hits, misses = answer_lookups("hit"), answer_lookups("miss")
+
+    assert await get_cached_answer(QUESTION, "en") is None
+    await set_cached_answer(QUESTION, "en", "Scan the QR code.")
+
+    assert await get_cached_answer("how do i install an esim!!", "en") == "Scan the QR code."
+    assert await get_cached_answer(QUESTION, "de") is None
+    assert (answer_lookups("hit"), answer_lookups("miss")) == (hits + 1, misses + 2)
+
+
+async def test_new_version_does_not_serve_old_answers(kb_version: Versions) -> None:
+    await set_cached_answer(QUESTION, "en", "Scan the QR code.")
+
+    kb_version.current = "kb2"
+
+    assert await get_cached_answer(QUESTION, "en") is None
+
+
+async def test_answer_is_stored_under_the_version_it_was_requested_with(kb_version: Versions) -> None:
+    # the knowledge base was swapped while the answer was generated
+    kb_version.current = "kb2"
+    await set_cached_answer(QUESTION, "en", "Scan the QR code.", kb_version="kb1")
+
+    assert await get_cached_answer(QUESTION, "en") is None
+    kb_version.current = "kb1"
+    assert await get_cached_answer(QUESTION, "en") == "Scan the QR code."
+
+
+@pytest.mark.usefixtures("kb_version")
+async def test_answer_expires_with_the_cache_ttl(redis: FakeRedis, clock: Clock) -> None:
+    await set_cached_answer(QUESTION, "en", "Scan the QR code.")
+
+    assert redis.values[build_answer_key(QUESTION, "en")][1] == clock.now + settings.ANSWER_CACHE_TTL
+
+
+@pytest.mark.parametrize(("enabled", "answer"), [(False, "Scan the QR code."), (True, "")])
+@pytest.mark.usefixtures("kb_version")
+async def test_nothing_is_cached(
+    enabled: bool,
+    answer: str,
+    redis: FakeRedis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", enabled)
+
+    await set_cached_answer(QUESTION, "en", answer)
+
+    assert not redis.values
+    assert await get_cached_answer(QUESTION, "en") is None
@@ -0,0 +1,102 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from bot.cache import answers as answer_cache
+from bot.cache import redis as redis_cache
+from bot.cache.answers import ANSWERS_NAMESPACE, SimilarQuestions
+from bot.cache.singleflight import SingleFlight
+from bot.services import answers
+from bot.services.prompt import ChatTurn
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Sequence
+
+    from tests.conftest import FakeRedis
+
+HISTORY = (
+    ChatTurn(role="user", text="Which plans do you have for Japan?"),
+    ChatTurn(role="assistant", text="There are 7 and 30 day plans for Japan."),
+)
+
+
+class FakeRouter:
+    """Answers every question, remembering the conversation it was asked with."""
+
+    def __init__(self) -> None:
+        self.histories: list[tuple[str, Sequence[ChatTurn]]] = []
+
+    async def answer(self, question: str, history: Sequence[ChatTurn], **_: Any) -> str:
+        self.histories.append((question, history))
+        return f"answer to {question}"
+
+    async def stream_answer(self, question: str, history: Sequence[ChatTurn], **_: Any) -> AsyncIterator[str]:
+        self.histories.append((question, history))
+        for word in f"answer to {question}".split(" "):
+            yield f"{word} "
+
+
+@pytest.fixture
+def router(monkeypatch: pytest.MonkeyPatch, redis: FakeRedis) -> FakeRouter:
+    router = FakeRouter()
+    monkeypatch.setattr(answers, "get_llm_router", lambda: router)
+    monkeypatch.setattr(answers, "get_local_answer", lambda *_: None)
+    monkeypatch.setattr(answers, "single_flight", SingleFlight(cache=redis, timeout=1))  # type: ignore[arg-type]
+    monkeypatch.setattr(answers, "get_knowledge_base_version", lambda: "kb1")
+    monkeypatch.setattr(answer_cache, "get_knowledge_base_version", lambda: "kb1")
+    monkeypatch.setattr(answer_cache, "similar_questions", SimilarQuestions())
+    monkeypatch.setattr(answer_cache, "redis_client", redis)
+    monkeypatch.setattr(redis_cache, "redis_client", redis)
+    return router
+
+
+def cached_answers(redis: FakeRedis) -> list[str]:
+    return [key for key in redis.values if key.startswith(f"{ANSWERS_NAMESPACE}:kb1:")]
+
+
+async def collect(stream: AsyncIterator[str]) -> str:
+    return "".join([delta async for delta in stream]).strip()
+
+
+async def test_self_contained_question_in_a_chat_hits_the_cache(router: FakeRouter) -> None:
+    question = "How do I install an eSIM on Android?"
+    first = await answers.answer_question(question, "en")
+
+    # asked again later in another chat, after an unrelated question
+    assert await answers.answer_question(question, "en", history=HISTORY, turn=1) == first
+    assert await collect(answers.stream_answer(question, "en", history=HISTORY, turn=1)) == first
+
+    assert router.histories == [(question, ())]
+
+
+async def test_self_contained_question_in_a_chat_is_cached_without_the_conversation(
+    router: FakeRouter,
+    redis: FakeRedis,
+) -> None:
+    question = "How do I install an eSIM on Android?"
+
+    await answers.answer_question(question, "en", history=HISTORY, turn=1)
+
+    assert router.histories == [(question, ())]
+    assert len(cached_answers(redis)) == 1
+
+
+@pytest.mark.parametrize("question", ["And for 30 days?", "How much does it cost?", "What about China?"])
+async def test_follow_up_is_answered_with_the_conversation_and_not_cached(
+    router: FakeRouter,
+    redis: FakeRedis,
+    question: str,
+) -> None:
+    await answers.answer_question(question, "en", history=HISTORY, turn=1)
+    await collect(answers.stream_answer(question, "en", history=HISTORY, turn=1))
+
+    assert router.histories == [(question, HISTORY), (question, HISTORY)]
+    assert not cached_answers(redis)
+
+
+async def test_first_question_of_a_chat_is_cached_even_if_short(router: FakeRouter, redis: FakeRedis) -> None:
+    assert await answers.answer_question("Prices?", "en") == await answers.answer_question("prices", "en")
+
+    assert router.histories == [("Prices?", ())]
+    assert len(cached_answers(redis)) == 1
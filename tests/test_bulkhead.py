@@ -0,0 +1,139 @@
+from __future__ import annotations
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from bot.services.bulkhead import Bulkhead, BulkheadFullError
+
+
+class Caller:
+    """Holds a slot of the bulkhead until ``done`` is set."""
+
+    def __init__(self, bulkhead: Bulkhead) -> None:
+        self.bulkhead = bulkhead
+        self.entered = False
+        self.done = asyncio.Event()
+
+    async def __call__(self) -> None:
+        async with self.bulkhead.acquire():
+            self.entered = True
+            await self.done.wait()
+
+
+def sample(name: str, labels: dict[str, str] | None = None) -> float:
+    return REGISTRY.get_sample_value(f"tgbot_{name}", labels or {}) or 0.0
+
+
+def rejections(reason: str) -> float:
+    return sample("llm_queue_rejections_total", {"reason": reason})
+
+
+async def start(bulkhead: Bulkhead, count: int) -> tuple[list[Caller], list[asyncio.Task[None]]]:
+    callers = [Caller(bulkhead) for _ in range(count)]
+    tasks = [asyncio.create_task(caller()) for caller in callers]
+    await asyncio.sleep(0.01)
+    return callers, tasks
+
+
+async def finish(callers: list[Caller], tasks: list[asyncio.Task[None]]) -> list[BaseException | None]:
+    for caller in callers:
+        caller.done.set()
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def is_idle(bulkhead: Bulkhead) -> bool:
+    return bulkhead.waiting == 0 and not bulkhead.semaphore.locked()
+
+
+@pytest.mark.parametrize(
+    ("max_concurrency", "max_queue", "count", "waiting", "rejected"),
+    [
+        (2, 2, 1, 0, 0),
+        (2, 2, 2, 0, 0),
+        (2, 2, 4, 2, 0),
+        (2, 2, 5, 2, 1),
+        (2, 0, 3, 0, 1),  # without a queue everything over the limit is rejected
+        (1, 1, 4, 1, 2),
+    ],
+)
+async def test_callers_over_the_limits_wait_or_are_rejected(
+    max_concurrency: int,
+    max_queue: int,
+    count: int,
+    waiting: int,
+    rejected: int,
+) -> None:
+    bulkhead = Bulkhead(max_concurrency=max_concurrency, max_queue=max_queue, queue_timeout=10)
+    before = rejections("queue_full")
+
+    callers, tasks = await start(bulkhead, count)
+
+    assert sum(caller.entered for caller in callers) == min(count, max_concurrency)
+    assert bulkhead.waiting == waiting
+    assert sample("llm_queue_depth") == waiting
+    assert rejections("queue_full") == before + rejected
+
+    results = await finish(callers, tasks)
+    assert sum(isinstance(result, BulkheadFullError) for result in results) == rejected
+    # the queued callers got a slot once the first ones were done
+    assert sum(caller.entered for caller in callers) == count - rejected
+    assert is_idle(bulkhead)
+
+
+async def test_slots_are_counted_as_in_flight() -> None:
+    bulkhead = Bulkhead(max_concurrency=2, max_queue=1, queue_timeout=10)
+    before = sample("llm_inflight")
+
+    callers, tasks = await start(bulkhead, 3)
+    assert sample("llm_inflight") == before + 2
+
+    await finish(callers, tasks)
+    assert sample("llm_inflight") == before
+
+
+async def test_queue_wait_times_out() -> None:
+    bulkhead = Bulkhead(max_concurrency=1, max_queue=1, queue_timeout=0.01)
+    callers, tasks = await start(bulkhead, 1)
+    before = rejections("timeout")
+
+    with pytest.raises(BulkheadFullError, match="timed out"):
+        await Caller(bulkhead)()
+
+    assert rejections("timeout") == before + 1
+    assert bulkhead.waiting == 0
+    await finish(callers, tasks)
+    assert is_idle(bulkhead)
+
+
+async def test_failed_call_releases_its_slot() -> None:
+    bulkhead = Bulkhead(max_concurrency=1, max_queue=0, queue_timeout=10)
+
+    with pytest.raises(RuntimeError):
+        async with bulkhead.acquire():
+            raise RuntimeError
+
+    assert is_idle(bulkhead)
+
+
+@pytest.mark.parametrize(
+    ("cancelled", "handed_over"),
+    [
+        (0, True),  # a cancelled holder passes its slot on
+        (2, False),  # a cancelled waiter leaves the queue
+    ],
+)
+async def test_cancelled_call_releases_its_place(cancelled: int, handed_over: bool) -> None:
+    bulkhead = Bulkhead(max_concurrency=1, max_queue=2, queue_timeout=10)
+    callers, tasks = await start(bulkhead, 3)
+    assert [caller.entered for caller in callers] == [True, False, False]
+
+    tasks[cancelled].cancel()
+    await asyncio.sleep(0.01)
+
+    assert bulkhead.waiting == 1
+    assert callers[1].entered is handed_over
+    results = await finish(callers, tasks)
+    assert isinstance(results[cancelled], asyncio.CancelledError)
+    assert [caller.entered for caller in callers] == [True, True, handed_over]
+    assert is_idle(bulkhead)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import TYPE_CHECKING
+
+import pytest
+
+from bot.services import circuit_breaker
+from bot.services.circuit_breaker import BreakerState, CircuitBreaker, ErrorInfo, RetryPolicy, parse_retry_after
+
+if TYPE_CHECKING:
+    from tests.conftest import Clock
+
+
+@pytest.fixture
+def clock(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> Clock:
+    monkeypatch.setattr(circuit_breaker, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def breaker() -> CircuitBreaker:
+    return CircuitBreaker("test", window=60, min_requests=5, failure_ratio=0.5, open_seconds=30)
+
+
+def record(breaker: CircuitBreaker, outcomes: str) -> None:
+    """Record ``outcomes`` written as "." for a success and "x" for a failure."""
+    for outcome in outcomes:
+        if outcome == ".":
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+
+@pytest.mark.parametrize(
+    "outcomes",
+    [
+        "",
+        "xxxx",  # too few requests to judge
+        ".....xxxx",  # below the failure ratio
+        ".x..x..x..",
+        "..........x",
+    ],
+)
+def test_breaker_stays_closed(breaker: CircuitBreaker, outcomes: str) -> None:
+    record(breaker, outcomes)
+
+    assert breaker.state is BreakerState.CLOSED
+    assert breaker.allow_request()
+
+
+@pytest.mark.parametrize("outcomes", ["xxxxx", "..xxx", "x.x.x.x.x.x"])
+def test_breaker_opens_on_the_failure_ratio(breaker: CircuitBreaker, outcomes: str) -> None:
+    record(breaker, outcomes)
+
+    assert breaker.state is BreakerState.OPEN
+    assert not breaker.allow_request()
+
+
+def test_failures_outside_the_window_are_forgotten(breaker: CircuitBreaker, clock: Clock) -> None:
+    record(breaker, "xxxx")
+    clock.now += 61
+
+    record(breaker, "x")
+
+    assert breaker.state is BreakerState.CLOSED
+
+
+def test_open_breaker_lets_a_single_probe_through(breaker: CircuitBreaker, clock: Clock) -> None:
+    record(breaker, "xxxxx")
+    clock.now += 29
+    assert not breaker.allow_request()
+
+    clock.now += 1
+    assert breaker.allow_request()
+    assert breaker.state is BreakerState.HALF_OPEN
+    assert not breaker.allow_request()
+
+
+def test_successful_probe_closes_the_breaker(breaker: CircuitBreaker, clock: Clock) -> None:
+    record(breaker, "xxxxx")
+    clock.now += 30
+    breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state is BreakerState.CLOSED
+    # the failures that opened it do not count any more
+    record(breaker, "xxxx")
+    assert breaker.state is BreakerState.CLOSED
+
+
+def test_failed_probe_opens_the_breaker_again(breaker: CircuitBreaker, clock: Clock) -> None:
+    record(breaker, "xxxxx")
+    clock.now += 30
+    breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state is BreakerState.OPEN
+    assert not breaker.allow_request()
+    clock.now += 30
+    assert breaker.allow_request()
+
+
+@pytest.mark.parametrize(
+    ("headers", "expected"),
+    [
+        (None, None),
+        ({}, None),
+        ({"retry-after": "7"}, 7.0),
+        ({"retry-after": "1.5"}, 1.5),
+        ({"retry-after-ms": "250"}, 0.25),
+        ({"retry-after-ms": "250", "retry-after": "7"}, 0.25),
+        ({"retry-after-ms": "soon", "retry-after": "7"}, 7.0),
+        ({"retry-after": "soon"}, None),
+        ({"retry-after": ""}, None),
+    ],
+)
+def test_parse_retry_after(headers: dict[str, str] | None, expected: float | None) -> None:
+    assert parse_retry_after(headers) == expected
+
+
+def test_parse_retry_after_http_date() -> None:
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=120), usegmt=True)
+
+    delay = parse_retry_after({"retry-after": date})
+
+    assert delay is not None
+    assert 110 < delay <= 120
+
+
+def test_parse_retry_after_date_in_the_past() -> None:
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+
+
+@pytest.mark.parametrize(
+    ("attempt", "error"),
+    [
+        (1, ErrorInfo(reason="bad_request", retryable=False)),
+        (3, ErrorInfo(reason="timeout", retryable=True)),  # out of attempts
+        (1, ErrorInfo(reason="rate_limit", retryable=True, retry_after=60)),  # longer than the max delay
+    ],
+)
+def test_retry_policy_gives_up(attempt: int, error: ErrorInfo) -> None:
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8)
+
+    assert policy.get_delay(attempt, error) is None
+
+
+def test_retry_policy_honors_retry_after() -> None:
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8)
+
+    assert policy.get_delay(1, ErrorInfo(reason="rate_limit", retryable=True, retry_after=2)) == 2
+
+
+@pytest.mark.parametrize(("attempt", "ceiling"), [(1, 0.5), (2, 1.0), (4, 4.0), (9, 8.0)])
+def test_retry_policy_backs_off_exponentially_with_jitter(attempt: int, ceiling: float) -> None:
+    policy = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=8)
+    error = ErrorInfo(reason="timeout", retryable=True)
+
+    delays = [policy.get_delay(attempt, error) for _ in range(50)]
+
+    assert all(delay is not None and 0 <= delay <= ceiling for delay in delays)
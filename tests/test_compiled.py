@@ -0,0 +1,204 @@
+from __future__ import annotations
+from collections import Counter
+from typing import TYPE_CHECKING, Any
+
+import orjson
+import pytest
+
+from bot.knowledge import retrieval
+from bot.knowledge.build import build_artifact, compile_knowledge_base
+from bot.knowledge.compiled import (
+    ARTIFACT_MAGIC,
+    HEADER_STRUCT,
+    CompiledKnowledgeBase,
+    CompiledSections,
+    dump_artifact,
+    load_compiled_knowledge_base,
+)
+from bot.knowledge.registry import KnowledgeBase
+from bot.knowledge.retrieval import build_knowledge_retriever, inverse_document_frequencies, tokenize
+from bot.knowledge.sections import SECTION_MAX_CHARS, split_sections
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+KNOWLEDGE_BASE: dict[str, Any] = {
+    "metadata": {"version": "2025-01"},
+    "payment": {"methods": "Pay with a bank card or PayPal", "currency": "All transactions are processed in USD"},
+    "installation": {"steps": "Scan the QR code in the camera app to install the eSIM"},
+    "coverage": {"countries": "Japan, Germany, France and 120 other countries"},
+}
+
+
+def source(knowledge_base: dict[str, Any] = KNOWLEDGE_BASE) -> str:
+    return orjson.dumps(knowledge_base, option=orjson.OPT_INDENT_2).decode()
+
+
+def edited(path: tuple[str, str], value: str) -> dict[str, Any]:
+    knowledge_base: dict[str, Any] = orjson.loads(orjson.dumps(KNOWLEDGE_BASE))
+    knowledge_base[path[0]][path[1]] = value
+    return knowledge_base
+
+
+def write_artifact(path: Path, text: str, **kwargs: Any) -> Path:
+    artifact, _ = build_artifact(text, **kwargs)
+    path.write_bytes(artifact)
+    return path
+
+
+@pytest.mark.parametrize("rendering", ["json", "minified", "lines", "compact"])
+def test_artifact_round_trip(rendering: str, tmp_path: Path) -> None:
+    text = source()
+    compiled = load_compiled_knowledge_base(write_artifact(tmp_path / "kb.kb", text, rendering=rendering))
+    assert compiled is not None
+    expected = split_sections(KNOWLEDGE_BASE, rendering=rendering)
+
+    assert compiled.version == KnowledgeBase.from_text(text).version  # type: ignore[union-attr]
+    assert compiled.rendering == rendering
+    assert compiled.max_chars == SECTION_MAX_CHARS
+    assert list(compiled.sections()) == expected
+    assert [compiled.chunk_terms(chunk) for chunk in compiled.chunks] == [
+        Counter(tokenize(section.text)) for section in expected
+    ]
+    assert compiled.idf == inverse_document_frequencies([Counter(tokenize(section.text)) for section in expected])
+    assert orjson.loads(compiled.minified_text) == KNOWLEDGE_BASE
+    if rendering == "json":
+        assert compiled.full_text == text
+    compiled.close()
+
+
+def test_sections_are_decoded_when_they_are_read(monkeypatch: pytest.MonkeyPatch) -> None:
+    compiled = CompiledKnowledgeBase(build_artifact(source())[0])
+    decoded: list[str] = []
+    chunk_content = CompiledKnowledgeBase.chunk_content
+
+    def count(self: CompiledKnowledgeBase, chunk: Any) -> Any:
+        decoded.append(chunk.id)
+        return chunk_content(self, chunk)
+
+    monkeypatch.setattr(CompiledKnowledgeBase, "chunk_content", count)
+    sections = compiled.sections()
+    assert len(sections) == len(compiled.chunks)
+    assert decoded == []
+
+    assert sections[-1].id == "coverage"
+    assert sections[-1] is sections[len(sections) - 1]
+    assert decoded == ["coverage"]
+
+
+def test_retriever_of_the_artifact_decodes_only_the_selected_sections(monkeypatch: pytest.MonkeyPatch) -> None:
+    text = source()
+    compiled = CompiledKnowledgeBase(build_artifact(text, rendering="json")[0])
+    monkeypatch.setattr(retrieval, "load_compiled_knowledge_base", lambda: compiled)
+
+    retriever = build_knowledge_retriever(KnowledgeBase.from_text(text), rendering="json")  # type: ignore[arg-type]
+    retriever.min_score = 0.5
+    result = retriever.retrieve("Can I pay with PayPal?")
+
+    assert isinstance(retriever.sections, CompiledSections)
+    assert result.section_ids == ("payment",)
+    assert list(retriever.sections._decoded) == [0]  # noqa: SLF001
+    assert "full_text" not in vars(retriever)
+    assert retriever.retrieve("").context == text
+
+
+@pytest.mark.parametrize(
+    ("artifact", "rendering", "compiled"),
+    [
+        ({}, "json", True),
+        ({"rendering": "compact"}, "json", False),
+        ({"max_chars": 100}, "json", False),
+        ({"knowledge_base": edited(("payment", "currency"), "EUR")}, "json", False),
+    ],
+)
+def test_retriever_falls_back_to_runtime_indexing_on_a_mismatch(
+    artifact: dict[str, Any],
+    rendering: str,
+    compiled: bool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    text = source(artifact.pop("knowledge_base", KNOWLEDGE_BASE))
+    artifact_kb = CompiledKnowledgeBase(build_artifact(text, **artifact)[0])
+    monkeypatch.setattr(retrieval, "load_compiled_knowledge_base", lambda: artifact_kb)
+
+    retriever = build_knowledge_retriever(KnowledgeBase.from_text(source()), rendering=rendering)  # type: ignore[arg-type]
+
+    assert isinstance(retriever.sections, CompiledSections) is compiled
+    assert list(retriever.sections) == split_sections(KNOWLEDGE_BASE, rendering=rendering)
+    assert retriever.search("transactions currency")[0][0].content == KNOWLEDGE_BASE["payment"]
+
+
+@pytest.mark.parametrize(
+    ("data", "loaded"),
+    [
+        (None, False),  # missing
+        (b"", False),
+        (b"not an artifact", False),
+        (HEADER_STRUCT.pack(ARTIFACT_MAGIC, 2, 2) + b"{}", False),  # older format
+        (HEADER_STRUCT.pack(ARTIFACT_MAGIC, 3, 100) + b"{}", False),  # truncated
+        (dump_artifact({"version": "v1"}, b""), False),
+        (build_artifact(source())[0], True),
+    ],
+)
+def test_load_compiled_knowledge_base(data: bytes | None, loaded: bool, tmp_path: Path) -> None:
+    path = tmp_path / "kb.kb"
+    if data is not None:
+        path.write_bytes(data)
+
+    compiled = load_compiled_knowledge_base(path)
+
+    assert (compiled is not None) is loaded
+    if compiled is not None:
+        compiled.close()
+
+
+@pytest.mark.parametrize(
+    ("knowledge_base", "previous", "reused"),
+    [
+        (KNOWLEDGE_BASE, {}, 3),
+        (edited(("payment", "currency"), "Transactions are processed in EUR"), {}, 2),
+        (edited(("coverage", "countries"), "Japan"), {}, 2),
+        (KNOWLEDGE_BASE, {"rendering": "compact"}, 0),
+        (KNOWLEDGE_BASE, {"max_chars": 100}, 0),
+    ],
+)
+def test_incremental_build_reuses_the_unchanged_chunks(
+    knowledge_base: dict[str, Any],
+    previous: dict[str, Any],
+    reused: int,
+) -> None:
+    old = CompiledKnowledgeBase(build_artifact(source(), **{"rendering": "json", **previous})[0])
+
+    artifact, stats = build_artifact(source(knowledge_base), old, rendering="json")
+
+    assert stats.chunks == len(split_sections(knowledge_base))
+    assert stats.reused == reused
+    # reused chunks give the same artifact as a build from scratch
+    assert artifact == build_artifact(source(knowledge_base), rendering="json")[0]
+
+
+def test_compile_knowledge_base_replaces_the_artifact(tmp_path: Path) -> None:
+    source_path = tmp_path / "knowledge_base.json"
+    artifact_path = tmp_path / "knowledge_base.kb"
+    source_path.write_text(source(), encoding="utf-8")
+
+    first = compile_knowledge_base(source_path, artifact_path)
+    source_path.write_text(source(edited(("installation", "steps"), "Open the link")), encoding="utf-8")
+    second = compile_knowledge_base(source_path, artifact_path)
+
+    assert (first.reused, second.reused) == (0, 2)
+    assert second.size == artifact_path.stat().st_size
+    assert not artifact_path.with_suffix(".kb.tmp").exists()
+    compiled = load_compiled_knowledge_base(artifact_path)
+    assert compiled is not None
+    assert compiled.version == second.version != first.version
+    compiled.close()
+
+
+def test_header_holds_no_chunk_text() -> None:
+    artifact, _ = build_artifact(source())
+    _, _, header_length = HEADER_STRUCT.unpack_from(artifact)
+    header = artifact[HEADER_STRUCT.size : HEADER_STRUCT.size + header_length]
+
+    assert b"PayPal" not in header
+    assert b"installation" in header
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import random
+
+import pytest
+
+from bot.services.conversation import (
+    SUMMARY_HEADER,
+    SUMMARY_QUESTION_CHARS,
+    Conversation,
+    is_follow_up,
+    shorten,
+    truncate_to_tokens,
+)
+from bot.services.prompt import ChatTurn
+from bot.utils.tokens import estimate_tokens
+
+WORDS = ("esim", "installation", "Привет", "пополнить", "你好世界", "充值", "12345", "https://globustele.com/#x-topup")
+
+
+def random_text(rng: random.Random, max_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, max_words)))
+
+
+@pytest.mark.parametrize(
+    ("text", "max_chars", "expected"),
+    [
+        ("short question", 20, "short question"),
+        ("  spaces\n and   lines ", 20, "spaces and lines"),
+        ("How do I install the eSIM on my phone?", 10, "How do I…"),
+    ],
+)
+def test_shorten(text: str, max_chars: int, expected: str) -> None:
+    assert shorten(text, max_chars) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["installation " * 300, "Привет 你好 installation " * 200, "1234567890" * 300],
+    ids=["latin", "mixed", "digits"],
+)
+@pytest.mark.parametrize("max_tokens", [1, 2, 10, 50, 400])
+def test_truncate_to_tokens_fits(text: str, max_tokens: int) -> None:
+    truncated = truncate_to_tokens(text, max_tokens)
+
+    assert estimate_tokens(truncated) <= max_tokens
+    assert truncated.endswith("…")
+
+
+def test_truncate_to_tokens_keeps_a_short_text() -> None:
+    assert truncate_to_tokens("How do I install the eSIM?", 100) == "How do I install the eSIM?"
+
+
+def test_recent_turns_are_kept_verbatim() -> None:
+    conversation = Conversation()
+
+    conversation.remember("How do I install the eSIM?", "Scan the QR code.", max_turns=4, max_tokens=1200)
+    conversation.remember("And on Android?", "Open the SIM settings.", max_turns=4, max_tokens=1200)
+
+    assert conversation.history() == [
+        ChatTurn(role="user", text="How do I install the eSIM?"),
+        ChatTurn(role="assistant", text="Scan the QR code."),
+        ChatTurn(role="user", text="And on Android?"),
+        ChatTurn(role="assistant", text="Open the SIM settings."),
+    ]
+    assert conversation.summary == []
+    assert conversation.questions == 2
+
+
+def test_older_questions_are_folded_into_the_summary() -> None:
+    conversation = Conversation()
+    for idx in range(4):
+        conversation.remember(f"Question {idx}", f"Answer {idx}", max_turns=4, max_tokens=1200)
+
+    history = conversation.history()
+
+    # the answers of the folded turns are dropped, their questions kept
+    assert conversation.summary == ["Question 0", "Question 1"]
+    assert history[0] == ChatTurn(role="user", text=f"{SUMMARY_HEADER}- Question 0\n- Question 1")
+    assert [turn.text for turn in history[1:]] == ["Question 2", "Answer 2", "Question 3", "Answer 3"]
+    assert conversation.questions == 4
+
+
+def test_summary_lines_are_shortened() -> None:
+    conversation = Conversation()
+    conversation.remember("word " * 100, "Answer", max_turns=2, max_tokens=1200)
+    conversation.remember("Question", "Answer", max_turns=2, max_tokens=1200)
+
+    assert len(conversation.summary[0]) == SUMMARY_QUESTION_CHARS
+
+
+def test_oldest_summary_lines_are_dropped_first() -> None:
+    conversation = Conversation()
+    for idx in range(40):
+        conversation.remember(f"Question number {idx} about the eSIM plans", "Answer", max_turns=2, max_tokens=100)
+
+    assert conversation.summary
+    assert conversation.summary[-1] == "Question number 38 about the eSIM plans"
+    assert "Question number 0 about the eSIM plans" not in conversation.summary
+    assert conversation.tokens <= 100
+
+
+def test_long_answer_is_kept_by_its_beginning() -> None:
+    conversation = Conversation()
+
+    conversation.remember("How do I install the eSIM?", "Step. " * 2000, max_turns=6, max_tokens=300)
+
+    assert conversation.turns[-1].text.startswith("Step. Step.")
+    assert conversation.turns[-1].text.endswith("…")
+    assert conversation.tokens <= 300
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_memory_never_exceeds_its_ceiling(seed: int) -> None:
+    rng = random.Random(seed)
+    max_turns, max_tokens = rng.choice([2, 4, 6]), rng.choice([100, 300, 1200])
+    conversation = Conversation()
+
+    for idx in range(rng.randint(1, 15)):
+        question = random_text(rng, 60)
+        conversation.remember(question, random_text(rng, 900), max_turns=max_turns, max_tokens=max_tokens)
+
+        assert conversation.tokens <= max_tokens
+        assert len(conversation.turns) <= max_turns
+        # the latest exchange is always there
+        assert conversation.turns[-2].role == "user"
+        assert conversation.turns[-2].text.startswith(question[:20])
+        assert conversation.questions == idx + 1
+
+
+def test_dumps_and_loads_round_trip() -> None:
+    conversation = Conversation()
+    for idx in range(4):
+        conversation.remember(f"Вопрос {idx}", f"Ответ {idx}", max_turns=2, max_tokens=1200)
+
+    assert Conversation.loads(conversation.dumps()) == conversation
+
+
+@pytest.mark.parametrize(
+    ("question", "follow_up"),
+    [
+        ("How do I install an eSIM on Android?", False),
+        ("Can I use the eSIM in Japan?", False),
+        ("Is there a plan for Japan with calls?", False),
+        ("Do you support iPhone 15?", False),
+        ("¿Cómo instalo la eSIM en Android?", False),
+        ("Как установить eSIM на Android?", False),
+        ("and in Spain?", True),
+        ("What about Germany?", True),
+        ("How long does it last?", True),
+        ("Is it available in Spain?", True),
+        ("How much?", True),
+        ("thanks", True),
+        ("¿Y en España?", True),
+        ("а в испании?", True),
+        ("その料金は？", True),
+    ],
+)
+def test_follow_up_questions(question: str, follow_up: bool) -> None:
+    assert is_follow_up(question) is follow_up
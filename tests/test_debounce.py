@@ -0,0 +1,124 @@
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Chat, Message, Update, User
+
+from bot.middlewares.debounce import DebounceMiddleware
+
+
+class Question(StatesGroup):
+    waiting = State()
+
+
+QUESTION_STATE = Question.waiting.state
+
+
+def make_update(text: str, user_id: int = 1, chat_id: int = 1) -> Update:
+    message = Message(
+        message_id=1,
+        date=datetime.now(tz=timezone.utc),
+        chat=Chat(id=chat_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="User"),
+        text=text,
+    )
+    return Update(update_id=1, message=message)
+
+
+class Handler:
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+
+    async def __call__(self, event: Any, data: dict[str, Any]) -> str:  # noqa: ARG002
+        self.texts.append(event.message.text)
+        return "handled"
+
+
+@pytest.fixture
+def middleware() -> DebounceMiddleware:
+    return DebounceMiddleware(states=[Question.waiting], window=0.05, max_wait=0.5)
+
+
+async def send(
+    middleware: DebounceMiddleware,
+    handler: Handler,
+    updates: list[Update],
+    state: str | None = QUESTION_STATE,
+    gap: float = 0.01,
+) -> list[Any]:
+    tasks = []
+    for update in updates:
+        tasks.append(asyncio.create_task(middleware(handler, update, {"raw_state": state})))
+        await asyncio.sleep(gap)
+    return await asyncio.gather(*tasks)
+
+
+async def test_messages_in_quick_succession_are_merged(middleware: DebounceMiddleware) -> None:
+    handler = Handler()
+
+    results = await send(middleware, handler, [make_update("hi"), make_update("my esim"), make_update("no data")])
+
+    assert handler.texts == ["hi\nmy esim\nno data"]
+    assert results == ["handled", None, None]
+    assert not middleware.pending
+
+
+@pytest.mark.parametrize(
+    ("state", "texts"),
+    [
+        (None, ["hi", "my esim"]),
+        ("Settings:language", ["hi", "my esim"]),
+        (QUESTION_STATE, ["hi\nmy esim"]),
+    ],
+)
+async def test_only_messages_in_the_question_states_are_merged(
+    middleware: DebounceMiddleware,
+    state: str | None,
+    texts: list[str],
+) -> None:
+    handler = Handler()
+
+    await send(middleware, handler, [make_update("hi"), make_update("my esim")], state=state)
+
+    assert handler.texts == texts
+
+
+@pytest.mark.parametrize(
+    "users",
+    [
+        [("/start", 1, 1), ("/help", 1, 1)],
+        [("hi", 1, 1), ("hello", 2, 1)],
+        [("hi", 1, 1), ("hello", 1, 2)],
+    ],
+)
+async def test_commands_and_other_users_are_not_merged(
+    middleware: DebounceMiddleware,
+    users: list[tuple[str, int, int]],
+) -> None:
+    handler = Handler()
+
+    await send(middleware, handler, [make_update(text, user_id, chat_id) for text, user_id, chat_id in users])
+
+    assert sorted(handler.texts) == sorted(text for text, *_ in users)
+
+
+async def test_messages_after_the_window_are_answered_separately(middleware: DebounceMiddleware) -> None:
+    handler = Handler()
+
+    await send(middleware, handler, [make_update("hi"), make_update("my esim")], gap=0.1)
+
+    assert handler.texts == ["hi", "my esim"]
+
+
+async def test_first_message_is_never_held_longer_than_max_wait() -> None:
+    middleware = DebounceMiddleware(states=[Question.waiting], window=0.05, max_wait=0.12)
+    handler = Handler()
+
+    # every message restarts the window, but the first one is answered after max_wait
+    await send(middleware, handler, [make_update(str(idx)) for idx in range(8)], gap=0.03)
+
+    assert len(handler.texts) > 1
+    assert "\n".join(handler.texts) == "\n".join(str(idx) for idx in range(8))
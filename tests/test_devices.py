@@ -0,0 +1,169 @@
+from __future__ import annotations
+from typing import Any
+
+import pytest
+
+from bot.knowledge.devices import DeviceIndex, edit_distance, load_device_entries, normalize_device_text
+from bot.knowledge.intents import IntentMatch
+from bot.services import answers
+
+KNOWLEDGE_BASE: dict[str, Any] = {
+    "compatibility": {
+        "supported_devices": {
+            "apple": {
+                "smartphones": ["iPhone 15 Pro Max", "iPhone 15 Pro", "iPhone 15", "iPhone 13 Mini", "iPhone 13"],
+                "tablets": [
+                    "iPad Pro 11-inch (second generation)",
+                    "iPad Pro 11-inch (first generation)",
+                    "iPad Pro 12.9-inch (fourth generation)",
+                    "iPad Air (third generation)",
+                    "iPad mini (fifth generation)",
+                ],
+            },
+            "android": {
+                "samsung": ["Samsung Galaxy S23", "Samsung Galaxy S23 Ultra", "Samsung Galaxy A54 5G"],
+                "google": ["Google Pixel 7", "Google Pixel 3 (only phones bought with Google Fi)"],
+                "sony": ["Xperia 10 IV"],
+                "other_phones": ["OnePlus 11", "Samsung Galaxy S23"],
+            },
+        },
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def index() -> DeviceIndex:
+    return DeviceIndex(load_device_entries(KNOWLEDGE_BASE))
+
+
+@pytest.mark.parametrize(
+    ("text", "tokens"),
+    [
+        ("iPhone 15 Pro Max", ["iphone", "15", "pro", "max"]),
+        ("ip15 pm", ["iphone", "15", "pro", "max"]),
+        ("S23+", ["s", "23", "plus"]),
+        ("айфон 13 про", ["iphone", "13", "pro"]),
+        ("Xperia 10 IV", ["xperia", "10", "4"]),
+        ("2nd gen", ["2", "gen"]),
+    ],
+)
+def test_normalize_device_text(text: str, tokens: list[str]) -> None:
+    assert normalize_device_text(text) == tokens
+
+
+@pytest.mark.parametrize(
+    ("a", "b", "distance"), [("iphone", "iphone", 0), ("iphnoe", "iphone", 1), ("pixle", "pixel", 1)]
+)
+def test_edit_distance_counts_a_swap_as_one_edit(a: str, b: str, distance: int) -> None:
+    assert edit_distance(a, b) == distance
+
+
+@pytest.mark.parametrize(
+    ("question", "device"),
+    [
+        ("Does iPhone 13 support eSIM?", "iPhone 13"),
+        ("Does the Apple iPhone 13 support eSIM?", "iPhone 13"),
+        ("Does the iphone 13 have esim?", "iPhone 13"),
+        ("is my iphone 15 pro max compatible?", "iPhone 15 Pro Max"),
+        ("ip15 pm supported?", "iPhone 15 Pro Max"),
+        ("Does iPhone 13 Mini support eSIM?", "iPhone 13 Mini"),
+        ("Is the Samsung S23 esim compatible?", "Samsung Galaxy S23"),
+        ("Galaxy S23 Ultra compatible with esim?", "Samsung Galaxy S23 Ultra"),
+        ("Is the Galaxy A54 supported?", "Samsung Galaxy A54 5G"),
+        ("Is the Galaxy A54 5G supported?", "Samsung Galaxy A54 5G"),
+        ("Is the Pixel 7 supported?", "Google Pixel 7"),
+        ("Is the Pixel 3 supported?", "Google Pixel 3 (only phones bought with Google Fi)"),
+        ("Xperia 10 IV compatible?", "Xperia 10 IV"),
+        ("OnePlus 11 supported?", "OnePlus 11"),
+        ("ipad pro 11 2nd gen supported?", "iPad Pro 11-inch (second generation)"),
+        ("Is the iPad Pro 12.9-inch 4th generation supported?", "iPad Pro 12.9-inch (fourth generation)"),
+        ("Поддерживает ли айфон 13 eSIM?", "iPhone 13"),
+        ("Unterstützt das iPhone 13 eSIM?", "iPhone 13"),
+        ("Est-ce que l'iPhone 13 est compatible?", "iPhone 13"),
+        ("iPhone 13 支持 eSIM 吗", "iPhone 13"),
+        ("iPhone 13はeSIMに対応していますか", "iPhone 13"),
+    ],
+)
+def test_supported_device_is_answered(index: DeviceIndex, question: str, device: str) -> None:
+    match = index.answer(question, "en")
+
+    assert match is not None
+    assert match.answer == f"Yes, {device} supports eSIM and works with the GlobusTelecom eSIM."
+    assert match.confidence == 1.0
+
+
+def test_misspelled_device_is_answered_with_lower_confidence(index: DeviceIndex) -> None:
+    match = index.answer("does iphnoe 13 support esim", "en")
+
+    assert match is not None
+    assert "iPhone 13" in match.answer
+    assert match.confidence < 1.0
+
+
+def test_answer_is_in_the_language_of_the_user(index: DeviceIndex) -> None:
+    match = index.answer("Does iPhone 13 support eSIM?", "ru")
+
+    assert match is not None
+    assert match.answer.startswith("Да, iPhone 13")
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # not a compatibility question
+        "iphone 11 installation steps",
+        "iphone 13 esim qr code",
+        "iphone 12 dual sim setup",
+        "Will my iPhone 13 work in Japan?",
+        "samsung s23 apn settings",
+        "iphone 14 top up",
+        # about something else than the device supporting eSIM
+        "iphone 13 esim support in japan",
+        "Does iPhone 13 support eSIM in Japan?",
+        "Is the iPhone 13 supported by the Japan plan?",
+        "Does iPhone 13 support wifi calling?",
+        "Does iphone 13 support 5g?",
+        # a family of which only some generations are listed
+        "ipad pro supported?",
+        "ipad pro 11 supported?",
+        "is ipad mini supported",
+        "Does the iPad Air work?",
+        "Is the iPad Air supported?",
+        # not listed or no device at all
+        "Does iPhone 16 support eSIM?",
+        "xiaomi 14 supported?",
+        "Is esim supported?",
+        "Does my phone support eSIM?",
+        # a problem report
+        "my iphone 13 is not supported",
+        "Why does my iPhone 13 not support eSIM?",
+    ],
+)
+def test_other_questions_are_not_answered(index: DeviceIndex, question: str) -> None:
+    assert index.answer(question, "en") is None
+
+
+DEVICE = IntentMatch(intent="device_compatibility", confidence=1.0, answer="device")
+TOP_UP = IntentMatch(intent="top_up", confidence=1.0, answer="top up")
+
+
+@pytest.mark.parametrize(
+    ("device", "intent", "expected"),
+    [
+        (None, None, None),
+        (DEVICE, None, "device"),
+        (None, TOP_UP, "top up"),
+        (DEVICE, TOP_UP, None),  # "iphone 14 top up" is neither of them
+    ],
+)
+def test_local_answer_of_a_device_or_an_intent(
+    monkeypatch: pytest.MonkeyPatch,
+    device: IntentMatch | None,
+    intent: IntentMatch | None,
+    expected: str | None,
+) -> None:
+    monkeypatch.setattr(answers, "get_banked_answer", lambda *_: None)
+    monkeypatch.setattr(answers, "get_device_answer", lambda *_: device)
+    monkeypatch.setattr(answers, "get_intent_answer", lambda *_: intent)
+
+    assert answers.get_local_answer("question", "en") == expected
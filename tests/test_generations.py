@@ -0,0 +1,164 @@
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from prometheus_client import REGISTRY
+
+from bot.services import circuit_breaker
+from bot.services.circuit_breaker import BreakerState, ErrorInfo
+from bot.services.generations import ChatGenerations, Generation
+from bot.services.llm import LLMProvider
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from tests.conftest import Clock
+
+
+class GatedProvider(LLMProvider):
+    """Answers once ``gate`` is set, records how each request ended."""
+
+    name = "gated"
+    model_name = "gated-1"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate = asyncio.Event()
+        self.started: list[str] = []
+        self.ended: dict[str, str] = {}
+
+    async def request(self, question: str, *_: Any, **__: Any) -> str:
+        self.started.append(question)
+        try:
+            await self.gate.wait()
+        except asyncio.CancelledError:
+            self.ended[question] = "cancelled"
+            raise
+        self.ended[question] = "answered"
+        return f"answer to {question}"
+
+    def classify_error(self, error: Exception) -> ErrorInfo:
+        return ErrorInfo(reason=type(error).__name__, retryable=False)
+
+    async def stream_answer(self, *_: Any, **__: Any) -> AsyncIterator[str]:
+        yield ""
+
+
+@pytest.fixture
+def clock(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> Clock:
+    monkeypatch.setattr(circuit_breaker, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def provider() -> GatedProvider:
+    return GatedProvider()
+
+
+def ask(provider: LLMProvider, question: str) -> Any:
+    async def generate(generation: Generation) -> str:
+        assert not generation.superseded
+        return await provider.answer(question=question, language_code="en")
+
+    return generate
+
+
+async def requested(provider: GatedProvider, *questions: str) -> None:
+    await asyncio.sleep(0.01)
+    assert provider.started == list(questions)
+
+
+def superseded(policy: str) -> float:
+    return REGISTRY.get_sample_value("tgbot_superseded_answers_total", {"policy": policy}) or 0.0
+
+
+@pytest.mark.parametrize(
+    ("policy", "results", "ended", "counted"),
+    [
+        ("cancel", [None, "answer to 2"], {"1": "cancelled", "2": "answered"}, 1),
+        ("discard", [None, "answer to 2"], {"1": "answered", "2": "answered"}, 1),
+        ("keep", ["answer to 1", "answer to 2"], {"1": "answered", "2": "answered"}, 0),
+    ],
+)
+async def test_newer_question_supersedes_the_answer_in_progress(
+    policy: str,
+    results: list[str | None],
+    ended: dict[str, str],
+    counted: int,
+    provider: GatedProvider,
+) -> None:
+    generations = ChatGenerations(policy=policy)
+    before = superseded(policy)
+
+    first = asyncio.create_task(generations.run(1, ask(provider, "1")))
+    await requested(provider, "1")
+    second = asyncio.create_task(generations.run(1, ask(provider, "2")))
+    await requested(provider, "1", "2")
+    provider.gate.set()
+
+    assert await asyncio.gather(first, second) == results
+    assert provider.ended == ended
+    assert superseded(policy) == before + counted
+    assert generations.active == {}
+
+
+@pytest.mark.parametrize("policy", ["cancel", "discard"])
+async def test_chats_do_not_supersede_each_other(policy: str, provider: GatedProvider) -> None:
+    generations = ChatGenerations(policy=policy)
+
+    first = asyncio.create_task(generations.run(1, ask(provider, "1")))
+    await requested(provider, "1")
+    second = asyncio.create_task(generations.run(2, ask(provider, "2")))
+    await requested(provider, "1", "2")
+    assert set(generations.active) == {1, 2}
+    provider.gate.set()
+
+    assert await asyncio.gather(first, second) == ["answer to 1", "answer to 2"]
+
+
+@pytest.mark.parametrize("policy", ["cancel", "discard"])
+async def test_cancelled_update_is_not_swallowed(policy: str, provider: GatedProvider) -> None:
+    generations = ChatGenerations(policy=policy)
+    update = asyncio.create_task(generations.run(1, ask(provider, "1")))
+    await requested(provider, "1")
+
+    update.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await update
+
+    assert provider.ended == {"1": "cancelled"}
+    assert generations.active == {}
+
+
+async def test_cancelled_generation_leaves_a_closed_breaker_as_it_was(provider: GatedProvider) -> None:
+    generations = ChatGenerations(policy="cancel")
+
+    first = asyncio.create_task(generations.run(1, ask(provider, "1")))
+    await requested(provider, "1")
+    second = asyncio.create_task(generations.run(1, ask(provider, "2")))
+    await requested(provider, "1", "2")
+    provider.gate.set()
+    await asyncio.gather(first, second)
+
+    assert provider.breaker.state is BreakerState.CLOSED
+    # the answered request is the only outcome, the cancelled one is neither a success nor a failure
+    assert [ok for _, ok in provider.breaker.outcomes] == [True]
+
+
+async def test_cancelled_probe_lets_the_next_question_probe(provider: GatedProvider, clock: Clock) -> None:
+    for _ in range(provider.breaker.min_requests):
+        provider.breaker.record_failure()
+    clock.now += provider.breaker.open_seconds
+    generations = ChatGenerations(policy="cancel")
+
+    probe = asyncio.create_task(generations.run(1, ask(provider, "1")))
+    await requested(provider, "1")
+    assert provider.breaker.probe_in_flight
+    newer = asyncio.create_task(generations.run(1, ask(provider, "2")))
+    # the cancelled probe let the newer question through instead of rejecting it
+    await requested(provider, "1", "2")
+    provider.gate.set()
+
+    assert await asyncio.gather(probe, newer) == [None, "answer to 2"]
+    assert provider.breaker.state is BreakerState.CLOSED
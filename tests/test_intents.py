@@ -0,0 +1,169 @@
+from __future__ import annotations
+import string
+from typing import Any
+
+import pytest
+
+from bot.knowledge.intents import INTENTS, IntentClassifier, extract_facts, is_filler
+
+KNOWLEDGE_BASE: dict[str, Any] = {
+    "account_management": {"balance_check": [{"method": "USSD", "ussd_code": "*187#"}]},
+    "payment": {
+        "top_up": (
+            "Open https://globustele.com/#x-topup. Enter the IMSI of your eSIM (found in your account dashboard) "
+            "and the amount (minimum is 5 USD). Complete the payment using a bank card."
+        ),
+        "currency": "All transactions are processed in USD.",
+        "balance": "See 'Current Balance' in your personal account dashboard.",
+    },
+    "purchase": (
+        "Choose a plan at https://globustele.com/#x-plan. Click the 'BUY NOW' button and complete the payment with "
+        "your bank card. eSIM details will be available in your personal account dashboard."
+    ),
+    "apn": (
+        "APN (Access Point Name) settings are typically configured automatically. Instructions on how to set your "
+        "APN are included in the eSIM installation instructions SMS."
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def classifier() -> IntentClassifier:
+    return IntentClassifier(INTENTS, extract_facts(KNOWLEDGE_BASE), min_confidence=0.8)
+
+
+def test_facts_are_read_from_the_knowledge_base() -> None:
+    facts = extract_facts(KNOWLEDGE_BASE)
+
+    assert facts["ussd_code"] == "*187#"
+    assert facts["top_up_url"] == "https://globustele.com/#x-topup"
+    assert facts["site"] == "globustele.com"
+    assert facts["top_up_field"] == "IMSI"
+    assert facts["top_up_minimum"] == "5"
+    assert facts["currency"] == "USD"
+    assert facts["buy_button"] == "BUY NOW"
+    assert all(intent.requires <= facts.keys() for intent in INTENTS)
+
+
+@pytest.mark.parametrize("intent", INTENTS, ids=lambda intent: intent.name)
+def test_templates_state_only_knowledge_base_facts(intent: Any) -> None:
+    assert "en" in intent.templates
+    for language, template in intent.templates.items():
+        fields = {field for _, field, _, _ in string.Formatter().parse(template) if field}
+        assert fields <= intent.requires, language
+
+
+@pytest.mark.parametrize(
+    ("question", "intent", "confidence"),
+    [
+        ("How do I check my balance?", "balance", 1.0),
+        ("balance?", "balance", 0.8),
+        ("How can I top up my eSIM?", "top_up", 1.0),
+        ("How do I top up my balance?", "top_up", 1.0),
+        ("Where can I buy an eSIM?", "buy", 1.0),
+        ("How do I buy a new eSIM?", "buy", 1.0),
+        ("How do I set the APN?", "apn", 1.0),
+        ("what is the APN?", "apn", 0.8),
+        ("Как пополнить баланс?", "top_up", 1.0),
+        ("Как узнать баланс?", "balance", 1.0),
+        ("¿Cómo puedo recargar mi eSIM?", "top_up", 1.0),
+        ("Wie kann ich mein Guthaben prüfen?", "balance", 1.0),
+        ("Comment voir mon solde?", "balance", 1.0),
+        ("如何充值", "top_up", 1.0),
+        ("残高を確認する方法", "balance", 1.0),
+        ("APNを設定する方法", "apn", 1.0),
+        ("잔액 확인 방법", "balance", 1.0),
+        ("كيف أشحن رصيدي", "top_up", 1.0),
+    ],
+)
+def test_single_fact_question_is_classified(
+    classifier: IntentClassifier,
+    question: str,
+    intent: str,
+    confidence: float,
+) -> None:
+    result = classifier.classify(question)
+
+    assert result is not None
+    assert (result[0].name, result[1]) == (intent, confidence)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # about the fact, but not answered by it
+        "Is my balance in USD or EUR?",
+        "Does the balance expire?",
+        "what is the minimum balance?",
+        "Can I get a refund of my balance?",
+        "Can I buy more data for Japan?",
+        "Can I order a physical SIM card?",
+        "how much does it cost to top up with crypto?",
+        "How do I top up someone else's eSIM?",
+        "残高の有効期限はありますか",
+        "データを追加購入する方法",
+        # a problem needs troubleshooting
+        "Why can't I top up?",
+        "top up error",
+        "My balance is wrong",
+        "пополнил баланс, ошибка",
+        "残高が確認できない",
+        # several things at once
+        "How do I buy and set the APN?",
+        # no intent at all
+        "How do I install the eSIM?",
+        "hello",
+        "",
+    ],
+)
+def test_other_questions_are_not_classified(classifier: IntentClassifier, question: str) -> None:
+    assert classifier.classify(question) is None
+
+
+def test_answer_is_filled_with_the_knowledge_base_facts(classifier: IntentClassifier) -> None:
+    match = classifier.answer("How can I top up my eSIM?", "en")
+
+    assert match is not None
+    assert "https://globustele.com/#x-topup" in match.answer
+    assert "IMSI" in match.answer
+    assert "minimum 5 USD" in match.answer
+
+
+def test_answer_follows_a_knowledge_base_change() -> None:
+    knowledge_base = {**KNOWLEDGE_BASE, "payment": {**KNOWLEDGE_BASE["payment"]}}
+    knowledge_base["payment"]["top_up"] = knowledge_base["payment"]["top_up"].replace("minimum is 5", "minimum is 10")
+    classifier = IntentClassifier(INTENTS, extract_facts(knowledge_base))
+
+    match = classifier.answer("How can I top up my eSIM?", "en")
+
+    assert match is not None
+    assert "minimum 10 USD" in match.answer
+
+
+@pytest.mark.parametrize(("language_code", "start"), [("ru", "Чтобы"), ("xx", "To check")])
+def test_answer_in_the_language_of_the_user(classifier: IntentClassifier, language_code: str, start: str) -> None:
+    match = classifier.answer("How do I check my balance?", language_code)
+
+    assert match is not None
+    assert match.answer.startswith(start)
+
+
+def test_intent_without_its_facts_is_not_answered() -> None:
+    classifier = IntentClassifier(INTENTS, {"ussd_code": "*187#"})
+
+    assert classifier.answer("How do I check my balance?", "en") is None
+
+
+def test_bare_keyword_below_the_confidence_is_not_answered() -> None:
+    classifier = IntentClassifier(INTENTS, extract_facts(KNOWLEDGE_BASE), min_confidence=0.9)
+
+    assert classifier.answer("balance?", "en") is None
+    assert classifier.answer("How do I check my balance?", "en") is not None
+
+
+@pytest.mark.parametrize(
+    ("word", "expected"),
+    [("please", True), ("how", True), ("esim", True), ("japan", False), ("请问", True), ("日本", False), ("を", True)],
+)
+def test_is_filler(word: str, expected: bool) -> None:
+    assert is_filler(word) is expected
@@ -0,0 +1,171 @@
+from __future__ import annotations
+import asyncio
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from prometheus_client import REGISTRY
+from typing_extensions import Self
+
+from bot.services import circuit_breaker
+from bot.services.circuit_breaker import BreakerState, ErrorInfo
+from bot.services.gemini import GeminiClient
+from bot.services.llm import LLMProvider
+from bot.services.openai import OpenAIClient
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from tests.conftest import Clock
+
+
+class HangingProvider(LLMProvider):
+    """Requests that never finish until they are cancelled."""
+
+    name = "hanging"
+    model_name = "hanging-1"
+
+    async def request(self, *_: Any, **__: Any) -> str:
+        await asyncio.Event().wait()
+        return "never"
+
+    def classify_error(self, error: Exception) -> ErrorInfo:
+        return ErrorInfo(reason=type(error).__name__, retryable=True)
+
+    async def stream_answer(self, *_: Any, **__: Any) -> AsyncIterator[str]:
+        yield "never"
+
+
+class FakeOpenAIStream:
+    def __init__(self, deltas: list[str]) -> None:
+        self.deltas = deltas
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *_: object) -> None:
+        return None
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        for delta in self.deltas:
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+
+class FakeGeminiModel:
+    def __init__(self, deltas: list[str]) -> None:
+        self.deltas = deltas
+
+    async def generate_content_async(self, *_: Any, **__: Any) -> AsyncIterator[Any]:
+        async def chunks() -> AsyncIterator[Any]:
+            for delta in self.deltas:
+                yield SimpleNamespace(text=delta, usage_metadata=None)
+
+        return chunks()
+
+
+@pytest.fixture
+def clock(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> Clock:
+    monkeypatch.setattr(circuit_breaker, "monotonic", clock)
+    return clock
+
+
+def open_breaker(provider: LLMProvider, clock: Clock) -> None:
+    for _ in range(provider.breaker.min_requests):
+        provider.breaker.record_failure()
+    assert provider.breaker.state is BreakerState.OPEN
+    clock.now += provider.breaker.open_seconds
+
+
+def make_provider(name: str, deltas: list[str], monkeypatch: pytest.MonkeyPatch) -> LLMProvider:
+    if name == "openai":
+        openai = OpenAIClient(api_key="test")
+
+        async def create(**_: Any) -> FakeOpenAIStream:
+            return FakeOpenAIStream(deltas)
+
+        monkeypatch.setattr(openai.client.chat.completions, "create", create)
+        return openai
+
+    gemini = GeminiClient(api_key="test")
+    monkeypatch.setattr(gemini, "get_model", lambda _tier: FakeGeminiModel(deltas))
+    return gemini
+
+
+def rejections(provider: str) -> float:
+    return REGISTRY.get_sample_value("tgbot_llm_breaker_rejections_total", {"provider": provider}) or 0.0
+
+
+async def test_cancelled_probe_lets_the_next_request_probe(clock: Clock) -> None:
+    provider = HangingProvider()
+    open_breaker(provider, clock)
+
+    probe = asyncio.create_task(provider.answer(question="balance?", language_code="en"))
+    await asyncio.sleep(0)
+    assert provider.breaker.probe_in_flight
+    assert not provider.breaker.allow_request()
+
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert provider.breaker.state is BreakerState.HALF_OPEN
+    assert not provider.breaker.probe_in_flight
+    assert provider.breaker.allow_request()
+
+
+async def test_cancelled_request_of_a_closed_breaker_does_not_release_a_probe(clock: Clock) -> None:
+    provider = HangingProvider()
+    request = asyncio.create_task(provider.answer(question="balance?", language_code="en"))
+    await asyncio.sleep(0)
+    # the breaker opens while the request is in flight and lets another request probe
+    open_breaker(provider, clock)
+    assert provider.breaker.allow_request()
+
+    request.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await request
+
+    assert provider.breaker.probe_in_flight
+
+
+@pytest.mark.parametrize("name", ["openai", "gemini"])
+async def test_stream_closed_by_the_reader_releases_the_probe(
+    name: str,
+    clock: Clock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    provider = make_provider(name, ["Dial ", "*100#"], monkeypatch)
+    open_breaker(provider, clock)
+
+    stream = provider.stream_answer(question="balance?", language_code="en")
+    assert await anext(stream) == "Dial "
+    assert provider.breaker.probe_in_flight
+    await stream.aclose()  # type: ignore[attr-defined]
+
+    assert not provider.breaker.probe_in_flight
+    assert provider.breaker.allow_request()
+
+
+@pytest.mark.parametrize("name", ["openai", "gemini"])
+async def test_completed_stream_closes_the_breaker(name: str, clock: Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    provider = make_provider(name, ["Dial ", "*100#"], monkeypatch)
+    open_breaker(provider, clock)
+
+    assert [delta async for delta in provider.stream_answer(question="balance?", language_code="en")] == [
+        "Dial ",
+        "*100#",
+    ]
+
+    assert provider.breaker.state is BreakerState.CLOSED
+
+
+@pytest.mark.parametrize("name", ["openai", "gemini"])
+async def test_rejected_stream_is_counted(name: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    provider = make_provider(name, ["Dial ", "*100#"], monkeypatch)
+    for _ in range(provider.breaker.min_requests):
+        provider.breaker.record_failure()
+    before = rejections(name)
+
+    assert [delta async for delta in provider.stream_answer(question="balance?", language_code="en")] == []
+
+    assert rejections(name) == before + 1
@@ -0,0 +1,108 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from bot.cache import redis as redis_cache
+from bot.cache.redis import LocalCaches, cached
+
+if TYPE_CHECKING:
+    from tests.conftest import Clock, FakeRedis
+
+
+@pytest.fixture
+def clock(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> Clock:
+    monkeypatch.setattr(redis_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch: pytest.MonkeyPatch, redis: FakeRedis) -> None:
+    monkeypatch.setattr(redis_cache, "redis_client", redis)
+    monkeypatch.setattr(redis_cache, "local_caches", LocalCaches(ttl=60, maxsize=100))
+
+
+def make_profile(redis: FakeRedis, ttl: int) -> Any:
+    calls: list[int] = []
+
+    @cached(ttl=ttl, cache=redis, local=True)  # type: ignore[arg-type]
+    async def get_profile(user_id: int) -> dict[str, int]:
+        calls.append(user_id)
+        return {"id": user_id, "version": len(calls)}
+
+    get_profile.calls = calls  # type: ignore[attr-defined]
+    return get_profile
+
+
+async def test_local_hit_does_not_read_redis(redis: FakeRedis) -> None:
+    get_profile = make_profile(redis, ttl=10)
+
+    assert await get_profile(1) == {"id": 1, "version": 1}
+    reads = redis.calls["get"]
+    assert await get_profile(1) == {"id": 1, "version": 1}
+
+    assert redis.calls["get"] == reads
+    assert get_profile.calls == [1]
+
+
+async def test_computed_value_expires_locally_with_the_decorator_ttl(redis: FakeRedis, clock: Clock) -> None:
+    get_profile = make_profile(redis, ttl=10)
+    await get_profile(1)
+
+    clock.now += 9
+    reads = redis.calls["get"]
+    await get_profile(1)
+    assert redis.calls["get"] == reads
+
+    clock.now += 2
+    assert await get_profile(1) == {"id": 1, "version": 2}
+
+
+@pytest.mark.parametrize(("redis_ttl", "local_expiry"), [(3, 3), (30, 30), (600, 60)])
+async def test_value_read_from_redis_expires_locally_no_later_than_there(
+    redis: FakeRedis,
+    clock: Clock,
+    redis_ttl: int,
+    local_expiry: int,
+) -> None:
+    # computed by another replica, the remaining Redis TTL caps the local entry
+    writer = make_profile(redis, ttl=10_000)
+    await writer(1)
+    key = next(iter(redis.values))
+    redis.values[key] = (redis.values[key][0], clock() + redis_ttl)
+    reader = make_profile(redis, ttl=10_000)
+
+    await reader(1)
+    reads = redis.calls["get"]
+    clock.now += local_expiry - 0.5
+    await reader(1)
+    assert redis.calls["get"] == reads
+
+    clock.now += 1
+    await reader(1)
+    assert redis.calls["get"] > reads
+
+
+def test_invalidation_drops_the_key_by_its_prefix(clock: Clock) -> None:  # noqa: ARG001
+    local_caches = LocalCaches(ttl=60, maxsize=100)
+    users = local_caches.create("main:users:get_user:")
+    other = local_caches.create("main:users:get_other:")
+    users["main:users:get_user:1"] = ("user", float("inf"))
+    other["main:users:get_other:1"] = ("other", float("inf"))
+
+    local_caches.invalidate("main:users:get_user:1")
+
+    assert "main:users:get_user:1" not in users
+    assert "main:users:get_other:1" in other
+    local_caches.clear()
+    assert not other
+
+
+def test_local_entry_never_outlives_the_local_ttl(clock: Clock) -> None:
+    cache = LocalCaches(ttl=60, maxsize=100).create("prefix:")
+    cache["prefix:1"] = ("value", float("inf"))
+
+    clock.now += 59
+    assert "prefix:1" in cache
+    clock.now += 2
+    assert "prefix:1" not in cache
@@ -0,0 +1,133 @@
+from __future__ import annotations
+from typing import Any
+
+import pytest
+
+from bot.knowledge.retrieval import KnowledgeRetriever, RetrievalResult
+from bot.knowledge.sections import split_sections
+from bot.services import prompt
+from bot.services.prompt import MESSAGE_OVERHEAD_TOKENS, ChatTurn, build_prompt, fit_history
+from bot.utils.tokens import estimate_tokens
+
+KNOWLEDGE_BASE: dict[str, Any] = {
+    section: {f"question_{idx}": f"{section.title()} answer number {idx}, " * 8 for idx in range(4)}
+    for section in ("payment", "installation", "coverage", "refunds")
+}
+SYSTEM = "You are the support assistant of an eSIM provider. Answer briefly."
+QUESTION = "How do I pay for the installation?"
+
+
+@pytest.fixture(autouse=True)
+def knowledge_base(monkeypatch: pytest.MonkeyPatch) -> KnowledgeRetriever:
+    retriever = KnowledgeRetriever(sections=split_sections(KNOWLEDGE_BASE), full_text=str(KNOWLEDGE_BASE))
+
+    def get_knowledge_context(
+        question: str, max_tokens: int | None = None, prefer_full: bool = False
+    ) -> RetrievalResult:
+        return retriever.retrieve(question, max_tokens=max_tokens, prefer_full=prefer_full)
+
+    monkeypatch.setattr(prompt, "get_knowledge_context", get_knowledge_context)
+    return retriever
+
+
+def conversation(turns: int) -> list[ChatTurn]:
+    return [
+        ChatTurn(role="user" if idx % 2 == 0 else "assistant", text=f"Message number {idx} about the eSIM plan")
+        for idx in range(turns)
+    ]
+
+
+@pytest.mark.parametrize(
+    ("text", "tokens"),
+    [
+        ("", 0),
+        ("hello", 1),
+        ("installation", 2),
+        ("How do I install the eSIM?", 8),
+        ("12345", 2),
+        ("Привет, как дела?", 7),
+        ("你好世界", 4),
+        ("안녕하세요", 5),
+        ('{"a": 1}', 7),
+        ("line\n    indented", 4),
+    ],
+)
+def test_estimate_tokens(text: str, tokens: int) -> None:
+    assert estimate_tokens(text) == tokens
+
+
+@pytest.mark.parametrize("text", ["How do I install the eSIM?", "Привет, как дела?", "你好世界", '{"a": [1, 2]}'])
+def test_estimate_tokens_grows_with_the_text(text: str) -> None:
+    assert estimate_tokens(text * 3) >= 3 * estimate_tokens(text) - 2
+
+
+@pytest.mark.parametrize(
+    ("turns", "max_tokens", "kept"),
+    [
+        (0, 100, 0),
+        (4, 0, 0),
+        (4, 1000, 4),
+        (10, 30, 2),  # every turn costs 12 tokens
+        (10, 11, 0),
+    ],
+)
+def test_fit_history_keeps_the_most_recent_turns(turns: int, max_tokens: int, kept: int) -> None:
+    history = conversation(turns)
+
+    fitted, used = fit_history(history, max_tokens)
+
+    assert fitted == history[len(history) - kept :]
+    assert used == sum(estimate_tokens(turn.text) + MESSAGE_OVERHEAD_TOKENS for turn in fitted)
+    assert used <= max_tokens
+
+
+@pytest.mark.parametrize("budget", [150, 300, 600, 1000, 4000])
+@pytest.mark.parametrize("turns", [0, 3, 40])
+def test_prompt_never_exceeds_the_budget(budget: int, turns: int) -> None:
+    result = build_prompt("model", SYSTEM, QUESTION, QUESTION, history=conversation(turns), budget=budget)
+
+    assert result.tokens <= budget
+    assert result.budget == budget
+    assert result.system == SYSTEM
+    assert result.question == QUESTION
+
+
+def test_history_gets_a_share_of_the_free_budget() -> None:
+    budget = 1000
+    result = build_prompt("model", SYSTEM, QUESTION, QUESTION, history=conversation(40), budget=budget)
+
+    history_tokens = sum(estimate_tokens(turn.text) + MESSAGE_OVERHEAD_TOKENS for turn in result.history)
+    assert 0 < history_tokens <= budget * prompt.HISTORY_SHARE
+    assert result.history[-1] == conversation(40)[-1]
+    assert result.knowledge_base
+
+
+def test_relevant_sections_fill_the_rest_of_the_budget(knowledge_base: KnowledgeRetriever) -> None:
+    result = build_prompt("model", SYSTEM, QUESTION, QUESTION, budget=knowledge_base.full_tokens // 2)
+
+    assert result.knowledge_base
+    assert result.knowledge_base != knowledge_base.full_text
+    assert "Installation" in result.knowledge_base
+
+
+def test_full_knowledge_base_is_sent_when_it_fits(knowledge_base: KnowledgeRetriever) -> None:
+    result = build_prompt("model", SYSTEM, "hello", "hello", budget=knowledge_base.full_tokens * 2)
+
+    assert result.knowledge_base == knowledge_base.full_text
+
+
+def test_instructions_and_question_are_sent_over_the_budget() -> None:
+    result = build_prompt("model", SYSTEM, QUESTION, QUESTION, history=conversation(3), budget=10)
+
+    assert result.system == SYSTEM
+    assert result.question == QUESTION
+    assert result.history == ()
+    assert result.knowledge_base == ""
+    assert result.tokens > result.budget
+
+
+def test_budget_of_the_model(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(prompt.settings, "LLM_PROMPT_TOKEN_BUDGETS", {"large": 12000})
+
+    assert prompt.get_token_budget("large") == 12000
+    assert prompt.get_token_budget("other") == prompt.settings.LLM_PROMPT_TOKEN_BUDGET
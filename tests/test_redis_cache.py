@@ -0,0 +1,355 @@
+from __future__ import annotations
+import asyncio
+import math
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from bot.cache import redis as redis_cache
+from bot.cache.redis import CachedFunction, should_refresh_early
+from bot.cache.serialization import VersionedSerializer
+
+if TYPE_CHECKING:
+    from tests.conftest import Clock, FakeRedis
+
+KEY = "main:tests:lookup:1:"
+TTL = 10
+
+
+class Random:
+    """Fixed draws of ``random.random()`` for the XFetch decision."""
+
+    def __init__(self, value: float = 0.0) -> None:
+        self.value = value
+
+    def random(self) -> float:
+        return self.value
+
+
+class Backend:
+    """The cached function: every call costs ``cost`` seconds on the clock and may wait for ``gate``."""
+
+    def __init__(self, clock: Clock, cost: float = 1.0) -> None:
+        self.clock = clock
+        self.cost = cost
+        self.calls = 0
+        self.gate: asyncio.Event | None = None
+
+    async def __call__(self, user_id: int) -> str:
+        self.calls += 1
+        self.clock.now += self.cost
+        if self.gate is not None:
+            await self.gate.wait()
+        return f"user {user_id} v{self.calls}"
+
+
+@pytest.fixture
+def clock(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> Clock:
+    monkeypatch.setattr(redis_cache, "time", clock)
+    monkeypatch.setattr(redis_cache, "perf_counter", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def redis_client(redis: FakeRedis, monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    monkeypatch.setattr(redis_cache, "redis_client", redis)
+    return redis
+
+
+@pytest.fixture
+def draws(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> Random:
+    draws = Random(getattr(request, "param", 0.0))
+    monkeypatch.setattr(redis_cache, "random", SimpleNamespace(random=draws.random))
+    return draws
+
+
+@pytest.fixture
+def backend(clock: Clock) -> Backend:
+    return Backend(clock)
+
+
+def make_cached(redis: FakeRedis, backend: Backend, **kwargs: Any) -> CachedFunction:
+    return CachedFunction(func=backend, cache=redis, serializer=VersionedSerializer(), ttl=TTL, **kwargs)  # type: ignore[arg-type]
+
+
+@pytest.fixture
+def cached_function(request: pytest.FixtureRequest, redis: FakeRedis, backend: Backend) -> CachedFunction:
+    return make_cached(redis, backend, **request.param)
+
+
+async def get(cached_function: CachedFunction) -> Any:
+    return await cached_function.get(KEY, (1,), {})
+
+
+def recomputations(reason: str) -> float:
+    return REGISTRY.get_sample_value("tgbot_cache_recomputations_total", {"reason": reason}) or 0.0
+
+
+def lookups(result: str) -> float:
+    return REGISTRY.get_sample_value("tgbot_cache_requests_total", {"layer": "redis", "result": result}) or 0.0
+
+
+@pytest.mark.parametrize(
+    ("delta", "remaining", "beta", "draws", "expected"),
+    [
+        (1.0, 0.5, 1.0, 0.0, False),  # a zero draw refreshes only at the expiry
+        (1.0, 0.0, 1.0, 0.0, True),
+        (1.0, -1.0, 1.0, 0.0, True),
+        (1.0, 0.5, 1.0, 0.5, True),  # -ln(0.5) = 0.69 seconds ahead
+        (1.0, 0.7, 1.0, 0.5, False),
+        (1.0, 0.7, 2.0, 0.5, True),  # a higher beta refreshes earlier
+        (2.0, 1.3, 1.0, 0.5, True),  # so does a costlier recomputation
+        (0.0, 0.001, 1.0, 0.999, False),  # a free recomputation is never early
+        (1.0, 6.0, 1.0, 0.999, True),  # -ln(0.001) = 6.9 seconds ahead
+    ],
+    indirect=["draws"],
+)
+@pytest.mark.usefixtures("draws")
+def test_should_refresh_early(delta: float, remaining: float, beta: float, expected: bool) -> None:
+    now = 1_700_000_000.0
+
+    assert should_refresh_early(delta, now + remaining, beta, now) is expected
+
+
+@pytest.mark.parametrize("cached_function", [{"early_refresh": 1.0}], indirect=True)
+@pytest.mark.parametrize(
+    ("elapsed", "draws", "reason"),
+    [
+        (5.0, 0.5, None),  # 5 seconds left, refreshed at most 0.69 seconds ahead
+        (9.5, 0.0, None),
+        (9.5, 0.5, "early"),
+        (10.0, 0.0, "miss"),  # without a stale window Redis expires it too
+    ],
+    indirect=["draws"],
+)
+@pytest.mark.usefixtures("draws")
+async def test_early_refresh_recomputes_shortly_before_the_expiry(
+    elapsed: float,
+    reason: str | None,
+    clock: Clock,
+    cached_function: CachedFunction,
+) -> None:
+    assert await get(cached_function) == "user 1 v1"
+    before = {name: recomputations(name) for name in ("early", "stale", "miss")}
+
+    clock.now += elapsed
+
+    assert await get(cached_function) == ("user 1 v1" if reason is None else "user 1 v2")
+    assert {name: recomputations(name) - before[name] for name in before} == {
+        name: float(name == reason) for name in before
+    }
+
+
+async def test_value_stores_its_recomputation_time_and_logical_expiry(
+    redis: FakeRedis,
+    clock: Clock,
+    backend: Backend,
+) -> None:
+    cached_function = make_cached(redis, backend, stale_ttl=30)
+    await get(cached_function)
+
+    payload, delta, expires_at = redis_cache.unpack_entry(redis.values[KEY][0])
+
+    assert (delta, expires_at) == (1.0, clock.now + TTL)
+    assert redis.values[KEY][1] == clock.now + TTL + 30
+    assert cached_function.serializer.deserialize(payload) == "user 1 v1"
+
+
+async def test_stale_value_is_served_while_one_caller_recomputes(
+    redis: FakeRedis,
+    clock: Clock,
+    backend: Backend,
+) -> None:
+    cached_function = make_cached(redis, backend, stale_ttl=30)
+    await get(cached_function)
+    clock.now += TTL + 5
+    backend.gate = asyncio.Event()
+
+    refreshing = asyncio.create_task(get(cached_function))
+    await asyncio.sleep(0)
+    assert backend.calls == 2
+    # served without waiting, the recomputation is already running
+    assert await get(cached_function) == "user 1 v1"
+    assert await get(cached_function) == "user 1 v1"
+
+    backend.gate.set()
+    assert await refreshing == "user 1 v2"
+    assert await get(cached_function) == "user 1 v2"
+    assert backend.calls == 2
+    assert not redis.locks
+
+
+async def test_value_past_the_stale_window_is_a_miss(redis: FakeRedis, clock: Clock, backend: Backend) -> None:
+    cached_function = make_cached(redis, backend, stale_ttl=30)
+    await get(cached_function)
+    clock.now += TTL + 30
+    misses = recomputations("miss")
+
+    assert await get(cached_function) == "user 1 v2"
+    assert recomputations("miss") == misses + 1
+
+
+async def test_stale_value_is_served_while_another_replica_recomputes(
+    redis: FakeRedis,
+    clock: Clock,
+    backend: Backend,
+) -> None:
+    cached_function = make_cached(redis, backend, stale_ttl=30)
+    await get(cached_function)
+    clock.now += TTL + 5
+    redis.locks.add(f"lock:{KEY}")
+
+    assert await get(cached_function) == "user 1 v1"
+    assert backend.calls == 1
+    assert redis.locks == {f"lock:{KEY}"}
+
+
+async def test_recompute_without_a_redis_lock_recomputes_anyway(
+    redis: FakeRedis,
+    clock: Clock,
+    backend: Backend,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    cached_function = make_cached(redis, backend, stale_ttl=30)
+    await get(cached_function)
+    clock.now += TTL + 5
+
+    async def acquire(**_: Any) -> bool:
+        raise RedisConnectionError
+
+    monkeypatch.setattr(redis, "lock", lambda *_, **__: SimpleNamespace(acquire=acquire))
+
+    assert await cached_function.recompute(KEY, (1,), {}, "stale") == "user 1 v2"
+    assert backend.calls == 2
+
+
+async def test_recompute_skips_a_key_this_process_already_recomputes(redis: FakeRedis, backend: Backend) -> None:
+    cached_function = make_cached(redis, backend, stale_ttl=30)
+    held = cached_function.locks.setdefault(KEY, asyncio.Lock())
+
+    async with held:
+        assert await cached_function.recompute(KEY, (1,), {}, "stale") is redis_cache._MISSING  # noqa: SLF001
+
+    assert backend.calls == 0
+
+
+async def test_concurrent_misses_compute_once(redis: FakeRedis, backend: Backend) -> None:
+    cached_function = make_cached(redis, backend, lock=True)
+    backend.gate = asyncio.Event()
+    waited = lookups("hit_after_wait")
+
+    callers = [asyncio.create_task(get(cached_function)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    assert backend.calls == 1
+    backend.gate.set()
+
+    assert await asyncio.gather(*callers) == ["user 1 v1"] * 5
+    assert backend.calls == 1
+    assert lookups("hit_after_wait") == waited + 4
+    assert not redis.locks
+
+
+async def test_concurrent_misses_of_two_replicas_compute_once(redis: FakeRedis, clock: Clock) -> None:
+    backend = Backend(clock)
+    backend.gate = asyncio.Event()
+    replicas = [make_cached(redis, backend, lock=True) for _ in range(2)]
+
+    callers = [asyncio.create_task(get(replica)) for replica in replicas]
+    await asyncio.sleep(0.01)
+    assert redis.locks == {f"lock:{KEY}"}
+    backend.gate.set()
+
+    assert await asyncio.gather(*callers) == ["user 1 v1"] * 2
+    assert backend.calls == 1
+
+
+async def test_lock_wait_times_out_and_computes(
+    redis: FakeRedis,
+    backend: Backend,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(redis_cache, "LOCK_TIMEOUT", 0.01)
+    cached_function = make_cached(redis, backend, lock=True)
+    redis.locks.add(f"lock:{KEY}")  # held by a replica that died
+
+    assert await get(cached_function) == "user 1 v1"
+    # the lock of the other replica is left to expire
+    assert redis.locks == {f"lock:{KEY}"}
+
+
+async def test_lock_failure_computes_anyway(
+    redis: FakeRedis,
+    backend: Backend,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    cached_function = make_cached(redis, backend, lock=True)
+
+    async def acquire(**_: Any) -> bool:
+        raise RedisConnectionError
+
+    monkeypatch.setattr(redis, "lock", lambda *_, **__: SimpleNamespace(acquire=acquire))
+
+    assert await get(cached_function) == "user 1 v1"
+    assert backend.calls == 1
+
+
+@pytest.mark.parametrize(
+    ("cached_function", "elapsed", "calls"),
+    [
+        ({"lock": True}, 0.0, 1),
+        ({"stale_ttl": 30}, TTL + 5.0, 2),
+        ({"early_refresh": 1.0}, TTL - 0.5, 2),
+    ],
+    indirect=["cached_function"],
+)
+@pytest.mark.parametrize("draws", [0.5], indirect=True)
+@pytest.mark.usefixtures("draws")
+async def test_key_locks_are_dropped_once_unused(
+    cached_function: CachedFunction,
+    elapsed: float,
+    calls: int,
+    clock: Clock,
+    backend: Backend,
+) -> None:
+    await get(cached_function)
+    clock.now += elapsed
+
+    await get(cached_function)
+
+    assert backend.calls == calls
+    assert len(cached_function.locks) == 0
+
+
+async def test_value_is_stored_in_the_redis_of_the_function(redis: FakeRedis, clock: Clock, backend: Backend) -> None:
+    other = type(redis)(clock)
+    cached_function = make_cached(other, backend)
+
+    await get(cached_function)
+
+    assert KEY in other.values
+    assert not redis.values
+
+
+@pytest.mark.parametrize(
+    ("ttl", "expires_in"),
+    [
+        (10, 10.0),
+        (timedelta(minutes=1), 60.0),
+        (None, math.inf),
+        (0, math.inf),
+    ],
+)
+async def test_set_redis_value_is_a_single_set(
+    ttl: int | timedelta | None,
+    expires_in: float,
+    redis: FakeRedis,
+    clock: Clock,
+) -> None:
+    await redis_cache.set_redis_value("key", b"value", ttl=ttl)
+
+    assert redis.calls == {"set": 1}
+    assert redis.values["key"] == (b"value", clock.now + expires_in)
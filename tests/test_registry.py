@@ -0,0 +1,149 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import orjson
+import pytest
+
+from bot.knowledge.registry import (
+    KB_REDIS_KEY,
+    KB_VERSIONS_KEY,
+    KnowledgeBase,
+    KnowledgeBaseRegistry,
+    knowledge_base_version,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tests.conftest import FakeRedis
+
+OLD = orjson.dumps({"payment": "Pay with a bank card"}).decode()
+NEW = orjson.dumps({"payment": "Pay with a bank card or PayPal"}).decode()
+
+
+def make_registry(tmp_path: Path, text: str | None) -> KnowledgeBaseRegistry:
+    path = tmp_path / "knowledge_base.json"
+    if text is not None:
+        path.write_text(text, encoding="utf-8")
+    return KnowledgeBaseRegistry(path=path, poll_interval=0.01)
+
+
+async def publish(redis: FakeRedis, text: str) -> None:
+    knowledge_base = KnowledgeBase.from_text(text)
+    assert knowledge_base is not None
+    await KnowledgeBaseRegistry().publish(redis, knowledge_base)  # type: ignore[arg-type]
+
+
+async def test_first_replica_publishes_its_knowledge_base(tmp_path: Path, redis: FakeRedis) -> None:
+    registry = make_registry(tmp_path, OLD)
+
+    await registry.sync(redis)  # type: ignore[arg-type]
+
+    assert redis.hashes[KB_REDIS_KEY][b"version"].decode() == knowledge_base_version(OLD)
+    assert redis.published == [knowledge_base_version(OLD)]
+    assert registry.revision == 1
+
+
+async def test_replica_with_the_published_version_takes_its_revision(tmp_path: Path, redis: FakeRedis) -> None:
+    await publish(redis, OLD)
+    await publish(redis, OLD)
+    registry = make_registry(tmp_path, OLD)
+
+    await registry.sync(redis)  # type: ignore[arg-type]
+
+    assert registry.revision == 2
+    assert len(redis.published) == 2
+
+
+async def test_deployed_knowledge_base_replaces_the_published_one(tmp_path: Path, redis: FakeRedis) -> None:
+    await publish(redis, OLD)
+    registry = make_registry(tmp_path, NEW)
+
+    await registry.sync(redis)  # type: ignore[arg-type]
+
+    assert registry.current.text == NEW
+    assert redis.hashes[KB_REDIS_KEY][b"text"].decode() == NEW
+    assert registry.revision == 2
+
+
+async def test_restarted_replica_with_an_outdated_file_takes_the_published_one(
+    tmp_path: Path,
+    redis: FakeRedis,
+) -> None:
+    # the file of this host was published before and replaced by another replica since
+    await publish(redis, OLD)
+    await publish(redis, NEW)
+    registry = make_registry(tmp_path, OLD)
+
+    await registry.sync(redis)  # type: ignore[arg-type]
+
+    assert registry.current.text == NEW
+    assert registry.revision == 2
+    assert redis.hashes[KB_REDIS_KEY][b"text"].decode() == NEW
+
+
+@pytest.mark.parametrize("text", [None, "", "{not json", "[]"], ids=["missing", "empty", "broken", "not_a_dict"])
+async def test_unreadable_file_takes_the_published_one(tmp_path: Path, redis: FakeRedis, text: str | None) -> None:
+    await publish(redis, NEW)
+    registry = make_registry(tmp_path, text)
+
+    await registry.sync(redis)  # type: ignore[arg-type]
+
+    assert registry.current.text == NEW
+    assert len(redis.published) == 1
+
+
+async def test_unreadable_file_is_never_published(tmp_path: Path, redis: FakeRedis) -> None:
+    registry = make_registry(tmp_path, None)
+
+    await registry.sync(redis)  # type: ignore[arg-type]
+
+    assert registry.current.data == {}
+    assert not redis.hashes
+    assert not redis.published
+
+
+async def test_publication_without_a_revision_is_read(tmp_path: Path, redis: FakeRedis) -> None:
+    await redis.hset(KB_REDIS_KEY, mapping={"version": knowledge_base_version(NEW), "text": NEW})
+    await redis.sadd(KB_VERSIONS_KEY, knowledge_base_version(OLD))
+    registry = make_registry(tmp_path, OLD)
+
+    await registry.sync(redis)  # type: ignore[arg-type]
+
+    assert registry.current.text == NEW
+
+
+async def test_corrupted_publication_is_ignored(tmp_path: Path, redis: FakeRedis) -> None:
+    await redis.hset(KB_REDIS_KEY, mapping={"version": "0123456789ab", "text": NEW, "revision": "3"})
+    registry = make_registry(tmp_path, OLD)
+
+    assert await registry.fetch(redis) is None  # type: ignore[arg-type]
+
+
+async def test_swap_rebuilds_the_derived_objects(tmp_path: Path) -> None:
+    registry = make_registry(tmp_path, OLD)
+    assert registry.derive("keys", lambda knowledge_base: sorted(knowledge_base.data)) == ["payment"]
+    new = KnowledgeBase.from_text(orjson.dumps({"refunds": "Within 14 days"}).decode())
+    assert new is not None
+
+    assert await registry.swap(new, source="test")
+    assert not await registry.swap(new, source="test")
+
+    assert registry.derive("keys", lambda knowledge_base: sorted(knowledge_base.data)) == ["refunds"]
+
+
+async def test_failing_builder_keeps_the_current_version(tmp_path: Path) -> None:
+    registry = make_registry(tmp_path, OLD)
+
+    def build(knowledge_base: KnowledgeBase) -> int:
+        if "refunds" in knowledge_base.data:
+            msg = "unexpected knowledge base layout"
+            raise KeyError(msg)
+        return 1
+
+    registry.derive("index", build)
+    new = KnowledgeBase.from_text(orjson.dumps({"refunds": "Within 14 days"}).decode())
+    assert new is not None
+
+    assert not await registry.swap(new, source="test")
+    assert registry.current.text == OLD
@@ -0,0 +1,160 @@
+from __future__ import annotations
+from typing import Any
+
+import pytest
+
+from bot.knowledge.retrieval import (
+    BM25Index,
+    KnowledgeRetriever,
+    inverse_document_frequencies,
+    pack_sections,
+    question_terms,
+    stem,
+    tokenize,
+)
+from bot.knowledge.sections import KnowledgeSection, split_sections
+
+KNOWLEDGE_BASE: dict[str, Any] = {
+    "metadata": {"updated": "2025-01-01"},
+    "payment": {"methods": "Pay with a bank card or PayPal", "currency": "All transactions are processed in USD"},
+    "installation": {"steps": "Scan the QR code in the camera app to install the eSIM"},
+    "coverage": {"countries": "Japan, Germany, France and 120 other countries"},
+}
+
+
+@pytest.fixture
+def retriever() -> KnowledgeRetriever:
+    sections = split_sections(KNOWLEDGE_BASE)
+    return KnowledgeRetriever(sections=sections, full_text=str(KNOWLEDGE_BASE))
+
+
+@pytest.mark.parametrize(
+    ("token", "expected"),
+    [
+        ("installing", "install"),
+        ("activated", "activat"),
+        ("countries", "countri"),
+        ("plans", "plan"),
+        ("sims", "sims"),  # too short to strip
+        ("gas", "gas"),
+        ("esim", "esim"),
+    ],
+)
+def test_stem(token: str, expected: str) -> None:
+    assert stem(token) == expected
+
+
+def test_tokenize_drops_stopwords_and_stems() -> None:
+    assert tokenize("How do I install the eSIM on my phone?") == ["install", "esim", "phone"]
+
+
+@pytest.mark.parametrize(
+    ("question", "expected"),
+    [
+        ("Where can I top up?", {"top", "up"}),
+        ("¿Cómo puedo recargar mi eSIM?", {"recargar", "esim"}),
+        ("Как пополнить баланс?", {"пополнить", "баланс"}),
+        ("如何充值", {"如何", "何充", "充值"}),
+        ("?", set()),
+    ],
+)
+def test_question_terms(question: str, expected: set[str]) -> None:
+    assert question_terms(question) == expected
+
+
+def test_bm25_ranks_the_document_with_the_rare_term_first() -> None:
+    index = BM25Index([["esim", "install", "qr"], ["esim", "payment", "card"], ["esim", "coverage"]])
+
+    scores = index.scores(["card"])
+
+    assert scores[1] > 0
+    assert scores[0] == scores[2] == 0
+
+
+@pytest.mark.parametrize("query", [[], ["unknown"], ["unknown", "missing"]])
+def test_bm25_scores_nothing_for_unknown_terms(query: list[str]) -> None:
+    index = BM25Index([["esim", "install"], ["payment"]])
+
+    assert index.scores(query) == [0.0, 0.0]
+
+
+def test_bm25_term_in_every_document_still_scores_positive() -> None:
+    index = BM25Index([["esim"], ["esim", "payment"]])
+
+    assert all(score > 0 for score in index.scores(["esim"]))
+
+
+def test_bm25_restored_from_term_freqs_scores_the_same() -> None:
+    documents = [["esim", "install", "install"], ["payment", "card"], ["coverage", "japan", "esim"]]
+    index = BM25Index(documents)
+
+    restored = BM25Index.from_term_freqs(index.term_freqs, inverse_document_frequencies(index.term_freqs))
+
+    for query in (["install"], ["esim", "card"], ["japan", "coverage", "payment"]):
+        assert restored.scores(query) == pytest.approx(index.scores(query))
+
+
+def test_bm25_of_empty_index() -> None:
+    assert BM25Index([]).scores(["esim"]) == []
+
+
+@pytest.mark.parametrize(
+    ("question", "section_id"),
+    [
+        ("Can I pay with PayPal?", "payment"),
+        ("How do I scan the QR code?", "installation"),
+        ("Does it work in Japan?", "coverage"),
+    ],
+)
+def test_retrieve_selects_the_relevant_section(retriever: KnowledgeRetriever, question: str, section_id: str) -> None:
+    retriever.min_score = 0.5
+
+    result = retriever.retrieve(question)
+
+    assert not result.is_fallback
+    assert result.section_ids[0] == section_id
+    assert result.context
+
+
+@pytest.mark.parametrize("question", ["hello", "What?", "", "спасибо"])
+def test_retrieve_falls_back_to_the_full_knowledge_base(retriever: KnowledgeRetriever, question: str) -> None:
+    result = retriever.retrieve(question)
+
+    assert result.is_fallback
+    assert result.section_ids == ()
+    assert result.context == retriever.full_text
+
+
+def test_retrieve_never_exceeds_the_token_budget(retriever: KnowledgeRetriever) -> None:
+    budget = min(section.tokens for section in retriever.sections)
+
+    result = retriever.retrieve("hello", max_tokens=budget)
+
+    assert result.is_fallback
+    assert result.context != retriever.full_text
+    assert result.tokens <= budget
+    assert result.dropped == len(retriever.sections) - len(result.section_ids)
+
+
+def test_retrieve_prefers_the_full_knowledge_base_when_it_fits(retriever: KnowledgeRetriever) -> None:
+    retriever.min_score = 0.5
+
+    result = retriever.retrieve("Can I pay with PayPal?", max_tokens=retriever.full_tokens, prefer_full=True)
+
+    assert not result.is_fallback
+    assert result.context == retriever.full_text
+
+
+def test_pack_sections_skips_the_sections_that_do_not_fit() -> None:
+    sections = [
+        KnowledgeSection(id=name, path=(name,), content=name, text=name, tokens=tokens)
+        for name, tokens in (("a", 5), ("b", 8), ("c", 3))
+    ]
+
+    assert [section.id for section in pack_sections(sections, 9)] == ["a", "c"]
+    assert pack_sections(sections, None) == sections
+    assert pack_sections(sections, 0) == []
+
+
+def test_split_sections_skips_metadata() -> None:
+    assert "metadata" not in {section.path[0] for section in split_sections(KNOWLEDGE_BASE)}
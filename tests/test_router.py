@@ -0,0 +1,176 @@
+from __future__ import annotations
+import asyncio
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from bot.services.router import LATENCY_MIN_SAMPLES, LatencyTracker, LLMRouter
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+
+class FakeProvider:
+    """Answers after ``delay`` seconds, streams start after the same delay."""
+
+    def __init__(self, name: str, delay: float = 0.0, text: str = "", fail: bool = False) -> None:
+        self.name = name
+        self.delay = delay
+        self.text = text or f"answer of {name}"
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = False
+
+    async def answer(self, **_: Any) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            msg = f"{self.name} is down"
+            raise RuntimeError(msg)
+        return self.text
+
+    async def stream_answer(self, **_: Any) -> AsyncIterator[str]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        for word in self.text.split(" "):
+            if self.fail:
+                msg = f"{self.name} stream broke"
+                raise RuntimeError(msg)
+            yield word
+
+
+def make_router(
+    *providers: FakeProvider, hedge_delay: float = 0.05, hedging: bool = True, timeout: float = 2
+) -> LLMRouter:
+    return LLMRouter(list(providers), hedge_delay=hedge_delay, hedging=hedging, timeout=timeout)  # type: ignore[arg-type]
+
+
+async def collect(stream: AsyncIterator[str]) -> str:
+    return " ".join([delta async for delta in stream])
+
+
+def test_latency_percentile() -> None:
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(95) is None
+
+    for value in range(1, 101):
+        tracker.observe(value / 100)
+
+    assert tracker.percentile(50) == 0.51
+    assert tracker.percentile(95) == 0.96
+    assert len(tracker) == 100
+
+
+def test_hedge_delay_follows_the_p95_once_there_are_enough_samples() -> None:
+    primary = FakeProvider("primary")
+    router = make_router(primary, hedge_delay=8)
+    for _ in range(LATENCY_MIN_SAMPLES - 1):
+        router.latencies["primary"].observe(1.0)
+    assert router.get_hedge_delay(primary) == 8  # type: ignore[arg-type]
+
+    router.latencies["primary"].observe(1.0)
+    assert router.get_hedge_delay(primary) == 1.0  # type: ignore[arg-type]
+    assert router.get_hedge_delay(primary, first_token=True) == 8  # type: ignore[arg-type]
+
+
+async def test_fast_primary_is_not_hedged() -> None:
+    primary, fallback = FakeProvider("primary"), FakeProvider("fallback")
+    router = make_router(primary, fallback)
+
+    assert await router.answer("question", "en") == "answer of primary"
+    assert fallback.calls == 0
+    assert len(router.latencies["primary"]) == 1
+
+
+async def test_slow_primary_is_hedged_and_the_first_answer_wins() -> None:
+    primary, fallback = FakeProvider("primary", delay=1), FakeProvider("fallback")
+    router = make_router(primary, fallback)
+
+    start = perf_counter()
+    assert await router.answer("question", "en") == "answer of fallback"
+
+    assert perf_counter() - start < 0.5
+    await asyncio.sleep(0)
+    assert primary.cancelled
+    assert len(router.latencies["fallback"]) == 1
+
+
+async def test_failed_primary_falls_back_without_waiting_for_the_hedge_delay() -> None:
+    primary, fallback = FakeProvider("primary", fail=True), FakeProvider("fallback")
+    router = make_router(primary, fallback, hedge_delay=10)
+
+    start = perf_counter()
+    assert await router.answer("question", "en") == "answer of fallback"
+    assert perf_counter() - start < 1
+
+
+async def test_slow_primary_is_waited_for_without_hedging() -> None:
+    primary, fallback = FakeProvider("primary", delay=0.1), FakeProvider("fallback")
+
+    assert await make_router(primary, fallback, hedging=False).answer("question", "en") == "answer of primary"
+    assert fallback.calls == 0
+
+
+@pytest.mark.parametrize(
+    "providers",
+    [
+        (FakeProvider("primary", fail=True), FakeProvider("fallback", fail=True)),
+        (FakeProvider("primary", delay=5), FakeProvider("fallback", delay=5)),
+    ],
+    ids=["failed", "timed_out"],
+)
+async def test_no_answer_when_every_provider_fails(providers: tuple[FakeProvider, ...]) -> None:
+    start = perf_counter()
+
+    assert await make_router(*providers, timeout=0.2).answer("question", "en") == ""
+    assert perf_counter() - start < 1
+
+
+async def test_slow_stream_is_hedged_on_the_first_token() -> None:
+    primary, fallback = FakeProvider("primary", delay=1), FakeProvider("fallback", text="streamed fallback answer")
+    router = make_router(primary, fallback)
+
+    assert await collect(router.stream_answer("question", "en")) == "streamed fallback answer"
+
+    assert primary.calls == 1
+    assert len(router.first_token_latencies["fallback"]) == 1
+    assert len(router.latencies["fallback"]) == 1
+
+
+async def test_fast_stream_is_not_hedged() -> None:
+    primary, fallback = FakeProvider("primary", text="streamed primary answer"), FakeProvider("fallback")
+    router = make_router(primary, fallback)
+
+    assert await collect(router.stream_answer("question", "en")) == "streamed primary answer"
+    assert fallback.calls == 0
+    assert len(router.first_token_latencies["primary"]) == 1
+
+
+async def test_failed_stream_falls_back_before_the_first_token() -> None:
+    primary, fallback = FakeProvider("primary", fail=True), FakeProvider("fallback", text="fallback")
+
+    assert await collect(make_router(primary, fallback, hedge_delay=10).stream_answer("question", "en")) == "fallback"
+
+
+async def test_stream_failing_midway_is_not_passed_off_as_complete() -> None:
+    class BrokenProvider(FakeProvider):
+        async def stream_answer(self, **_: Any) -> AsyncIterator[str]:
+            yield "partial"
+            msg = "stream broke"
+            raise RuntimeError(msg)
+
+    router = make_router(BrokenProvider("primary"))
+
+    with pytest.raises(RuntimeError, match="stream broke"):
+        await collect(router.stream_answer("question", "en"))
+    assert len(router.latencies["primary"]) == 0
+
+
+def test_router_needs_a_provider() -> None:
+    with pytest.raises(RuntimeError):
+        LLMRouter([])
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import datetime
+import pickle
+from dataclasses import dataclass
+from typing import Any
+
+import pytest
+
+from bot.cache.serialization import (
+    HEADER,
+    NO_COMPRESSION,
+    DataclassSerializer,
+    ModelRowSerializer,
+    SerializationError,
+    VersionedSerializer,
+)
+from bot.database.models import UserModel
+
+
+@dataclass(frozen=True, slots=True)
+class Profile:
+    id: int
+    language_code: str | None
+    is_admin: bool
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileWithPremium:
+    id: int
+    language_code: str | None
+    is_admin: bool
+    is_premium: bool
+
+
+def make_user(user_id: int, last_name: str | None = None) -> UserModel:
+    return UserModel(
+        id=user_id,
+        first_name="Anna",
+        last_name=last_name,
+        username="anna",
+        language_code="ru",
+        referrer=None,
+        created_at=datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+        is_admin=False,
+        is_suspicious=False,
+        is_block=False,
+        is_premium=True,
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    [None, 0, "text", "текст", 1.5, True, [], [1, "a", None], {"a": [1, {"b": None}]}, {"users": list(range(500))}],
+)
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_versioned_serializer_round_trip(value: Any, compression: str | None) -> None:
+    serializer = VersionedSerializer(compression=compression, compress_above=64)
+
+    assert serializer.deserialize(serializer.serialize(value)) == value
+
+
+def test_msgpack_codec_round_trip() -> None:
+    pytest.importorskip("msgpack")
+    serializer = VersionedSerializer(codec="msgpack")
+
+    assert serializer.deserialize(serializer.serialize({"a": [1, 2]})) == {"a": [1, 2]}
+
+
+def test_only_large_payloads_are_compressed() -> None:
+    serializer = VersionedSerializer(compression="zlib", compress_above=64)
+    large = {"users": list(range(500))}
+
+    small_payload = serializer.serialize([1, 2, 3])
+    large_payload = serializer.serialize(large)
+
+    assert HEADER.unpack_from(small_payload)[1] == NO_COMPRESSION
+    assert HEADER.unpack_from(large_payload)[1] != NO_COMPRESSION
+    assert len(large_payload) < len(VersionedSerializer().serialize(large))
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        pickle.dumps({"a": 1}),  # written before the versioned format
+        VersionedSerializer(version=2).serialize({"a": 1}),
+        VersionedSerializer(compression="zlib", compress_above=0).serialize({"a": 1}),  # reader can not decompress
+        b"",
+        b"\x00",
+        HEADER.pack(1, NO_COMPRESSION) + b"{not json",
+        HEADER.pack(1, 9) + b"{}",
+    ],
+)
+def test_incompatible_values_raise_serialization_error(payload: bytes) -> None:
+    with pytest.raises(SerializationError):
+        VersionedSerializer(version=1).deserialize(payload)
+
+
+def test_unknown_codec() -> None:
+    with pytest.raises(ValueError, match="Unknown codec"):
+        VersionedSerializer(codec="yaml")
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_model_rows_round_trip(compression: str | None) -> None:
+    serializer = ModelRowSerializer(UserModel, compression=compression, compress_above=64)
+    users = [make_user(1), make_user(2, last_name="Smith")]
+
+    restored = serializer.deserialize(serializer.serialize(users))
+
+    assert [{column: getattr(user, column) for column in serializer.columns} for user in restored] == [
+        {column: getattr(user, column) for column in serializer.columns} for user in users
+    ]
+    assert restored[0].created_at.tzinfo is not None
+
+
+def test_model_rows_of_other_columns_are_a_miss() -> None:
+    serializer = ModelRowSerializer(UserModel)
+    # rows cached before a migration, with their own schema version
+    stale = VersionedSerializer(version=serializer.serializer.version ^ 1).serialize([[1, "Anna"]])
+
+    with pytest.raises(SerializationError):
+        serializer.deserialize(stale)
+
+
+@pytest.mark.parametrize("value", [Profile(id=1, language_code="ru", is_admin=True), None])
+def test_dataclass_round_trip(value: Profile | None) -> None:
+    serializer = DataclassSerializer(Profile)
+
+    assert serializer.deserialize(serializer.serialize(value)) == value
+
+
+def test_dataclass_with_other_fields_is_a_miss() -> None:
+    stored = DataclassSerializer(Profile).serialize(Profile(id=1, language_code="ru", is_admin=True))
+
+    with pytest.raises(SerializationError):
+        DataclassSerializer(ProfileWithPremium).deserialize(stored)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import math
+from time import monotonic
+
+import pytest
+
+from bot.cache.answers import (
+    SimilarQuestions,
+    encode_entry,
+    normalize_question,
+    question_signature,
+    term_overlap,
+)
+from bot.knowledge.retrieval import question_terms
+from bot.utils.simhash import SIMHASH_BITS, SimHashIndex, bands, hamming_distance, simhash, similarity
+
+ANSWERED = "How do I install the eSIM?"
+
+
+def signature_of(question: str) -> int:
+    signature = question_signature(question_terms(normalize_question(question)))
+    assert signature is not None
+    return signature
+
+
+@pytest.fixture
+def index() -> SimilarQuestions:
+    """Index of one answered question, filled in memory so that Redis is never read."""
+    questions = SimilarQuestions(refresh_interval=math.inf)
+    terms = question_terms(normalize_question(ANSWERED))
+    index = SimHashIndex()
+    index.add(signature_of(ANSWERED), encode_entry("answers:key", terms))
+    questions.indexes["en"] = (SimilarQuestions.build_key("en"), index, monotonic())
+    return questions
+
+
+def test_simhash_is_deterministic_and_order_independent() -> None:
+    assert simhash(["esim", "install"]) == simhash(["install", "esim"])
+    assert simhash(["esim", "install"]) == simhash(["esim", "install"])
+    assert 0 <= simhash(["esim"]) < 1 << SIMHASH_BITS
+
+
+def test_simhash_of_disjoint_features_differs() -> None:
+    assert similarity(simhash(["esim", "install"]), simhash(["refund", "payment", "card"])) < 1
+
+
+@pytest.mark.parametrize(("a", "b", "distance"), [(0, 0, 0), (0b1011, 0b0001, 2), (0, (1 << 64) - 1, 64)])
+def test_hamming_distance(a: int, b: int, distance: int) -> None:
+    assert hamming_distance(a, b) == distance
+    assert similarity(a, b) == 1 - distance / SIMHASH_BITS
+
+
+@pytest.mark.parametrize("flipped", [(), (0,), (3, 17), (1, 9, 30, 45, 52, 60, 63)])
+def test_signatures_within_seven_bits_share_a_band(flipped: tuple[int, ...]) -> None:
+    signature = simhash(["esim", "install", "iphone"])
+    other = signature
+    for bit in flipped:
+        other ^= 1 << bit
+
+    assert set(bands(signature)) & set(bands(other))
+
+
+def test_index_finds_the_closest_signature() -> None:
+    index = SimHashIndex()
+    signature = simhash(["esim", "install"])
+    index.add(signature, "install")
+    index.add(signature ^ 0b111, "near")
+
+    assert index.nearest(signature, 0.9) == ("install", 1.0)
+    assert index.nearest(signature ^ 0b1, 0.9) is not None
+    assert index.nearest(~signature & ((1 << SIMHASH_BITS) - 1), 0.9) is None
+
+
+def test_index_forgets_removed_signatures() -> None:
+    index = SimHashIndex()
+    signature = simhash(["esim", "install"])
+    index.add(signature, "install")
+
+    index.remove(signature)
+    index.remove(signature)
+
+    assert len(index) == 0
+    assert index.nearest(signature, 0.0) is None
+
+
+@pytest.mark.parametrize(
+    ("a", "b", "expected"),
+    [
+        ({"esim", "install"}, {"esim", "install"}, 1.0),
+        ({"esim", "japan"}, {"esim", "china"}, 1 / 3),
+        ({"esim"}, {"refund"}, 0.0),
+        (set(), set(), 0.0),
+    ],
+)
+def test_term_overlap(a: set[str], b: set[str], expected: float) -> None:
+    assert term_overlap(frozenset(a), frozenset(b)) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["How do I install the eSIM?", "how to install esim", "HOW DO I INSTALL THE ESIM", " How do I install the eSIM!! "],
+)
+async def test_paraphrase_is_served_from_the_answered_question(index: SimilarQuestions, question: str) -> None:
+    found = await index.find(question, "en")
+
+    assert found is not None
+    assert found.answer_key == "answers:key"
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "How do I install the eSIM on iPhone?",  # one more content word changes the answer
+        "How do I uninstall the eSIM?",
+        "How do I delete the eSIM?",
+        "How do I install the app?",
+        "Where do I buy the eSIM?",
+        "?",
+    ],
+)
+async def test_different_question_is_not_served(index: SimilarQuestions, question: str) -> None:
+    assert await index.find(question, "en") is None
+
+
+async def test_answers_of_another_language_are_not_served(index: SimilarQuestions) -> None:
+    index.indexes["ru"] = (SimilarQuestions.build_key("ru"), SimHashIndex(), monotonic())
+
+    assert await index.find(ANSWERED, "ru") is None
+
+
+async def test_candidate_with_close_signature_but_other_terms_is_rejected() -> None:
+    questions = SimilarQuestions(refresh_interval=math.inf)
+    answered = "Does the eSIM work in Japan?"
+    index = SimHashIndex()
+    # a signature identical to the question's, as if SimHash had collided
+    index.add(signature_of("Does the eSIM work in China?"), encode_entry("answers:japan", question_terms(answered)))
+    questions.indexes["en"] = (SimilarQuestions.build_key("en"), index, monotonic())
+
+    assert await questions.find("Does the eSIM work in China?", "en") is None
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING
+
+import pytest
+
+from bot.cache.singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from tests.conftest import FakeRedis
+
+
+class Upstream:
+    """LLM call that answers once released, counting how often it was called."""
+
+    def __init__(self, answer: str = "answer") -> None:
+        self.answer = answer
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        return self.answer
+
+
+@pytest.fixture
+def flight(redis: FakeRedis) -> SingleFlight:
+    return SingleFlight(cache=redis, timeout=1)  # type: ignore[arg-type]
+
+
+async def test_concurrent_calls_share_one_upstream_call(flight: SingleFlight) -> None:
+    upstream = Upstream()
+    calls = [asyncio.create_task(flight.do("question", upstream)) for _ in range(5)]
+    await asyncio.sleep(0)
+
+    upstream.release.set()
+
+    assert await asyncio.gather(*calls) == ["answer"] * 5
+    assert upstream.calls == 1
+    assert not flight.inflight
+
+
+@pytest.mark.parametrize("keys", [("ru:question", "en:question"), ("kb1:question", "kb2:question")])
+async def test_calls_with_different_keys_are_not_coalesced(flight: SingleFlight, keys: tuple[str, str]) -> None:
+    upstream = Upstream()
+    upstream.release.set()
+
+    results = await asyncio.gather(*(flight.do(key, upstream) for key in keys))
+
+    assert results == ["answer", "answer"]
+    assert upstream.calls == len(keys)
+
+
+async def test_leader_failure_is_raised_to_every_caller(flight: SingleFlight) -> None:
+    async def fail() -> str:
+        await asyncio.sleep(0)
+        msg = "provider is down"
+        raise RuntimeError(msg)
+
+    results = await asyncio.gather(*(flight.do("question", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    upstream = Upstream()
+    upstream.release.set()
+    assert await flight.do("question", upstream) == "answer"
+
+
+async def test_follower_takes_over_from_a_cancelled_leader(flight: SingleFlight) -> None:
+    upstream = Upstream()
+    leader = asyncio.create_task(flight.do("question", upstream))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("question", upstream))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await follower == "answer"
+    assert upstream.calls == 2
+    assert leader.cancelled()
+
+
+async def test_replica_waits_for_the_result_of_another_replica(redis: FakeRedis) -> None:
+    first, second = SingleFlight(cache=redis, timeout=1), SingleFlight(cache=redis, timeout=1)  # type: ignore[arg-type]
+    leader_upstream, follower_upstream = Upstream(), Upstream()
+    leader = asyncio.create_task(first.do("question", leader_upstream))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(second.do("question", follower_upstream))
+    await asyncio.sleep(0.01)
+
+    leader_upstream.release.set()
+
+    assert await asyncio.gather(leader, follower) == ["answer", "answer"]
+    assert follower_upstream.calls == 0
+
+
+async def test_replica_reads_the_result_stored_before_it_subscribed(redis: FakeRedis, flight: SingleFlight) -> None:
+    redis.locks.add("singleflight:lock:question")
+    upstream = Upstream()
+
+    async def lookup() -> str | None:
+        return "stored"
+
+    assert await flight.do("question", upstream, lookup) == "stored"
+    assert upstream.calls == 0
+
+
+async def test_replica_takes_over_when_the_leader_is_gone(redis: FakeRedis, flight: SingleFlight) -> None:
+    redis.locks.add("singleflight:lock:question")
+    upstream = Upstream()
+    upstream.release.set()
+
+    async def lookup() -> str | None:
+        # the leader failed without storing a result and released its lock
+        redis.locks.clear()
+        return None
+
+    assert await flight.do("question", upstream, lookup) == "answer"
+    assert upstream.calls == 1
+
+
+async def test_replica_calls_upstream_when_the_leader_never_answers(redis: FakeRedis) -> None:
+    flight = SingleFlight(cache=redis, timeout=0.05)  # type: ignore[arg-type]
+    redis.locks.add("singleflight:lock:question")
+    upstream = Upstream()
+    upstream.release.set()
+
+    assert await flight.do("question", upstream) == "answer"
+    assert upstream.calls == 1
+
+
+async def test_redis_failure_calls_upstream_directly(redis: FakeRedis, flight: SingleFlight) -> None:
+    redis.fail = True
+    upstream = Upstream()
+    upstream.release.set()
+
+    assert await flight.do("question", upstream) == "answer"
+    assert upstream.calls == 1
@@ -0,0 +1,231 @@
+from __future__ import annotations
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+from bot.utils import streaming
+from bot.utils.streaming import ANSWER_PARSE_MODE, EDIT_INTERVAL, MessageStreamWriter
+
+if TYPE_CHECKING:
+    from tests.conftest import Clock
+
+MARKUP = SimpleNamespace(inline_keyboard=[])
+
+
+class FakeChat:
+    """Messages of a chat and every call that rendered them, edits raise the queued ``errors`` first."""
+
+    def __init__(self) -> None:
+        self.messages: list[FakeMessage] = []
+        self.calls: list[tuple[str, str]] = []
+        self.parse_modes: set[Any] = set()
+        self.errors: list[Exception] = []
+
+
+class FakeMessage:
+    def __init__(self, chat: FakeChat, text: str = "", reply_markup: Any = None) -> None:
+        self.chat = chat
+        self.text = text
+        self.reply_markup = reply_markup
+
+    async def answer(self, text: str, parse_mode: Any, reply_markup: Any = None) -> FakeMessage:
+        sent = FakeMessage(self.chat, text, reply_markup)
+        self.chat.messages.append(sent)
+        self.chat.calls.append(("send", text))
+        self.chat.parse_modes.add(parse_mode)
+        return sent
+
+    async def edit_text(self, text: str, parse_mode: Any, reply_markup: Any = None) -> None:
+        if self.chat.errors:
+            raise self.chat.errors.pop(0)
+        self.text = text
+        self.reply_markup = reply_markup
+        self.chat.calls.append(("edit", text))
+        self.chat.parse_modes.add(parse_mode)
+
+
+def retry_after(seconds: int) -> TelegramRetryAfter:
+    return TelegramRetryAfter(EditMessageText(text=""), "Flood control exceeded", seconds)
+
+
+def bad_request(message: str) -> TelegramBadRequest:
+    return TelegramBadRequest(EditMessageText(text=""), f"Bad Request: {message}")
+
+
+@pytest.fixture
+def clock(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> Clock:
+    monkeypatch.setattr(streaming, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def sleeps(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    sleeps: list[float] = []
+
+    async def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(streaming, "asyncio", SimpleNamespace(sleep=sleep))
+    return sleeps
+
+
+@pytest.fixture
+def chat() -> FakeChat:
+    return FakeChat()
+
+
+def make_writer(chat: FakeChat, max_len: int = 10) -> MessageStreamWriter:
+    return MessageStreamWriter(FakeMessage(chat), max_len=max_len)  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize(
+    ("steps", "calls"),
+    [
+        ([(0.0, "Dial")], [("send", "Dial")]),
+        # coalesced until the interval has passed, then one edit with everything so far
+        ([(0.0, "Dial"), (0.3, " *1"), (0.3, "00"), (0.3, "#")], [("send", "Dial")]),
+        ([(0.0, "Dial"), (0.3, " *1"), (0.7, "00")], [("send", "Dial"), ("edit", "Dial *100")]),
+        (
+            [(0.0, "Dial"), (EDIT_INTERVAL, " *1"), (EDIT_INTERVAL, "00")],
+            [("send", "Dial"), ("edit", "Dial *1"), ("edit", "Dial *100")],
+        ),
+        ([(0.0, " "), (0.0, "\n"), (0.0, "Hi")], [("send", " \nHi")]),  # nothing is sent for whitespace
+    ],
+)
+async def test_edits_are_throttled(
+    steps: list[tuple[float, str]],
+    calls: list[tuple[str, str]],
+    chat: FakeChat,
+    clock: Clock,
+) -> None:
+    writer = make_writer(chat)
+
+    for elapsed, delta in steps:
+        clock.now += elapsed
+        await writer.write(delta)
+
+    assert chat.calls == calls
+
+
+@pytest.mark.parametrize(
+    ("deltas", "texts"),
+    [
+        (["0123456789"], ["0123456789"]),
+        (["0123456789a"], ["0123456789", "a"]),
+        (["01234", "56789", "abc"], ["0123456789", "abc"]),
+        (["0123456789" * 2 + "ab"], ["0123456789", "0123456789", "ab"]),
+    ],
+)
+async def test_text_rolls_over_into_new_messages(deltas: list[str], texts: list[str], chat: FakeChat) -> None:
+    writer = make_writer(chat)
+
+    for delta in deltas:
+        await writer.write(delta)
+    await writer.finish()
+
+    assert [message.text for message in chat.messages] == texts
+
+
+async def test_long_answer_rolls_over_at_the_message_limit(chat: FakeChat) -> None:
+    writer = make_writer(chat, max_len=streaming.MESSAGE_MAX_LEN)
+
+    await writer.write("a" * 4500)
+    await writer.finish()
+
+    assert [len(message.text) for message in chat.messages] == [4000, 500]
+
+
+@pytest.mark.parametrize(
+    ("deltas", "suffix", "texts"),
+    [
+        (["Dial *100#"], "", ["Dial *100#"]),
+        (["Dial \n"], "", ["Dial"]),
+        (["Hi"], "\n\nHelp?", ["Hi\n\nHelp?"]),
+        (["Dial *100#"], "\n\nHelp?", ["Dial *100#", "Help?"]),  # the suffix does not fit
+        ([], "\n\nHelp?", ["Help?"]),
+        ([], "", []),
+    ],
+)
+async def test_finish_renders_the_rest_with_the_suffix_and_keyboard(
+    deltas: list[str],
+    suffix: str,
+    texts: list[str],
+    chat: FakeChat,
+) -> None:
+    writer = make_writer(chat)
+    for delta in deltas:
+        await writer.write(delta)
+
+    await writer.finish(suffix=suffix, reply_markup=MARKUP)  # type: ignore[arg-type]
+
+    assert [message.text for message in chat.messages] == texts
+    assert [message.reply_markup for message in chat.messages] == [None] * (len(texts) - 1) + [MARKUP] * bool(texts)
+    assert writer.is_empty is not texts
+
+
+async def test_finish_renders_pending_text_within_the_interval(chat: FakeChat, clock: Clock) -> None:
+    writer = make_writer(chat)
+    await writer.write("Dial")
+    await writer.write(" *100#")
+    clock.now += 0.1
+
+    await writer.finish()
+
+    assert chat.calls == [("send", "Dial"), ("edit", "Dial *100#")]
+
+
+async def test_retry_after_postpones_the_next_edit(chat: FakeChat, clock: Clock, sleeps: list[float]) -> None:
+    writer = make_writer(chat, max_len=100)
+    await writer.write("Dial")
+    clock.now += EDIT_INTERVAL
+    chat.errors.append(retry_after(5))
+
+    await writer.write(" *1")
+    clock.now += 4
+    await writer.write("00")
+    clock.now += 1
+    await writer.write("#")
+
+    assert chat.calls == [("send", "Dial"), ("edit", "Dial *100#")]
+    assert sleeps == []
+
+
+async def test_retry_after_of_the_final_edit_waits_and_retries(chat: FakeChat, sleeps: list[float]) -> None:
+    writer = make_writer(chat, max_len=100)
+    await writer.write("Dial")
+    await writer.write(" *100#")
+    chat.errors.append(retry_after(3))
+
+    await writer.finish()
+
+    assert sleeps == [3]
+    assert chat.calls == [("send", "Dial"), ("edit", "Dial *100#")]
+
+
+@pytest.mark.parametrize("message", ["message is not modified", "message to edit not found"])
+async def test_failed_edit_is_not_retried(message: str, chat: FakeChat, clock: Clock) -> None:
+    writer = make_writer(chat, max_len=100)
+    await writer.write("Dial")
+    clock.now += EDIT_INTERVAL
+    chat.errors.append(bad_request(message))
+
+    await writer.write(" *100#")
+    await writer.finish()
+
+    assert chat.calls == [("send", "Dial")]
+
+
+async def test_answers_are_rendered_as_plain_text(chat: FakeChat, clock: Clock) -> None:
+    writer = make_writer(chat)
+    await writer.write("a < b & c")
+    clock.now += EDIT_INTERVAL
+    await writer.write(" > d")
+    await writer.finish(suffix="\n\n<b>", reply_markup=MARKUP)  # type: ignore[arg-type]
+
+    assert len(chat.calls) > 2
+    assert chat.parse_modes == {ANSWER_PARSE_MODE}
+    assert ANSWER_PARSE_MODE is None
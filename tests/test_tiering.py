@@ -0,0 +1,159 @@
+from __future__ import annotations
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+
+import pytest
+from prometheus_client import REGISTRY
+
+from bot.core.config import LLMTier, settings
+from bot.services import tiering
+from bot.services.gemini import GeminiClient
+from bot.services.openai import OpenAIClient, get_tier_options
+from bot.services.tiering import LONG_CONVERSATION_TURNS, score_question, select_tier
+
+if TYPE_CHECKING:
+    from bot.services.llm import LLMProvider
+
+SIMPLE = LLMTier(name="simple", min_score=0, models={"openai": "nano"}, max_output_tokens=512)
+STANDARD = LLMTier(name="standard", min_score=2, models={"openai": "mini"}, max_output_tokens=1024)
+COMPLEX = LLMTier(
+    name="complex",
+    min_score=4,
+    models={"openai": "large", "gemini": "flash"},
+    max_output_tokens=4096,
+    reasoning_effort="medium",
+)
+TIERS = [SIMPLE, STANDARD, COMPLEX]
+
+
+def words(count: int) -> str:
+    """A question of ``count`` estimated tokens."""
+    return " ".join(["plan"] * count)
+
+
+@pytest.fixture(autouse=True)
+def intents(monkeypatch: pytest.MonkeyPatch) -> dict[str, float]:
+    """Confidence of the known intent of a question, the others have none."""
+    intents: dict[str, float] = {}
+
+    def classify(question: str) -> tuple[SimpleNamespace, float] | None:
+        return (SimpleNamespace(name="balance"), intents[question]) if question in intents else None
+
+    monkeypatch.setattr(tiering, "get_intent_classifier", lambda: SimpleNamespace(classify=classify))
+    return intents
+
+
+def tier_requests(tier: str) -> float:
+    return REGISTRY.get_sample_value("tgbot_llm_tier_requests_total", {"tier": tier}) or 0.0
+
+
+@pytest.mark.parametrize(
+    ("question", "turn", "confidence", "tier"),
+    [
+        ("Which plan?", 0, None, SIMPLE),
+        (words(30), 0, None, SIMPLE),
+        (words(31), 0, None, SIMPLE),  # long
+        (words(81), 0, None, STANDARD),  # very long
+        ("Why is my plan not working", 0, None, STANDARD),
+        ("No data? No calls?", 0, None, STANDARD),  # a problem and several questions
+        ("Which plan?", LONG_CONVERSATION_TURNS - 1, None, SIMPLE),
+        ("Which plan?", LONG_CONVERSATION_TURNS, None, SIMPLE),
+        ("No data? No calls?", LONG_CONVERSATION_TURNS, None, COMPLEX),  # deep into the conversation
+        (f"{words(81)} why not", 0, None, COMPLEX),
+        (words(81), 0, 0.9, SIMPLE),  # about a single known topic
+        (words(81), 0, 0.6, STANDARD),  # the topic is only mentioned
+        ("Balance?", 0, 0.9, SIMPLE),  # below every tier
+    ],
+)
+def test_tier_follows_question_and_conversation(
+    question: str,
+    turn: int,
+    confidence: float | None,
+    tier: LLMTier,
+    intents: dict[str, float],
+) -> None:
+    if confidence is not None:
+        intents[question] = confidence
+    before = tier_requests(tier.name)
+
+    assert select_tier(question, turn, TIERS) == tier
+    assert tier_requests(tier.name) == before + 1
+
+
+@pytest.mark.parametrize(
+    ("question", "turn", "score", "reasons"),
+    [
+        ("Which plan?", 0, 0, ()),
+        (words(81), 0, 2, ("tokens>30", "tokens>80")),
+        ("Why no data? And calls?", 3, 4, ("troubleshooting", "several_questions", "turn>=3")),
+        ("ПОЧЕМУ？ И ещё？", 0, 3, ("troubleshooting", "several_questions")),  # casefolded, full-width marks
+    ],
+)
+def test_score_explains_its_reasons(question: str, turn: int, score: float, reasons: tuple[str, ...]) -> None:
+    difficulty = score_question(question, turn)
+
+    assert (difficulty.score, difficulty.reasons) == (score, reasons)
+
+
+@pytest.mark.parametrize(
+    ("tiers", "question", "tier"),
+    [
+        ([COMPLEX, SIMPLE, STANDARD], words(81), STANDARD),  # in any order
+        ([STANDARD, COMPLEX], "Which plan?", STANDARD),  # no tier for easy questions, the lowest one is used
+        ([SIMPLE, STANDARD], f"{words(81)} why not", STANDARD),  # no tier for hard ones, the highest one is used
+        ([COMPLEX], "Which plan?", COMPLEX),
+        ([], "Which plan?", None),  # the providers' default models
+    ],
+)
+def test_missing_tier_falls_back_to_the_nearest_one(
+    tiers: list[LLMTier],
+    question: str,
+    tier: LLMTier | None,
+) -> None:
+    assert select_tier(question, 0, tiers) == tier
+
+
+def test_disabled_tiering_keeps_the_default_models(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "LLM_TIERING_ENABLED", False)
+
+    assert select_tier(f"{words(81)} why not", 0, TIERS) is None
+
+
+@pytest.fixture(scope="module")
+def providers() -> dict[str, LLMProvider]:
+    return {
+        "openai": OpenAIClient(api_key="test", model_name="default-gpt"),
+        "gemini": GeminiClient(api_key="test", model_name="default-gemini"),
+    }
+
+
+@pytest.mark.parametrize(
+    ("provider", "tier", "model"),
+    [
+        ("openai", SIMPLE, "nano"),
+        ("openai", COMPLEX, "large"),
+        ("openai", None, "default-gpt"),
+        ("gemini", COMPLEX, "flash"),
+        ("gemini", STANDARD, "default-gemini"),  # no model of the tier for this provider
+        ("gemini", None, "default-gemini"),
+    ],
+)
+def test_provider_without_a_model_of_the_tier_uses_its_default(
+    provider: str,
+    tier: LLMTier | None,
+    model: str,
+    providers: dict[str, LLMProvider],
+) -> None:
+    assert providers[provider].get_model_name(tier) == model
+
+
+@pytest.mark.parametrize(
+    ("tier", "options"),
+    [
+        (None, {}),
+        (SIMPLE, {"max_completion_tokens": 512}),
+        (COMPLEX, {"max_completion_tokens": 4096, "reasoning_effort": "medium"}),
+    ],
+)
+def test_tier_options(tier: LLMTier | None, options: dict[str, object]) -> None:
+    assert get_tier_options(tier) == options
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from sqlalchemy import Update
+
+from bot.cache import redis as redis_cache
+from bot.core import loader
+from bot.middlewares.profile import UserProfileMiddleware
+from bot.services import users
+from bot.services.users import UserProfile, get_user_profile, set_is_admin, set_language_code
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from tests.conftest import FakeRedis
+
+    from bot.database.models import UserModel
+
+
+class FakeSession:
+    """Users by id, answers the profile query and applies the updates of ``bot.services.users``."""
+
+    def __init__(self, **users: SimpleNamespace) -> None:
+        self.users = {user.id: user for user in users.values()}
+        self.queries = 0
+        self.commits = 0
+
+    async def execute(self, statement: Any) -> Any:
+        params = statement.compile().params
+        user = self.users.get(params.pop("id_1"))
+        if isinstance(statement, Update):
+            for name, value in params.items():
+                setattr(user, name, value)
+            return None
+
+        self.queries += 1
+        return SimpleNamespace(one_or_none=lambda: user)
+
+    def add(self, user: UserModel) -> None:
+        self.users[user.id] = SimpleNamespace(id=user.id, language_code=user.language_code, is_admin=False)
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+@pytest.fixture(autouse=True)
+def redis_client(redis: FakeRedis, monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeRedis]:
+    # the cached functions keep the client they were decorated with, its commands go to the fake
+    for name in ("get", "set", "delete", "publish", "pipeline", "lock"):
+        monkeypatch.setattr(loader.redis_client, name, getattr(redis, name))
+    redis_cache.local_caches.clear()
+    yield redis
+    redis_cache.local_caches.clear()
+
+
+@pytest.fixture
+def session() -> FakeSession:
+    return FakeSession(ann=SimpleNamespace(id=1, language_code="en", is_admin=False))
+
+
+async def handle(session: FakeSession, user_id: int | None) -> dict[str, Any]:
+    data: dict[str, Any] = {
+        "session": session,
+        "event_from_user": SimpleNamespace(id=user_id) if user_id is not None else None,
+    }
+
+    async def handler(*_: Any) -> None:
+        return None
+
+    await UserProfileMiddleware()(handler, SimpleNamespace(), data)  # type: ignore[arg-type]
+    return data
+
+
+@pytest.mark.parametrize(
+    ("user_id", "profile", "queries"),
+    [
+        (1, UserProfile(id=1, language_code="en", is_admin=False), 1),
+        (2, None, 1),  # not registered yet
+        (None, None, 0),  # an update without a user, e.g. a channel post
+    ],
+)
+async def test_middleware_loads_the_profile_once(
+    user_id: int | None,
+    profile: UserProfile | None,
+    queries: int,
+    session: FakeSession,
+) -> None:
+    first = await handle(session, user_id)
+    second = await handle(session, user_id)
+
+    assert first["user_profile"] == second["user_profile"] == profile
+    assert session.queries == queries
+
+
+@pytest.mark.parametrize(
+    ("change", "profile"),
+    [
+        (
+            lambda session: set_language_code(session, 1, "de"),
+            UserProfile(id=1, language_code="de", is_admin=False),
+        ),
+        (
+            lambda session: set_is_admin(session, 1, admin=True),
+            UserProfile(id=1, language_code="en", is_admin=True),
+        ),
+        (
+            lambda session: set_is_admin(session=session, user_id=1, admin=False),
+            UserProfile(id=1, language_code="en", is_admin=False),
+        ),
+    ],
+)
+async def test_changes_invalidate_the_profile(change: Any, profile: UserProfile, session: FakeSession) -> None:
+    await get_user_profile(session, 1)
+
+    await change(session)
+
+    assert await get_user_profile(session, 1) == profile
+    assert (session.queries, session.commits) == (2, 1)
+
+
+async def test_registration_invalidates_the_missing_profile(session: FakeSession) -> None:
+    assert await get_user_profile(session, 2) is None
+
+    user = SimpleNamespace(id=2, first_name="Bo", last_name=None, username=None, language_code="fr", is_premium=None)
+    await users.add_user(session, user, referrer=None)  # type: ignore[arg-type]
+
+    assert await get_user_profile(session, 2) == UserProfile(id=2, language_code="fr", is_admin=False)
+
+
+async def test_missing_language_is_empty(session: FakeSession) -> None:
+    session.users[1].language_code = None
+
+    assert await get_user_profile(session, 1) == UserProfile(id=1, language_code="", is_admin=False)